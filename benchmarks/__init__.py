@@ -0,0 +1,14 @@
+"""Performance benchmarks for Warbler.
+
+Run a benchmark from the project root, e.g.:
+
+    DATABASE_URL=postgresql:///warbler-bench python -m benchmarks.feed
+
+Benchmarks fill the configured database with synthetic data, so never point
+them at a database you care about. Without DATABASE_URL they use an
+in-memory SQLite database.
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
@@ -0,0 +1,124 @@
+"""Requests one worker process can serve at once: sync vs. gevent workers.
+
+    python -m benchmarks.concurrency [latency_ms] [seconds] [num_users]
+
+A single gunicorn worker serves logged-in homepages while 1, 10, 50 and
+200 clients ask at once. Every query first waits `latency_ms` (20 by
+default), standing in for a database across the network; that waiting is
+what a gevent worker overlaps. A sync worker's req/s stays at one over
+the request time however many clients wait; a gevent worker's grows with
+the clients until the process runs out of CPU.
+
+As in benchmarks.serving, an in-memory SQLite DATABASE_URL is swapped for
+a temporary SQLite file that the server processes can share.
+"""
+
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 8124
+
+LATENCY_VARIABLE = 'BENCH_DB_LATENCY_MS'
+
+CLIENTS = (1, 10, 50, 200)
+
+_tmp = tempfile.TemporaryDirectory()
+if os.environ['DATABASE_URL'] in ("sqlite://", "sqlite:///:memory:"):
+    os.environ['DATABASE_URL'] = f"sqlite:///{_tmp.name}/concurrency.db"
+
+from app import create_app, CURR_USER_KEY
+from benchmarks.dataset import populate
+from models import db
+
+
+def slow_database_app():
+    """create_app(), with every query delayed by BENCH_DB_LATENCY_MS."""
+
+    app = create_app()
+    latency = float(os.environ.get(LATENCY_VARIABLE, 0)) / 1000
+
+    @event.listens_for(db.get_engine(app), "before_cursor_execute")
+    def wait_for_network(*args):
+        time.sleep(latency)
+
+    return app
+
+
+def client(cookie, deadline):
+    """Latencies (seconds) of the requests made until `deadline`."""
+
+    latencies = []
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+        conn.request("GET", "/", headers={'Cookie': f"session={cookie}"})
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        if response.status == 200:
+            latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def wait_until_up(timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start")
+
+
+def run(worker_class, latency_ms, seconds, cookie):
+    env = dict(os.environ, WEB_CONCURRENCY="1", WEB_WORKER_CLASS=worker_class,
+               BIND=f"127.0.0.1:{PORT}", **{LATENCY_VARIABLE: str(latency_ms)})
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                               'benchmarks.concurrency:slow_database_app()'],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up()
+        for clients in CLIENTS:
+            start = time.perf_counter()
+            deadline = start + seconds
+            with ThreadPoolExecutor(clients) as pool:
+                results = list(pool.map(lambda _: client(cookie, deadline), range(clients)))
+            elapsed = time.perf_counter() - start
+
+            latencies = [latency for result in results for latency in result]
+            median = statistics.median(latencies) * 1000
+            print(f"{worker_class:>8}{clients:9}{len(latencies) / elapsed:10.0f}{median:12.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(latency_ms=20, seconds=10, num_users=200):
+    app = create_app()
+    with app.app_context():
+        populate(num_users, messages_per_user=50, follows_per_user=20)
+        db.engine.dispose()
+
+    cookie = app.session_interface.get_signing_serializer(app).dumps({CURR_USER_KEY: 1})
+
+    print(f"{'worker':>8}{'clients':>9}{'req/s':>10}{'median ms':>12}   ({latency_ms} ms per query)")
+    for worker_class in ('sync', 'gevent'):
+        run(worker_class, latency_ms, seconds, cookie)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""Per-call Python CPU of the data-access layer vs. ad-hoc ORM query chains.
+
+    python -m benchmarks.dal [num_users] [messages_per_user] [follows_per_user]
+"""
+
+import sys
+import time
+
+from app import app
+from benchmarks.dataset import populate, timed
+from models import db, User, Message, Follows, message_visible_to
+import dal
+
+REPEAT = 500
+
+
+def main(num_users=200, messages_per_user=100, follows_per_user=20):
+    with app.app_context():
+        populate(num_users, messages_per_user, follows_per_user)
+
+        def after(func):
+            def run():
+                func()
+                db.session.expunge_all()
+            return run
+
+        cases = [
+            ("profile feed",
+             lambda: (Message
+                      .query
+                      .filter(Message.user_id == 7, message_visible_to(3))
+                      .order_by(Message.id.desc())
+                      .limit(100)
+                      .all()),
+             lambda: dal.profile_feed(7, 3, 100)),
+            ("follow lookup",
+             lambda: (Follows
+                      .query
+                      .filter(Follows.user_being_followed_id == 7,
+                              Follows.user_following_id == 3)
+                      .first()),
+             lambda: dal.follow_status(3, 7)),
+            ("auth lookup",
+             lambda: User.query.filter_by(username="user7").first(),
+             lambda: dal.credentials("user7")),
+        ]
+
+        print(f"{'':16}{'ORM chain':>12}{'dal':>12}   (CPU ms/call)")
+        for name, orm, baked in cases:
+            orm_ms = timed(after(orm), REPEAT, clock=time.process_time)
+            dal_ms = timed(after(baked), REPEAT, clock=time.process_time)
+            print(f"{name:16}{orm_ms:12.3f}{dal_ms:12.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""Synthetic data for benchmarks."""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from models import db, User, Message, Follows
+import snowflake
+
+PASSWORD_HASH = "$2b$12$Q1PUFjhN/AWRQ21LbGYvjeLpZZB6lfZ1BPwifHALGO6oIbyC3CmJe"
+
+
+def populate(num_users=1000, messages_per_user=50, follows_per_user=50, seed=0):
+    """Recreate all tables and fill them with random users, messages, follows."""
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    db.drop_all()
+    db.create_all()
+
+    db.session.bulk_insert_mappings(User, [
+        {'id': i, 'username': f"user{i}", 'email': f"user{i}@example.com",
+         'password': PASSWORD_HASH}
+        for i in range(1, num_users + 1)])
+
+    messages = []
+    for user_id in range(1, num_users + 1):
+        for i in range(messages_per_user):
+            timestamp = now - timedelta(seconds=rng.randrange(365 * 86400))
+            messages.append({
+                'id': snowflake.from_datetime(timestamp, user_id * messages_per_user + i),
+                'text': "benchmark message",
+                'timestamp': timestamp,
+                'user_id': user_id})
+            if len(messages) >= 10000:
+                db.session.bulk_insert_mappings(Message, messages)
+                messages = []
+    db.session.bulk_insert_mappings(Message, messages)
+
+    for user_id in range(1, num_users + 1):
+        followed = rng.sample(range(1, num_users + 1), min(follows_per_user, num_users))
+        db.session.bulk_insert_mappings(Follows, [
+            {'user_following_id': user_id, 'user_being_followed_id': other,
+             'following_confirmed_status': True}
+            for other in followed if other != user_id])
+
+    db.session.commit()
+
+
+def timed(func, repeat, clock=time.perf_counter):
+    """Mean time of `func()` in milliseconds over `repeat` calls.
+
+    Wall time by default; pass `clock=time.process_time` for CPU time.
+    """
+
+    start = clock()
+    for _ in range(repeat):
+        func()
+    return (clock() - start) * 1000 / repeat
@@ -0,0 +1,68 @@
+"""Compare the feed engine against the `Message.user_id.in_` feed query.
+
+    python -m benchmarks.feed [num_users] [messages_per_user] [follows_per_user]
+"""
+
+import random
+import sys
+
+from app import app
+from benchmarks.dataset import populate, timed
+from feed import FeedEngine, messages_by_ids
+from models import db, Message, Follows
+
+FEED_SIZE = 100
+REPEAT = 200
+
+
+def followed_ids(user_id):
+    return [user_id] + [followed for (followed,) in (db.session
+            .query(Follows.user_being_followed_id)
+            .filter(Follows.user_following_id == user_id))]
+
+
+def query_feed(author_ids):
+    return (Message
+            .query
+            .filter(Message.user_id.in_(author_ids))
+            .order_by(Message.id.desc())
+            .limit(FEED_SIZE)
+            .all())
+
+
+def main(num_users=1000, messages_per_user=50, follows_per_user=50):
+    with app.app_context():
+        populate(num_users, messages_per_user, follows_per_user)
+
+        viewers = random.Random(1).sample(range(1, num_users + 1), 20)
+        authors = {viewer: followed_ids(viewer) for viewer in viewers}
+
+        engine = FeedEngine(ttl=3600)
+        engine.warm_up()
+
+        for viewer in viewers:
+            expected = [msg.id for msg in query_feed(authors[viewer])]
+            assert engine.feed_ids(authors[viewer], FEED_SIZE) == expected
+
+        viewer_cycle = iter(viewers * REPEAT)
+
+        def run_query():
+            query_feed(authors[next(viewer_cycle)])
+            db.session.expunge_all()
+
+        def run_engine():
+            messages_by_ids(engine.feed_ids(authors[next(viewer_cycle)], FEED_SIZE))
+            db.session.expunge_all()
+
+        def run_merge_only():
+            engine.feed_ids(authors[next(viewer_cycle)], FEED_SIZE)
+
+        print(f"{num_users} users, {messages_per_user} messages/user, "
+              f"{follows_per_user} follows/user; {engine.stats()}")
+        print(f"IN query feed:        {timed(run_query, REPEAT):8.2f} ms/feed")
+        print(f"engine + fetch by id: {timed(run_engine, REPEAT):8.2f} ms/feed")
+        print(f"engine merge only:    {timed(run_merge_only, REPEAT):8.2f} ms/feed")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""Follow checks: mmap'd snapshot vs. a query per check.
+
+    python -m benchmarks.followgraph [num_users] [messages_per_user] [follows_per_user]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+from app import app
+from benchmarks.dataset import populate, timed
+from followgraph import Snapshot, build_snapshot
+import dal
+
+REPEAT = 2000
+
+
+def main(num_users=2000, messages_per_user=1, follows_per_user=50):
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        populate(num_users, messages_per_user, follows_per_user)
+
+        path = os.path.join(tmp, "follow_graph.bin")
+        build_snapshot(path)
+        snapshot = Snapshot(path)
+        print(f"snapshot: {os.path.getsize(path) / 1024:.0f} KiB")
+
+        pairs = [(random.randint(1, num_users), random.randint(1, num_users))
+                 for i in range(REPEAT)]
+
+        def checks(status):
+            def run():
+                for follower_id, followed_id in pairs:
+                    status(follower_id, followed_id)
+            return run
+
+        query_ms = timed(checks(dal.follow_status), 1) / REPEAT
+        snapshot_ms = timed(checks(snapshot.status), 1) / REPEAT
+
+        print(f"query:    {query_ms * 1000:8.2f} us/check")
+        print(f"snapshot: {snapshot_ms * 1000:8.2f} us/check")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""First homepage load after login: cold vs. pre-warmed (see prewarm.py).
+
+    python -m benchmarks.prewarm [logins] [redirect_ms] [num_users]
+
+Each login picks a user the run hasn't seen, with the feed engine emptied
+first, so nothing of theirs is cached. Logins are simulated the way
+`do_login` does them, and the homepage is requested `redirect_ms` (10 by
+default) later, standing in for the browser following the redirect. The
+latencies are those the app records for /admin/prewarm, and the hit rate
+that of the homepage's takes. "other" serves the homepage from another
+worker's prewarmer, which only has the shared table to go by.
+
+As in benchmarks.serving, an in-memory SQLite DATABASE_URL is swapped for
+a temporary SQLite file, which the pre-warming thread can share.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+if os.environ['DATABASE_URL'] in ("sqlite://", "sqlite:///:memory:"):
+    os.environ['DATABASE_URL'] = f"sqlite:///{_tmp.name}/prewarm.db"
+
+from app import create_app, CURR_USER_KEY
+from benchmarks.dataset import populate
+from feed import feed_engine
+from unittest import mock
+
+from prewarm import TimelinePrewarmer, timeline_prewarmer
+from views.access import FIRST_LOAD_KEY
+
+
+def first_loads(app, user_ids, redirect_ms, warm, server):
+    client = app.test_client()
+    timeline_prewarmer.enabled = warm
+    hits, taken = _takes(server.stats())
+
+    for user_id in user_ids:
+        feed_engine.reset()
+        with client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user_id
+            sess[FIRST_LOAD_KEY] = True
+        timeline_prewarmer.submit(user_id)
+
+        time.sleep(redirect_ms / 1000)
+        with mock.patch('views.home.timeline_prewarmer', server):
+            client.get("/")
+
+    stats = server.stats()
+    hits_after, taken_after = _takes(stats)
+    return stats['warm' if warm else 'cold'], (hits_after - hits) / ((taken_after - taken) or 1)
+
+
+def _takes(stats):
+    return stats['hits'], sum(stats[outcome] for outcome in ('hits', 'misses', 'late', 'expired', 'failed'))
+
+
+def main(logins=100, redirect_ms=10, num_users=1000):
+    app = create_app()
+    with app.app_context():
+        populate(num_users, messages_per_user=50, follows_per_user=50)
+
+    other = TimelinePrewarmer(app)
+    runs = (('cold', False, timeline_prewarmer), ('warm', True, timeline_prewarmer), ('other', True, other))
+
+    print(f"{'':>6}{'loads':>7}{'mean ms':>10}{'median ms':>11}{'p95 ms':>9}{'hits':>7}   "
+          f"(redirect after {redirect_ms} ms)")
+    for run, (name, warm, server) in enumerate(runs):
+        user_ids = range(run * logins + 1, (run + 1) * logins + 1)
+        report, hit_rate = first_loads(app, user_ids, redirect_ms, warm, server)
+        print(f"{name:>6}{report['loads']:7}{report['mean_ms']:10.1f}"
+              f"{report['median_ms']:11.1f}{report['p95_ms']:9.1f}{hit_rate:7.0%}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
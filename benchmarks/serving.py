@@ -0,0 +1,96 @@
+"""Throughput of gunicorn (gunicorn.conf.py) with 1, 2, 4, ... workers.
+
+    python -m benchmarks.serving [max_workers] [seconds] [num_users]
+
+Every run gets the same load: 2 * max_workers client processes asking
+for public profile pages in a loop. The workers need a database they
+can all reach, so an in-memory SQLite DATABASE_URL is swapped for a
+temporary SQLite file; SQLite serializes writes but not these reads.
+"""
+
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PORT = 8123
+
+_tmp = tempfile.TemporaryDirectory()
+if os.environ['DATABASE_URL'] in ("sqlite://", "sqlite:///:memory:"):
+    os.environ['DATABASE_URL'] = f"sqlite:///{_tmp.name}/serving.db"
+
+from app import app
+from benchmarks.dataset import populate
+
+
+def client(args):
+    """Requests completed in `seconds` by one keep-alive-less client."""
+
+    num_users, seconds = args
+    deadline = time.perf_counter() + seconds
+    done = 0
+
+    while time.perf_counter() < deadline:
+        conn = http.client.HTTPConnection("127.0.0.1", PORT)
+        conn.request("GET", f"/users/{done % num_users + 1}")
+        conn.getresponse().read()
+        conn.close()
+        done += 1
+
+    return done
+
+
+def wait_until_up(timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("gunicorn did not start")
+
+
+def throughput(workers, clients, seconds, num_users):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{PORT}")
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                              cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up()
+        with multiprocessing.Pool(clients) as pool:
+            done = sum(pool.map(client, [(num_users, seconds)] * clients))
+    finally:
+        server.terminate()
+        server.wait()
+
+    return done / seconds
+
+
+def main(max_workers=4, seconds=10, num_users=200):
+    with app.app_context():
+        populate(num_users, messages_per_user=50, follows_per_user=20)
+        # nothing inherited by the gunicorn processes or the clients
+        app.extensions['sqlalchemy'].db.engine.dispose()
+
+    clients = 2 * max_workers
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>10}   ({clients} clients, {os.cpu_count()} CPUs)")
+    base = None
+    for workers in counts:
+        rate = throughput(workers, clients, seconds, num_users)
+        base = base or rate
+        print(f"{workers:8}{rate:10.0f}{rate / base:10.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""Cold start of each profile: importing the app module, create_app and
+the first request, each run in a fresh interpreter.
+
+    python -m benchmarks.startup [runs]
+
+A pre-fork server pays the import and create_app once per worker (or
+once in total with --preload), and the first request per worker; keep
+these low so workers can be restarted and scaled quickly.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from config import PROFILES
+
+# run in a new interpreter, so nothing is imported or cached yet
+CHILD = """
+import json, sys, time
+
+start = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+app = module.create_app(sys.argv[1])
+created = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first request': served - created,
+    'modules': len(sys.modules),
+    'toolbar': 'flask_debugtoolbar' in sys.modules,
+}))
+"""
+
+STAGES = ('import', 'create_app', 'first request')
+
+
+def cold_start(profile):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', CHILD, profile], cwd=root,
+                            stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)
+
+
+def main(runs=5):
+    print(f"{'':14}" + "".join(f"{stage:>15}" for stage in STAGES) + f"{'modules':>10}   (median ms)")
+
+    for profile in PROFILES:
+        results = [cold_start(profile) for _ in range(runs)]
+        medians = [statistics.median(result[stage] for result in results) * 1000
+                   for stage in STAGES]
+
+        toolbar = "  + debug toolbar" if results[0]['toolbar'] else ""
+        print(f"{profile:14}" + "".join(f"{ms:15.1f}" for ms in medians)
+              + f"{results[0]['modules']:10}{toolbar}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
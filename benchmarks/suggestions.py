@@ -0,0 +1,51 @@
+"""Time and peak memory of friends-of-friends scoring on a random graph.
+
+    python -m benchmarks.suggestions [num_users] [follows_per_user] [block_size]
+
+Scores every user's suggestions block by block, as `suggestions.compute`
+does, without the database round trips.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+from suggestions import FollowGraph, top_suggestions, BLOCK_SIZE
+
+
+def random_graph(num_users, follows_per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(num_users), follows_per_user)
+    # a few popular accounts, like real follow graphs
+    cols = (rng.pareto(1.5, len(rows)) * num_users / 50).astype(np.int64) % num_users
+    adjacency = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                  shape=(num_users, num_users))
+    adjacency.data[:] = 1
+
+    return FollowGraph(np.arange(num_users), adjacency, adjacency)
+
+
+def main(num_users=100000, follows_per_user=20, block_size=BLOCK_SIZE):
+    graph = random_graph(num_users, follows_per_user)
+    print(f"{num_users} users, {graph.feed.nnz} follows, blocks of {block_size}")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    stored = 0
+    for first in range(0, num_users, block_size):
+        rows = np.arange(first, min(first + block_size, num_users))
+        stored += sum(len(cols) for row, cols, scores in top_suggestions(graph, rows))
+
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+
+    print(f"{stored} suggestions in {elapsed:.1f}s, "
+          f"peak {peak / 2**20:.0f} MiB above the graph")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
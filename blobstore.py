@@ -0,0 +1,230 @@
+"""Content-addressed store for user avatar and header images.
+
+Images are kept on local disk under their SHA-256 digest; the user row only
+keeps a short "/blobs/<digest>.<ext>" URL. Identical images are stored once,
+blobs never change, and so they can be cached forever by browsers.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+
+from flask import current_app
+
+try:
+    from PIL import Image
+except ImportError:                     # pragma: no cover
+    Image = None
+
+BLOB_URL_PREFIX = "/blobs/"
+
+THUMBNAIL_VARIANT = "thumb"
+THUMBNAIL_SIZE = (96, 96)
+
+ALLOWED_TYPES = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+# leading bytes of each allowed type; WebP is "RIFF", a size, then "WEBP"
+SIGNATURES = {
+    'image/png': (b"\x89PNG\r\n\x1a\n",),
+    'image/jpeg': (b"\xff\xd8\xff",),
+    'image/gif': (b"GIF87a", b"GIF89a"),
+    'image/webp': (b"RIFF",),
+}
+
+DATA_URI_RE = re.compile(r"^data:(?P<type>[\w.+-]+/[\w.+-]+)(;[^,;]*)*?;base64,", re.I)
+
+BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z]+$")
+
+
+def check_image(data, content_type):
+    """Raise ValueError unless `data` is an image of `content_type`.
+
+    The leading bytes must match the type; with Pillow installed, the
+    image must also parse.
+    """
+
+    if content_type not in ALLOWED_TYPES:
+        raise ValueError(f"Unsupported image type: {content_type}")
+
+    if (not data.startswith(SIGNATURES[content_type]) or
+            content_type == 'image/webp' and data[8:12] != b"WEBP"):
+        raise ValueError(f"Not a valid {content_type} image")
+
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()
+        except Exception:
+            raise ValueError(f"Not a valid {content_type} image")
+
+
+class BlobStore:
+    """Directory of immutable blobs named by content digest."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name, variant=None):
+        """Filesystem path of blob `name`, optionally of one of its variants."""
+
+        if not BLOB_NAME_RE.match(name):
+            raise ValueError(f"Not a blob name: {name}")
+
+        filename = f"{variant}-{name}" if variant else name
+        return os.path.join(self.root, name[:2], filename)
+
+    def exists(self, name, variant=None):
+        return os.path.exists(self.path(name, variant))
+
+    def put(self, data, content_type):
+        """Store `data` and return its blob name (digest plus extension).
+
+        Raises ValueError if `data` isn't an image of `content_type`.
+        """
+
+        check_image(data, content_type)
+
+        name = hashlib.sha256(data).hexdigest() + ALLOWED_TYPES[content_type]
+        path = self.path(name)
+
+        if not os.path.exists(path):
+            self._write(path, data)
+
+        return name
+
+    def thumbnail(self, name):
+        """Path of the thumbnail of blob `name`, generating it once.
+
+        Without Pillow installed, the original image is used instead.
+        Raises ValueError if the blob isn't an image Pillow can read
+        (blobs stored before uploads were checked may not be).
+        """
+
+        path = self.path(name, THUMBNAIL_VARIANT)
+
+        if os.path.exists(path):
+            return path
+
+        if Image is None:
+            return self.path(name)
+
+        try:
+            with Image.open(self.path(name)) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                data = io.BytesIO()
+                image.save(data, format=image.format)
+        except Exception:
+            raise ValueError(f"Not an image: {name}")
+
+        self._write(path, data.getvalue())
+
+        return path
+
+    def _write(self, path, data):
+        """Write atomically, so readers never see a partial blob."""
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+
+def get_store():
+    """Blob store of the current app."""
+
+    return BlobStore(current_app.config['BLOB_STORE_PATH'])
+
+
+def blob_url(name):
+    return BLOB_URL_PREFIX + name
+
+
+def mimetype_for(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def store_data_uri(url):
+    """If `url` is a base64 data URI, store it and return its blob URL.
+
+    Any other URL is returned unchanged.
+    """
+
+    match = url and DATA_URI_RE.match(url)
+    if not match:
+        return url
+
+    try:
+        data = base64.b64decode(url[match.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return url
+
+    return blob_url(get_store().put(data, match.group('type').lower()))
+
+
+def store_upload(file_storage):
+    """Store an uploaded image (a werkzeug FileStorage); return its blob URL."""
+
+    return blob_url(get_store().put(file_storage.read(), file_storage.mimetype))
+
+
+def thumbnail_url(url):
+    """Jinja filter: URL of the thumbnail variant for blob-backed images."""
+
+    if url and url.startswith(BLOB_URL_PREFIX):
+        return f"{BLOB_URL_PREFIX}{THUMBNAIL_VARIANT}/{url[len(BLOB_URL_PREFIX):]}"
+
+    return url
+
+
+def migrate_data_uris(batch_size=100):
+    """Move data URIs stored in users' image columns into the blob store."""
+
+    from models import db, User
+
+    converted = 0
+    last_id = 0
+
+    while True:
+        users = (User
+                 .query
+                 .filter(User.id > last_id,
+                         User.image_url.like('data:%') |
+                         User.header_image_url.like('data:%'))
+                 .order_by(User.id)
+                 .limit(batch_size)
+                 .all())
+
+        if not users:
+            return converted
+
+        for user in users:
+            try:
+                user.image_url = store_data_uri(user.image_url)
+                user.header_image_url = store_data_uri(user.header_image_url)
+                converted += 1
+            except ValueError:
+                # not an image: leave the columns for an admin to look at
+                db.session.expire(user)
+        last_id = users[-1].id
+
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    # Run this module to move existing data URIs into the blob store.
+
+    from app import app
+
+    with app.app_context():
+        print(f"Converted images of {migrate_data_uris()} users.")
@@ -0,0 +1,69 @@
+"""Configuration profiles for `create_app`.
+
+The profile is picked by WARBLER_ENV, falling back to FLASK_ENV (so
+`FLASK_ENV=development flask run` gets the development profile), and is
+"production" when neither is set. Settings that differ between
+deployments still come from the environment.
+"""
+
+import os
+
+import pooling
+import slowlog
+
+DEFAULT_PROFILE = 'production'
+
+
+class Config:
+    """Settings shared by every profile."""
+
+    # Get DB_URI from environ variable (useful for production/testing) or,
+    # if not set there, use development local db.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres:///warbler')
+
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+    SECRET_KEY = os.environ.get('SECRET_KEY', "it's a secret")
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    FOLLOW_GRAPH_ENABLED = os.environ.get('FOLLOW_GRAPH_ENABLED') == '1'
+    LIKE_BUFFER_ENABLED = os.environ.get('LIKE_BUFFER_ENABLED', '1') == '1'
+    PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', '1') == '1'
+    PURGE_RESUME = os.environ.get('PURGE_RESUME', '1') == '1'
+    PARTITIONS_ENSURE = os.environ.get('PARTITIONS_ENSURE', '1') == '1'
+    TRENDING_CHECKPOINTS = os.environ.get('TRENDING_CHECKPOINTS', '1') == '1'
+
+    # 0 turns the slow-query log off; see slowlog.py
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', slowlog.DEFAULT_THRESHOLD_MS))
+
+    # per worker process; see pooling.py
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', pooling.DEFAULT_POOL_SIZE))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', pooling.DEFAULT_MAX_OVERFLOW))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', pooling.DEFAULT_POOL_TIMEOUT))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', pooling.DEFAULT_POOL_RECYCLE))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+    # Flask-DebugToolbar is only imported and installed when this is set
+    DEBUG_TB_ENABLED = False
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    TEMPLATES_AUTO_RELOAD = True
+    DEBUG_TB_ENABLED = True
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def profile_name():
+    """Profile chosen by the environment."""
+
+    return os.environ.get('WARBLER_ENV') or os.environ.get('FLASK_ENV') or DEFAULT_PROFILE
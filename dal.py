@@ -0,0 +1,260 @@
+"""Data-access layer for Warbler's hot read paths.
+
+The queries run on (nearly) every request are built once as SQLAlchemy
+baked queries: the Query object, its compiled SQL and its result metadata
+are cached, so a request only binds parameters and executes. Read paths
+return plain tuples instead of ORM objects, which skips identity-map and
+attribute instrumentation work.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import bindparam
+from sqlalchemy.ext import baked
+
+from followgraph import follow_graph
+from likebuffer import like_buffer
+from models import db, User, Message, Follows, Likes, FollowSuggestion, message_visible_to
+from partitions import recent_messages
+import snowflake
+
+bakery = baked.bakery()
+
+Author = namedtuple('Author', 'id username image_url')
+
+# quacks like a Message for the templates (message.user.username, ...)
+FeedRow = namedtuple('FeedRow', 'id text timestamp user_id user')
+
+# the numbers on a user's profile card
+UserCounts = namedtuple('UserCounts', 'messages following followers')
+
+
+def _session():
+    return db.session()
+
+
+def _feed_rows(rows):
+    return [FeedRow(message_id, text, timestamp, user_id, Author(user_id, username, image_url))
+            for message_id, text, timestamp, user_id, username, image_url in rows]
+
+
+def _feed_query(viewer_id, before=None):
+    """Baked query of feed rows visible to `viewer_id`, older than message
+    `before` if given."""
+
+    bq = bakery(lambda session: session
+                .query(Message.id, Message.text, Message.timestamp, Message.user_id,
+                       User.username, User.image_url)
+                .join(User, User.id == Message.user_id))
+
+    if viewer_id is None:
+        bq += lambda q: q.filter(message_visible_to(None))
+    else:
+        bq += lambda q: q.filter(message_visible_to(bindparam('viewer_id')))
+
+    if before is not None:
+        bq += lambda q: q.filter(Message.id < bindparam('before'))
+
+    return bq
+
+
+def _recent(bq, limit, now=None, **params):
+    """Newest `limit` rows of `bq`, newest month first (see partitions)."""
+
+    def newest_first(q):
+        return q.order_by(Message.id.desc()).limit(bindparam('limit'))
+
+    since = bq + (lambda q: q.filter(Message.timestamp >= bindparam('lower'))) + newest_first
+    until = bq + (lambda q: q.filter(Message.timestamp < bindparam('upper'))) + newest_first
+
+    def fetch(lower, upper, limit):
+        if upper is None:
+            return since(_session()).params(lower=lower, limit=limit, **params).all()
+        return until(_session()).params(upper=upper, limit=limit, **params).all()
+
+    return recent_messages(fetch, limit, now)
+
+
+def feed_author_ids(user_id):
+    """Ids of `user_id` and the authors they follow whose messages they may see."""
+
+    bq = bakery(lambda session: session
+                .query(Follows.user_being_followed_id)
+                .join(User, User.id == Follows.user_being_followed_id)
+                .filter(Follows.user_following_id == bindparam('user_id'),
+                        (Follows.following_confirmed_status == True) | (User.private == False)))
+
+    return [user_id] + [followed_id for (followed_id,) in bq(_session()).params(user_id=user_id)]
+
+
+def feed_rows_by_ids(ids, viewer_id):
+    """Feed rows of messages `ids` visible to `viewer_id`, in the order of `ids`."""
+
+    if not ids:
+        return []
+
+    bq = _feed_query(viewer_id)
+    bq += lambda q: q.filter(Message.id.in_(bindparam('ids', expanding=True)))
+
+    by_id = {row.id: row
+             for row in _feed_rows(bq(_session()).params(ids=list(ids), viewer_id=viewer_id))}
+
+    return [by_id[message_id] for message_id in ids if message_id in by_id]
+
+
+def _windows_end(now, before):
+    """Where `_recent`'s time windows end: message ids are time-ordered,
+    so messages older than `before` are older than its time."""
+
+    if now is None and before is not None:
+        return snowflake.to_datetime(before)
+
+    return now
+
+
+def home_feed(author_ids, viewer_id, limit, now=None, before=None):
+    """Newest `limit` visible messages by any of `author_ids`, older than
+    message `before` if given."""
+
+    bq = _feed_query(viewer_id, before)
+    bq += lambda q: q.filter(Message.user_id.in_(bindparam('author_ids', expanding=True)))
+
+    return _feed_rows(_recent(bq, limit, _windows_end(now, before), author_ids=list(author_ids),
+                              viewer_id=viewer_id, before=before))
+
+
+def profile_feed(user_id, viewer_id, limit, now=None, before=None):
+    """Newest `limit` messages of `user_id` visible to `viewer_id`, older
+    than message `before` if given."""
+
+    bq = _feed_query(viewer_id, before)
+    bq += lambda q: q.filter(Message.user_id == bindparam('user_id'))
+
+    return _feed_rows(_recent(bq, limit, _windows_end(now, before), user_id=user_id,
+                              viewer_id=viewer_id, before=before))
+
+
+def liked_ids(user_id, message_ids):
+    """Which of `message_ids` has `user_id` liked? (Toggles not yet
+    written included.)"""
+
+    if not message_ids:
+        return set()
+
+    bq = bakery(lambda session: session
+                .query(Likes.message_id)
+                .filter(Likes.user_id == bindparam('user_id'),
+                        Likes.message_id.in_(bindparam('message_ids', expanding=True))))
+
+    rows = bq(_session()).params(user_id=user_id, message_ids=list(message_ids))
+
+    return like_buffer.apply(user_id, message_ids, {message_id for (message_id,) in rows})
+
+
+def follow_status(follower_id, followed_id):
+    """None if not following, else whether the follow is confirmed."""
+
+    if follow_graph.available():
+        status = follow_graph.status(follower_id, followed_id)
+        # a follow another worker made since the last poll isn't in the graph yet
+        if status is not None:
+            return status
+
+    return _follow_statuses_db(follower_id, [followed_id]).get(followed_id)
+
+
+def follow_statuses(follower_id, user_ids):
+    """{user id: confirmed?} for those of `user_ids` `follower_id` follows."""
+
+    if not user_ids:
+        return {}
+
+    if not follow_graph.available():
+        return _follow_statuses_db(follower_id, user_ids)
+
+    statuses = {user_id: follow_graph.status(follower_id, user_id) for user_id in user_ids}
+    followed = {user_id: status for user_id, status in statuses.items() if status is not None}
+
+    # "not following" is checked with the database, as in follow_status
+    unknown = [user_id for user_id in statuses if user_id not in followed]
+    if unknown:
+        followed.update(_follow_statuses_db(follower_id, unknown))
+
+    return followed
+
+
+def _follow_statuses_db(follower_id, user_ids):
+    """`follow_statuses`, from the follows table."""
+
+    bq = bakery(lambda session: session
+                .query(Follows.user_being_followed_id, Follows.following_confirmed_status)
+                .filter(Follows.user_following_id == bindparam('follower_id'),
+                        Follows.user_being_followed_id.in_(bindparam('user_ids', expanding=True))))
+
+    rows = bq(_session()).params(follower_id=follower_id, user_ids=list(user_ids))
+
+    return {user_id: bool(confirmed) for user_id, confirmed in rows}
+
+
+def user_counts(user_id):
+    """UserCounts of `user_id`, in one statement."""
+
+    def counts(session):
+        messages = (session
+                    .query(db.func.count(Message.id))
+                    .filter(Message.user_id == bindparam('user_id')))
+        following = (session
+                     .query(db.func.count(Follows.user_being_followed_id))
+                     .filter(Follows.user_following_id == bindparam('user_id')))
+        followers = (session
+                     .query(db.func.count(Follows.user_following_id))
+                     .filter(Follows.user_being_followed_id == bindparam('user_id')))
+
+        return session.query(messages.as_scalar(), following.as_scalar(), followers.as_scalar())
+
+    return UserCounts(*bakery(counts)(_session()).params(user_id=user_id).one())
+
+
+def suggested_users(user_id, limit):
+    """Best `limit` "who to follow" suggestions for `user_id` not yet
+    followed (see suggestions.py)."""
+
+    bq = bakery(lambda session: session
+                .query(User.id, User.username, User.image_url)
+                .join(FollowSuggestion, FollowSuggestion.suggested_user_id == User.id)
+                .filter(FollowSuggestion.user_id == bindparam('user_id'),
+                        User.deleted_at == None,
+                        ~db.exists().where(db.and_(
+                            Follows.user_following_id == FollowSuggestion.user_id,
+                            Follows.user_being_followed_id == FollowSuggestion.suggested_user_id)))
+                .order_by(FollowSuggestion.score.desc(), FollowSuggestion.suggested_user_id)
+                .limit(bindparam('limit')))
+
+    return [Author(*row) for row in bq(_session()).params(user_id=user_id, limit=limit)]
+
+
+def authors_by_ids(ids):
+    """Public, not deleted users among `ids`, in the order of `ids`."""
+
+    if not ids:
+        return []
+
+    bq = bakery(lambda session: session
+                .query(User.id, User.username, User.image_url)
+                .filter(User.id.in_(bindparam('ids', expanding=True)),
+                        User.private == False,
+                        User.deleted_at == None))
+
+    by_id = {row.id: Author(*row) for row in bq(_session()).params(ids=list(ids))}
+
+    return [by_id[user_id] for user_id in ids if user_id in by_id]
+
+
+def credentials(username):
+    """(id, password hash) of `username`, or None."""
+
+    bq = bakery(lambda session: session
+                .query(User.id, User.password)
+                .filter(User.username == bindparam('username')))
+
+    return bq(_session()).params(username=username).first()
@@ -0,0 +1,165 @@
+"""Test database harness.
+
+Import this module before the app in a test module: it points the app at
+the test database and creates the tables once per process.
+DatabaseTestCase runs each test in a transaction that is rolled back
+afterwards, so tests don't wipe tables and leave nothing behind.
+
+The database is TEST_DATABASE_URL (default postgresql:///warbler-test).
+Each pytest-xdist worker gets its own PostgreSQL schema (or SQLite file),
+and TEST_DATABASE_URL=sqlite:// runs on a private in-memory database, so
+the suite can use every core:
+
+    TEST_DATABASE_URL=sqlite:// python -m pytest -n auto
+"""
+
+import os
+from unittest import TestCase
+
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session
+
+DEFAULT_TEST_DATABASE_URL = "postgresql:///warbler-test"
+
+IN_MEMORY_URLS = ("sqlite://", "sqlite:///:memory:")
+
+
+def worker_name():
+    """This pytest-xdist worker ("gw0", "gw1", ...), or "main"."""
+
+    return os.environ.get('PYTEST_XDIST_WORKER', 'main')
+
+
+def schema_name(worker):
+    return f"warbler_test_{worker}"
+
+
+def worker_database_url(url, worker):
+    """`url`, made private to `worker`.
+
+    PostgreSQL connections get a search_path of the worker's own schema;
+    SQLite files get the worker's name appended (and may be used from the
+    purge worker's thread). In-memory SQLite is already private to the
+    process.
+    """
+
+    if url.startswith("postgres"):
+        separator = "&" if "?" in url else "?"
+        return f"{url}{separator}options=-csearch_path%3D{schema_name(worker)}"
+
+    if url.startswith("sqlite") and url not in IN_MEMORY_URLS:
+        root, ext = os.path.splitext(url)
+        return f"{root}-{worker}{ext}?check_same_thread=false"
+
+    return url
+
+
+# like toggles are written in the request, logins don't pre-warm, slow
+# statements aren't explained, purges aren't resumed and trending counts
+# aren't checkpointed: a background thread would use the test's
+# connection at the same time as the test
+os.environ['LIKE_BUFFER_ENABLED'] = '0'
+os.environ['PREWARM_ENABLED'] = '0'
+os.environ['SLOW_QUERY_MS'] = '0'
+os.environ['PURGE_RESUME'] = '0'
+os.environ['TRENDING_CHECKPOINTS'] = '0'
+
+os.environ['DATABASE_URL'] = worker_database_url(
+    os.environ.get('TEST_DATABASE_URL', DEFAULT_TEST_DATABASE_URL), worker_name())
+
+from app import app
+from feed import feed_engine
+from models import db
+from trending import trending
+
+
+def enable_sqlite_savepoints(engine):
+    """Let SQLAlchemy, not pysqlite, begin SQLite transactions.
+
+    pysqlite only emits BEGIN before DML, which breaks SAVEPOINT; see
+    "Serializable isolation / Savepoints" in the SQLAlchemy SQLite docs.
+    """
+
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.execute("BEGIN")
+
+
+def create_tables():
+    """(Re)create the tables, in this worker's schema on PostgreSQL."""
+
+    if db.engine.dialect.name == 'postgresql':
+        schema = schema_name(worker_name())
+        with db.engine.begin() as connection:
+            connection.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            connection.execute(f"CREATE SCHEMA {schema}")
+    else:
+        db.drop_all()
+
+    db.create_all()
+
+
+if db.engine.dialect.name == 'sqlite':
+    enable_sqlite_savepoints(db.engine)
+
+create_tables()
+
+
+class SavepointSession(SignallingSession):
+    """Session on the test's connection whose commits and rollbacks end
+    at a SAVEPOINT, which is then restarted."""
+
+    def __init__(self, db, connection):
+        super().__init__(db, bind=connection, binds={})
+        self._closing = False
+        event.listen(self, "after_transaction_end", self._restart_savepoint)
+        self.begin_nested()
+
+    def _restart_savepoint(self, session, transaction):
+        if transaction.nested and not transaction._parent.nested and not self._closing:
+            self.expire_all()
+            self.begin_nested()
+
+    def close(self):
+        # closing a session doesn't end its SAVEPOINT on the shared
+        # connection; roll it back, as closing would a transaction
+        self._closing = True
+        try:
+            if self.transaction is not None and self.transaction.nested:
+                self.rollback()
+            super().close()
+        finally:
+            self._closing = False
+
+
+class DatabaseTestCase(TestCase):
+    """TestCase whose database changes are rolled back after each test.
+
+    Every session used during a test -- the test's own, those of test
+    client requests and of background workers -- shares one connection
+    and transaction, so the app's commits are visible to the test but
+    never reach the database.
+    """
+
+    def setUp(self):
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+
+        app_session = db.session
+        db.session = scoped_session(lambda: SavepointSession(db, self.connection))
+        self.addCleanup(self._end_transaction, app_session)
+
+        feed_engine.reset()
+        trending.reset()
+
+    def _end_transaction(self, app_session):
+        db.session.remove()
+        db.session = app_session
+
+        self.transaction.rollback()
+        self.connection.close()
@@ -0,0 +1,183 @@
+"""Streaming export of an account's messages, likes and follow lists.
+
+An export is a stream of records, one section after the other (see
+SECTIONS), each section oldest first. Records are read EXPORT_CHUNK rows
+at a time with `yield_per`, which on PostgreSQL uses a server-side cursor,
+and written out as soon as a chunk is ready; memory use doesn't grow with
+the size of the account.
+
+Every record carries a cursor, "<section>:<time>-<id>" (see pagination).
+An interrupted download resumes with `?after=<cursor of the last record
+received>`, and `?limit=<n>` splits an export into several downloads.
+"""
+
+import csv
+import io
+import json
+
+from models import db, User, Message, Likes, Follows, message_visible_to
+from pagination import encode_cursor, decode_cursor
+
+SECTIONS = ('messages', 'likes', 'following', 'followers')
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# rows fetched per database round trip
+EXPORT_CHUNK = 1000
+
+# output is sent in pieces of about this many bytes
+WRITE_BUFFER = 64 * 1024
+
+CSV_FIELDS = ('section', 'cursor', 'id', 'created_at', 'user_id', 'username',
+              'text', 'confirmed')
+
+
+class BadCursor(ValueError):
+    """An `after` cursor that isn't one of ours."""
+
+
+def parse_cursor(cursor):
+    """(section, time, id) of an export cursor; BadCursor if it is invalid."""
+
+    section, _, position = cursor.partition(':')
+    position = decode_cursor(position)
+
+    if section not in SECTIONS or position is None:
+        raise BadCursor(cursor)
+
+    return (section,) + position
+
+
+def _after(query, time_column, id_column, position):
+    """`query` in (`time_column`, `id_column`) order, after `position`."""
+
+    if position:
+        time, row_id = position
+        query = query.filter(db.or_(
+            time_column > time,
+            db.and_(time_column == time, id_column > row_id)))
+
+    return query.order_by(time_column, id_column).yield_per(EXPORT_CHUNK)
+
+
+def _messages(user_id, position):
+    query = (db.session
+             .query(Message.timestamp, Message.id, Message.text)
+             .filter(Message.user_id == user_id))
+
+    for timestamp, message_id, text in _after(query, Message.timestamp, Message.id, position):
+        yield timestamp, message_id, {'id': str(message_id), 'text': text}
+
+
+def _likes(user_id, position):
+    """Liked messages the user may still see."""
+
+    query = (db.session
+             .query(Likes.created_at, Likes.id, Message.id, Message.text,
+                    Message.user_id, User.username)
+             .join(Message, Message.id == Likes.message_id)
+             .join(User, User.id == Message.user_id)
+             .filter(Likes.user_id == user_id, message_visible_to(user_id)))
+
+    for liked_at, like_id, message_id, text, author_id, username in _after(
+            query, Likes.created_at, Likes.id, position):
+        yield liked_at, like_id, {'id': str(message_id), 'text': text,
+                                  'user_id': author_id, 'username': username}
+
+
+def _follows(user_id, position, own_column, other_column):
+    query = (db.session
+             .query(Follows.created_at, other_column, User.username,
+                    Follows.following_confirmed_status)
+             .join(User, User.id == other_column)
+             .filter(own_column == user_id))
+
+    for followed_at, other_id, username, confirmed in _after(
+            query, Follows.created_at, other_column, position):
+        yield followed_at, other_id, {'user_id': other_id, 'username': username,
+                                      'confirmed': bool(confirmed)}
+
+
+def _following(user_id, position):
+    return _follows(user_id, position, Follows.user_following_id, Follows.user_being_followed_id)
+
+
+def _followers(user_id, position):
+    return _follows(user_id, position, Follows.user_being_followed_id, Follows.user_following_id)
+
+
+READERS = {
+    'messages': _messages,
+    'likes': _likes,
+    'following': _following,
+    'followers': _followers,
+}
+
+
+def records(user_id, after=None, limit=None):
+    """Yield the export records of `user_id` as dicts, resuming after the
+    `after` cursor and stopping after `limit` records."""
+
+    if after:
+        section, *position = parse_cursor(after)
+        start = SECTIONS.index(section)
+    else:
+        start, position = 0, None
+
+    count = 0
+    for section in SECTIONS[start:]:
+        for time, row_id, record in READERS[section](user_id, position):
+            if limit is not None and count >= limit:
+                return
+
+            yield dict(record, section=section, created_at=time.isoformat(),
+                       cursor=f"{section}:{encode_cursor(time, row_id)}")
+            count += 1
+
+        position = None
+
+
+def _buffered(pieces):
+    """Join small strings into writes of about WRITE_BUFFER bytes."""
+
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= WRITE_BUFFER:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+def csv_lines(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, CSV_FIELDS)
+
+    def line(write, *args):
+        write(*args)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    yield line(writer.writeheader)
+    for record in records:
+        yield line(writer.writerow, record)
+
+
+def stream(user_id, format='ndjson', after=None, limit=None):
+    """Export of `user_id` as chunks of text in `format` (see FORMATS)."""
+
+    lines = ndjson_lines if format == 'ndjson' else csv_lines
+    return _buffered(lines(records(user_id, after, limit)))
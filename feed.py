@@ -0,0 +1,198 @@
+"""In-memory feed engine for the homepage timeline.
+
+For every recently active author we keep a bounded buffer of the ids of
+their newest messages. A viewer's feed page is a heap merge of the buffers
+of the authors they follow, so the database is only asked for the handful
+of messages that end up on the page.
+
+Buffers live in the worker process. Writes made through this process
+(`messages_add`, `messages_destroy`) update them right away; buffers older
+than `FEED_BUFFER_TTL` seconds are reloaded, which bounds how stale a feed
+can be for messages written by other workers.
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+
+from models import db, Message
+
+# ids kept per author; should be at least the feed page size
+DEFAULT_BUFFER_SIZE = 100
+
+# memory budget: at most this many author buffers are kept (LRU)
+DEFAULT_MAX_AUTHORS = 10000
+
+# seconds before a buffer is reloaded from the database
+DEFAULT_BUFFER_TTL = 30
+
+
+class AuthorBuffer:
+    """Newest-first message ids of one author.
+
+    Message ids are time-ordered (see snowflake.py), so they double as the
+    sort key.
+    """
+
+    __slots__ = ('entries', 'loaded_at')
+
+    def __init__(self, entries, size):
+        self.entries = deque(entries, maxlen=size)
+        self.loaded_at = time.monotonic()
+
+
+class FeedEngine:
+    """Per-author recent-message buffers merged into feeds on read."""
+
+    def __init__(self, app=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 max_authors=DEFAULT_MAX_AUTHORS, ttl=DEFAULT_BUFFER_TTL):
+        self.buffer_size = buffer_size
+        self.max_authors = max_authors
+        self.ttl = ttl
+        self.enabled = True
+        self._buffers = OrderedDict()
+        self._lock = threading.RLock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('FEED_ENGINE_ENABLED', True)
+        self.buffer_size = app.config.setdefault('FEED_BUFFER_SIZE', self.buffer_size)
+        self.max_authors = app.config.setdefault('FEED_MAX_AUTHORS', self.max_authors)
+        self.ttl = app.config.setdefault('FEED_BUFFER_TTL', self.ttl)
+        app.extensions['feed_engine'] = self
+
+    def add(self, message):
+        """Record a newly created message in its author's buffer."""
+
+        with self._lock:
+            buffer = self._buffers.get(message.user_id)
+            if buffer is not None:
+                buffer.entries.appendleft(message.id)
+
+    def remove(self, message):
+        """Forget a deleted message.
+
+        A full buffer is dropped instead, since the message that should
+        now move into it is unknown; it gets reloaded on the next read.
+        """
+
+        with self._lock:
+            buffer = self._buffers.get(message.user_id)
+            if buffer is None:
+                return
+
+            if len(buffer.entries) == buffer.entries.maxlen:
+                del self._buffers[message.user_id]
+            else:
+                buffer.entries = deque(
+                    (message_id for message_id in buffer.entries if message_id != message.id),
+                    maxlen=self.buffer_size)
+
+    def forget(self, author_id):
+        """Drop `author_id`'s buffer, e.g. after a bulk import; it gets
+        reloaded on the next read."""
+
+        with self._lock:
+            self._buffers.pop(author_id, None)
+
+    def reset(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def feed_ids(self, author_ids, limit):
+        """Ids of the `limit` newest messages by any of `author_ids`."""
+
+        buffers = self._get_buffers(set(author_ids))
+        merged = heapq.merge(*buffers, reverse=True)
+
+        return list(islice(merged, limit))
+
+    def warm_up(self, author_ids=None, limit=None):
+        """Preload buffers, by default for the most recently active authors."""
+
+        if author_ids is None:
+            recent = (db.session
+                      .query(Message.user_id)
+                      .group_by(Message.user_id)
+                      .order_by(db.func.max(Message.id).desc())
+                      .limit(limit or self.max_authors))
+            author_ids = [user_id for (user_id,) in recent]
+
+        self._get_buffers(set(author_ids))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'authors': len(self._buffers),
+                'entries': sum(len(b.entries) for b in self._buffers.values()),
+                'max_entries': self.max_authors * self.buffer_size,
+            }
+
+    def _get_buffers(self, author_ids):
+        """Snapshots of the buffers of `author_ids`, loading missing ones."""
+
+        now = time.monotonic()
+        found = {}
+
+        with self._lock:
+            for author_id in author_ids:
+                buffer = self._buffers.get(author_id)
+                if buffer is not None and now - buffer.loaded_at < self.ttl:
+                    self._buffers.move_to_end(author_id)
+                    found[author_id] = list(buffer.entries)
+
+        missing = author_ids - found.keys()
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                for author_id in missing:
+                    entries = loaded.get(author_id, [])
+                    self._buffers[author_id] = AuthorBuffer(entries, self.buffer_size)
+                    self._buffers.move_to_end(author_id)
+                    found[author_id] = entries
+                while len(self._buffers) > self.max_authors:
+                    self._buffers.popitem(last=False)
+
+        return found.values()
+
+    def _load(self, author_ids):
+        """Newest `buffer_size` messages of each author, in one query."""
+
+        rank = (db.func.row_number()
+                .over(partition_by=Message.user_id,
+                      order_by=Message.id.desc())
+                .label('rank'))
+
+        ranked = (db.session
+                  .query(Message.user_id, Message.id, rank)
+                  .filter(Message.user_id.in_(author_ids))
+                  .subquery())
+
+        rows = (db.session
+                .query(ranked.c.user_id, ranked.c.id)
+                .filter(ranked.c.rank <= self.buffer_size)
+                .order_by(ranked.c.user_id, ranked.c.id.desc()))
+
+        loaded = {}
+        for user_id, message_id in rows:
+            loaded.setdefault(user_id, []).append(message_id)
+
+        return loaded
+
+
+feed_engine = FeedEngine()
+
+
+def messages_by_ids(ids, *criteria):
+    """Load messages for `ids` matching `criteria`, keeping the order of `ids`."""
+
+    if not ids:
+        return []
+
+    by_id = {msg.id: msg for msg in Message.query.filter(Message.id.in_(ids), *criteria)}
+
+    return [by_id[message_id] for message_id in ids if message_id in by_id]
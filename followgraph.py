@@ -0,0 +1,282 @@
+"""Memory-mapped snapshot of the follow graph, shared by worker processes.
+
+The snapshot is one file in CSR layout:
+
+    header | offsets: int32[max user id + 2] | targets: int32[follows]
+           | confirmed: 1 bit per follow
+
+The users followed by user u are `targets[offsets[u]:offsets[u + 1]]`,
+sorted, so a follow check is a binary search; bit i of `confirmed` says
+whether follow i is confirmed. Workers mmap the file read-only, so the
+operating system keeps a single copy in memory for all of them.
+
+Follows changed since the snapshot was built live in a small in-memory
+delta log: changes made by this process are recorded as they happen, and
+follows created by other processes are polled every
+FOLLOW_GRAPH_POLL_INTERVAL seconds. Unfollows and confirmations made by
+other processes show up with the next rebuild, at most
+FOLLOW_GRAPH_REBUILD_INTERVAL seconds later; follow checks only pick the
+follow buttons to show, while message visibility is always checked in SQL.
+"Not following" is confirmed with the database by `dal`, as a follow
+made by another process since the last poll would be missed, and the
+follow views check the follows table before changing it.
+
+A stale or missing snapshot is rebuilt in a background thread by
+whichever worker notices first, or from cron:
+
+    python followgraph.py
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from models import db, User, Follows
+
+MAGIC = b"WFGRAPH1"
+
+# magic, offsets count, follows count, build start (unix time)
+HEADER = struct.Struct("=8sIId4x")
+
+# seconds between snapshot rebuilds
+DEFAULT_REBUILD_INTERVAL = 600
+
+# seconds between checks for a new snapshot and for new follows
+DEFAULT_POLL_INTERVAL = 5
+
+# follows fetched per database round trip while building
+BUILD_CHUNK = 50000
+
+
+def build_snapshot(path):
+    """Write a snapshot of the follows table to `path`, atomically."""
+
+    built_at = time.time()
+
+    max_id = db.session.query(db.func.max(User.id)).scalar() or 0
+    offsets = array('i', bytes(4 * (max_id + 2)))
+    targets = array('i')
+    confirmed = bytearray()
+
+    query = (db.session
+             .query(Follows.user_following_id, Follows.user_being_followed_id,
+                    Follows.following_confirmed_status)
+             .order_by(Follows.user_following_id, Follows.user_being_followed_id)
+             .yield_per(BUILD_CHUNK))
+
+    for follower_id, followed_id, is_confirmed in query:
+        index = len(targets)
+        if index % 8 == 0:
+            confirmed.append(0)
+        if is_confirmed:
+            confirmed[-1] |= 1 << (index % 8)
+
+        offsets[follower_id + 1] += 1
+        targets.append(followed_id)
+
+    for user_id in range(1, len(offsets)):
+        offsets[user_id] += offsets[user_id - 1]
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(offsets), len(targets), built_at))
+        offsets.tofile(f)
+        targets.tofile(f)
+        f.write(confirmed)
+
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """Read-only view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, num_offsets, num_targets, self.built_at = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"not a follow graph snapshot: {path}")
+
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self.offsets = view[start:start + 4 * num_offsets].cast('i')
+        start += 4 * num_offsets
+        self.targets = view[start:start + 4 * num_targets].cast('i')
+        start += 4 * num_targets
+        self.confirmed = view[start:]
+
+    def status(self, follower_id, followed_id):
+        """None if not following, else whether the follow is confirmed."""
+
+        if follower_id + 1 >= len(self.offsets):
+            return None
+
+        lo, hi = self.offsets[follower_id], self.offsets[follower_id + 1]
+        index = bisect_left(self.targets, followed_id, lo, hi)
+
+        if index == hi or self.targets[index] != followed_id:
+            return None
+
+        return bool(self.confirmed[index // 8] & (1 << (index % 8)))
+
+
+class FollowGraph:
+    """Follow checks against the shared snapshot plus this process's delta log."""
+
+    def __init__(self, app=None, rebuild_interval=DEFAULT_REBUILD_INTERVAL,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.app = app
+        self.enabled = False
+        self.path = None
+        self.rebuild_interval = rebuild_interval
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._mtime = None
+        self._polled_at = None
+        self._checked_at = 0
+        # (follower id, followed id): (status, unix time recorded)
+        self._delta = {}
+        self._lock = threading.RLock()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('FOLLOW_GRAPH_ENABLED', False)
+        self.path = app.config.setdefault(
+            'FOLLOW_GRAPH_PATH', os.path.join(app.instance_path, 'follow_graph.bin'))
+        self.rebuild_interval = app.config.setdefault(
+            'FOLLOW_GRAPH_REBUILD_INTERVAL', self.rebuild_interval)
+        self.poll_interval = app.config.setdefault(
+            'FOLLOW_GRAPH_POLL_INTERVAL', self.poll_interval)
+        app.extensions['follow_graph'] = self
+
+    def available(self):
+        """Can follow checks be answered here? (Otherwise ask the database.)"""
+
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.poll_interval:
+                self._refresh()
+                self._checked_at = time.monotonic()
+
+            return self._snapshot is not None
+
+    def status(self, follower_id, followed_id):
+        """None if not following, else whether the follow is confirmed."""
+
+        with self._lock:
+            change = self._delta.get((follower_id, followed_id))
+            snapshot = self._snapshot
+
+        if change is not None:
+            return change[0]
+
+        return snapshot.status(follower_id, followed_id)
+
+    def record(self, follower_id, followed_id, status):
+        """Note a follow made (False), confirmed (True) or removed (None)."""
+
+        if self.enabled:
+            with self._lock:
+                self._delta[(follower_id, followed_id)] = (status, time.time())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built_at': self._snapshot and self._snapshot.built_at,
+                'follows': self._snapshot and len(self._snapshot.targets),
+                'delta': len(self._delta),
+            }
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime is not None and mtime != self._mtime:
+            self._load(mtime)
+
+        if self._snapshot is not None:
+            self._poll_new_follows()
+
+        if mtime is None or time.time() - mtime > self.rebuild_interval:
+            self._start_rebuild()
+
+    def _load(self, mtime):
+        snapshot = Snapshot(self.path)
+
+        self._snapshot = snapshot
+        self._mtime = mtime
+        self._polled_at = snapshot.built_at
+        self._delta = {key: change for key, change in self._delta.items()
+                       if change[1] >= snapshot.built_at}
+
+    def _poll_new_follows(self):
+        """Add follows created by any process since the last poll to the delta."""
+
+        started = time.time()
+        # a second of slack for clock differences with the database server
+        since = datetime.utcfromtimestamp(self._polled_at) - timedelta(seconds=1)
+
+        new_follows = (db.session
+                       .query(Follows.user_following_id, Follows.user_being_followed_id,
+                              Follows.following_confirmed_status)
+                       .filter(Follows.created_at > since))
+
+        for follower_id, followed_id, is_confirmed in new_follows:
+            self._delta.setdefault((follower_id, followed_id), (bool(is_confirmed), started))
+
+        self._polled_at = started
+
+    def _start_rebuild(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._rebuild, name="warbler-follow-graph", daemon=True)
+            self._thread.start()
+
+    def _rebuild(self):
+        """Rebuild the snapshot unless another process already is."""
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with open(f"{self.path}.lock", 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            # another process may have just finished a rebuild
+            try:
+                if time.time() - os.stat(self.path).st_mtime < self.rebuild_interval:
+                    return
+            except FileNotFoundError:
+                pass
+
+            with self.app.app_context():
+                try:
+                    build_snapshot(self.path)
+                finally:
+                    db.session.remove()
+
+
+follow_graph = FollowGraph()
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        build_snapshot(app.config['FOLLOW_GRAPH_PATH'])
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, TextAreaField, BooleanField
 from wtforms.validators import DataRequired, Email, Length, EqualTo
 
@@ -25,7 +26,9 @@ class UserEditForm(FlaskForm):
     username = StringField('Username')
     email = StringField('E-mail', validators=[Email()])
     image_url = StringField('Image URL')
+    image_file = FileField('Upload image', validators=[FileAllowed(['png', 'jpg', 'jpeg', 'gif', 'webp'])])
     header_image_url = StringField('Header Image URL')
+    header_image_file = FileField('Upload header image', validators=[FileAllowed(['png', 'jpg', 'jpeg', 'gif', 'webp'])])
     bio = TextAreaField('Bio')
     private = BooleanField('Private account')
     password = PasswordField('Password')
@@ -0,0 +1,116 @@
+"""Gunicorn settings for serving Warbler with several worker processes.
+
+    gunicorn -c gunicorn.conf.py
+
+The app is built once in the master (preload_app) and the workers fork
+with it ready. pooling.py makes sure no worker inherits the master's
+database connections. Each worker opens its own pool, so the database
+sees at most WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+connections from this host; that figure is logged at startup.
+
+Worker classes (WEB_WORKER_CLASS):
+
+    sync    one request at a time per worker (the default)
+    gevent  up to WEB_WORKER_CONNECTIONS requests in flight per worker;
+            while one waits on the database, the others run
+
+Warbler's requests mostly wait on the database, so a gevent worker holds
+many more of them than a sync one; measure with
+
+    python -m benchmarks.concurrency
+
+Under gevent, psycopg2 is made cooperative with psycogreen, and the
+worker's threads (purge, follow graph rebuilds) become greenlets. In-flight
+requests queue for the worker's DB_POOL_SIZE + DB_MAX_OVERFLOW
+connections, so raise those (or put PgBouncer in front, see pooling.py)
+together with WEB_WORKER_CONNECTIONS. Request profiles (profiler.py) then
+also count the time of requests that ran meanwhile.
+
+Every worker gets its own Snowflake worker id for message ids (see
+snowflake.py): SNOWFLAKE_WORKER_ID_BASE plus the lowest worker slot not
+in use. A slot is freed when its worker exits, so workers recycled by
+max_requests reuse slots rather than running through ids. With several
+hosts, give each host its own range, e.g. BASE = host number * 64.
+SNOWFLAKE_WORKER_ID itself is refused: every worker would inherit it.
+"""
+
+import multiprocessing
+import os
+
+import pooling
+import snowflake
+
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'sync')
+
+# requests in flight per gevent worker
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 1000))
+
+if worker_class == 'gevent':
+    # before the app, and everything it imports, is preloaded
+    from gevent import monkey
+    monkey.patch_all()
+
+    # psycopg2 waits for PostgreSQL in C, blocking every greenlet, unless told to yield
+    if os.environ.get('DATABASE_URL', 'postgres').startswith('postgres'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+wsgi_app = "app:create_app()"
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# threads per worker; keep DB_POOL_SIZE at least this high
+threads = int(os.environ.get('WEB_THREADS', 1))
+
+preload_app = True
+
+# restart workers now and then, so slow leaks can't build up
+max_requests = 2000
+max_requests_jitter = 200
+
+timeout = 30
+
+snowflake_worker_id_base = int(os.environ.get('SNOWFLAKE_WORKER_ID_BASE', 0))
+
+# Snowflake worker slots of the running workers (kept in the master)
+_slots_in_use = set()
+
+
+def on_starting(server):
+    if 'SNOWFLAKE_WORKER_ID' in os.environ:
+        raise RuntimeError("SNOWFLAKE_WORKER_ID would be shared by all workers; "
+                           "set SNOWFLAKE_WORKER_ID_BASE instead")
+
+
+def when_ready(server):
+    pool_size = int(os.environ.get('DB_POOL_SIZE', pooling.DEFAULT_POOL_SIZE))
+    max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', pooling.DEFAULT_MAX_OVERFLOW))
+
+    server.log.info("At most %d database connections from %d workers",
+                    server.cfg.workers * (pool_size + max_overflow), server.cfg.workers)
+
+
+def pre_fork(server, worker):
+    slot = 0
+    while slot in _slots_in_use:
+        slot += 1
+
+    worker_id = snowflake_worker_id_base + slot
+    if worker_id > snowflake.MAX_WORKER_ID:
+        raise RuntimeError(f"Snowflake worker id {worker_id} is out of range; "
+                           f"lower SNOWFLAKE_WORKER_ID_BASE or the number of workers")
+
+    _slots_in_use.add(slot)
+    worker.snowflake_slot = slot
+
+
+def post_fork(server, worker):
+    worker_id = snowflake_worker_id_base + worker.snowflake_slot
+    snowflake.set_worker_id(worker_id)
+    server.log.info("Worker %s makes Snowflake ids as worker %d", worker.pid, worker_id)
+
+
+def child_exit(server, worker):
+    _slots_in_use.discard(getattr(worker, 'snowflake_slot', None))
@@ -0,0 +1,246 @@
+"""Bulk import of messages and follows from NDJSON, e.g. when migrating
+accounts from other systems.
+
+Each line is one JSON object in the export format (see export.py):
+
+    {"section": "messages", "text": "hello", "created_at": "2019-05-01T12:00:00"}
+    {"section": "following", "user_id": 42}
+
+`created_at` is optional; other keys are ignored. Lines are validated as
+they are read, and every IMPORT_BATCH lines the valid rows are inserted
+with `bulk_insert_mappings` and committed, so memory use doesn't grow with
+the size of the import and a bad batch doesn't undo the ones before it.
+
+Messages with a `created_at` get ids from `snowflake.from_datetime` with
+a hash of the account and text as sequence, so importing them again skips
+those already imported, even from a file with lines added, removed or
+reordered; follows that already exist are skipped too. Imported
+messages don't count towards trending, and imported follows are follow
+requests, like those made through `add_follow`. Tags and mentions of
+imported messages are indexed in the same transaction (see tags.py).
+"""
+
+import json
+import time
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import DBAPIError
+
+import snowflake
+import tags
+from models import db, User, Message, Follows
+
+# lines validated and inserted per transaction
+IMPORT_BATCH = 1000
+
+# errors reported per batch; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+MAX_TEXT_LENGTH = Message.text.type.length
+
+
+class Batch:
+    """Rows and errors of a run of consecutive lines."""
+
+    def __init__(self, first_line):
+        self.first_line = first_line
+        self.last_line = first_line
+        # [(line, row)]; {followed id: line}
+        self.messages = []
+        self.follows = {}
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []
+
+    def __len__(self):
+        return self.last_line - self.first_line + 1
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def report(self, inserted, seconds):
+        return {
+            'lines': [self.first_line, self.last_line],
+            'inserted': inserted,
+            'skipped': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(seconds, 4),
+        }
+
+
+def parse_time(value):
+    """Naive UTC datetime from an ISO 8601 string; ValueError if invalid."""
+
+    if not isinstance(value, str):
+        raise ValueError("created_at is not a string")
+
+    created_at = datetime.fromisoformat(value)
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    if not snowflake.EPOCH <= created_at <= datetime.utcnow():
+        raise ValueError(f"created_at is before {snowflake.EPOCH:%Y-%m-%d} or in the future")
+
+    return created_at
+
+
+def parse_message(user_id, record):
+    text = record.get('text')
+
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text is missing")
+
+    if len(text) > MAX_TEXT_LENGTH:
+        raise ValueError(f"text is longer than {MAX_TEXT_LENGTH} characters")
+
+    if record.get('created_at') is None:
+        return {'id': snowflake.next_id(), 'text': text,
+                'timestamp': datetime.utcnow(), 'user_id': user_id}
+
+    created_at = parse_time(record['created_at'])
+    sequence = zlib.crc32(f"{user_id}:{text}".encode())
+    return {'id': snowflake.from_datetime(created_at, sequence=sequence), 'text': text,
+            'timestamp': created_at, 'user_id': user_id}
+
+
+def parse_follow(user_id, record):
+    followed_id = record.get('user_id')
+
+    if not isinstance(followed_id, int) or isinstance(followed_id, bool):
+        raise ValueError("user_id is not an integer")
+
+    if followed_id == user_id:
+        raise ValueError("can't follow yourself")
+
+    return followed_id
+
+
+def add_line(batch, user_id, line, text):
+    """Validate `text`, line number `line`, into `batch`'s rows or errors."""
+
+    try:
+        record = json.loads(text)
+        if not isinstance(record, dict):
+            raise ValueError("not a JSON object")
+
+        section = record.get('section')
+        if section == 'messages':
+            batch.messages.append((line, parse_message(user_id, record)))
+        elif section == 'following':
+            batch.follows.setdefault(parse_follow(user_id, record), line)
+        else:
+            raise ValueError(f"can't import section {section!r}")
+
+    except ValueError as exc:
+        batch.error(line, str(exc))
+
+
+def _new_messages(batch):
+    """Batch's messages not imported before; errors for taken ids."""
+
+    ids = [row['id'] for line, row in batch.messages]
+    taken = {message_id: (user_id, text) for message_id, user_id, text in db.session
+             .query(Message.id, Message.user_id, Message.text)
+             .filter(Message.id.in_(ids))}
+
+    rows = []
+    for line, row in batch.messages:
+        owner = taken.get(row['id'])
+        if owner is None:
+            rows.append(row)
+            # the same message may come twice in one file
+            taken[row['id']] = (row['user_id'], row['text'])
+        elif owner == (row['user_id'], row['text']):
+            batch.skipped += 1
+        else:
+            batch.error(line, "message id is taken; change created_at by a millisecond")
+
+    return rows
+
+
+def _new_follows(batch, user_id):
+    """Batch's follows of existing users not already followed."""
+
+    followed_ids = list(batch.follows)
+    existing = {followed_id for (followed_id,) in db.session
+                .query(User.id)
+                .filter(User.id.in_(followed_ids), User.deleted_at.is_(None))}
+    following = {followed_id for (followed_id,) in db.session
+                 .query(Follows.user_being_followed_id)
+                 .filter(Follows.user_following_id == user_id,
+                         Follows.user_being_followed_id.in_(followed_ids))}
+
+    rows = []
+    for followed_id, line in batch.follows.items():
+        if followed_id not in existing:
+            batch.error(line, f"no user {followed_id}")
+        elif followed_id in following:
+            batch.skipped += 1
+        else:
+            rows.append({'user_following_id': user_id,
+                         'user_being_followed_id': followed_id,
+                         'following_confirmed_status': False})
+
+    return rows
+
+
+def insert_batch(batch, user_id):
+    """Insert the valid rows of `batch` in one transaction; its report."""
+
+    started = time.perf_counter()
+
+    messages = _new_messages(batch) if batch.messages else []
+    follows = _new_follows(batch, user_id) if batch.follows else []
+
+    try:
+        db.session.bulk_insert_mappings(Message, messages)
+        db.session.bulk_insert_mappings(Follows, follows)
+        tags.index_messages((row['id'], row['text']) for row in messages)
+        db.session.commit()
+        inserted = len(messages) + len(follows)
+    except DBAPIError as exc:
+        db.session.rollback()
+        batch.error(batch.first_line, f"batch not imported: {exc.orig}")
+        inserted = 0
+
+    return batch.report(inserted, time.perf_counter() - started)
+
+
+def import_lines(user_id, lines, batch_size=None):
+    """Import NDJSON `lines` (str or bytes) into account `user_id`.
+
+    Returns the report: totals, throughput and a report per batch.
+    """
+
+    batch_size = batch_size or IMPORT_BATCH
+    started = time.perf_counter()
+    batches = []
+    batch = Batch(first_line=1)
+
+    for line, text in enumerate(lines, 1):
+        batch.last_line = line
+        if text.strip():
+            add_line(batch, user_id, line, text)
+
+        if len(batch) >= batch_size:
+            batches.append(insert_batch(batch, user_id))
+            batch = Batch(first_line=line + 1)
+
+    if batch.messages or batch.follows or batch.error_count:
+        batches.append(insert_batch(batch, user_id))
+
+    seconds = time.perf_counter() - started
+    inserted = sum(report['inserted'] for report in batches)
+
+    return {
+        'inserted': inserted,
+        'skipped': sum(report['skipped'] for report in batches),
+        'error_count': sum(report['error_count'] for report in batches),
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(inserted / seconds) if seconds else None,
+        'batches': batches,
+    }
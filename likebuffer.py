@@ -0,0 +1,253 @@
+"""Coalesced like toggles, written to the `likes` table in batches.
+
+A toggle only updates this process's map of pending like states,
+{(user id, message id): liked}, where the last toggle wins. A background
+thread writes the map out LIKE_FLUSH_INTERVAL seconds after the first
+toggle since the last write: one multi-row INSERT that skips existing
+likes, and one DELETE per user for unlikes, in a single transaction. A
+double click that ends where it started writes nothing, and a like storm
+on a popular message becomes one insert per interval.
+
+Reads of like state (`dal.liked_ids`) apply the pending states, so users
+see their own toggles right away. Lists of likes read the table, and lag
+by up to one interval; so may a toggle read by another worker process.
+Pending states are written on a clean exit, and lost if the process is
+killed. If a write fails (say a user or message went away between the
+check and the INSERT), its states are written one at a time, so only
+the offending ones are dropped.
+
+With LIKE_BUFFER_ENABLED off, toggles are written in the request.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy.dialects import postgresql
+
+from models import db, User, Message, Likes
+
+# seconds from the first pending toggle to the write
+DEFAULT_FLUSH_INTERVAL = 0.005
+
+
+def toggle_now(user_id, message_id):
+    """Flip whether `user_id` likes `message_id` in the table; the new state."""
+
+    like = Likes.query.filter_by(user_id=user_id, message_id=message_id).first()
+
+    if like:
+        db.session.delete(like)
+    else:
+        db.session.add(Likes(user_id=user_id, message_id=message_id))
+
+    db.session.commit()
+
+    return like is None
+
+
+def _insert_new_likes():
+    """INSERT into likes that skips (user, message) pairs already there."""
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return (postgresql.insert(Likes.__table__)
+                .on_conflict_do_nothing(index_elements=['user_id', 'message_id']))
+
+    return Likes.__table__.insert().prefix_with('OR IGNORE')
+
+
+def save_states(states):
+    """Write {(user id, message id): liked} to the table in one transaction.
+
+    Likes of messages or by users deleted in the meantime are dropped.
+    """
+
+    liked = [key for key, state in states.items() if state]
+    unliked = defaultdict(list)
+    for (user_id, message_id), state in states.items():
+        if not state:
+            unliked[user_id].append(message_id)
+
+    if liked:
+        existing = {message_id for (message_id,) in (db.session
+                    .query(Message.id)
+                    .filter(Message.id.in_({message_id for user_id, message_id in liked})))}
+        users = {user_id for (user_id,) in (db.session
+                 .query(User.id)
+                 .filter(User.id.in_({user_id for user_id, message_id in liked})))}
+
+        rows = [{'user_id': user_id, 'message_id': message_id}
+                for user_id, message_id in liked if message_id in existing and user_id in users]
+        if rows:
+            db.session.execute(_insert_new_likes(), rows)
+
+    for user_id, message_ids in unliked.items():
+        (Likes
+         .query
+         .filter(Likes.user_id == user_id, Likes.message_id.in_(message_ids))
+         .delete(synchronize_session=False))
+
+    db.session.commit()
+
+
+class LikeBuffer:
+    """Pending like states of this process and the thread that writes them.
+
+    The thread is started lazily on the first toggle, so it is never
+    created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, interval=DEFAULT_FLUSH_INTERVAL):
+        self.app = app
+        self.enabled = True
+        self.interval = interval
+        self._reset()
+
+        if app is not None:
+            self.init_app(app)
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('LIKE_BUFFER_ENABLED', True)
+        self.interval = app.config.setdefault('LIKE_FLUSH_INTERVAL', self.interval)
+        app.extensions['like_buffer'] = self
+
+    def _reset(self):
+        # {(user id, message id): (liked, liked in the table)}
+        self._pending = {}
+        # states being written by `flush`; still pending for readers
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _state(self, key):
+        return self._pending.get(key) or self._flushing.get(key)
+
+    def toggle(self, user_id, message_id):
+        """Flip whether `user_id` likes `message_id`; the new state."""
+
+        if not self.enabled:
+            return toggle_now(user_id, message_id)
+
+        key = (user_id, message_id)
+
+        with self._lock:
+            state = self._state(key)
+
+        if state is None:
+            stored = (db.session
+                      .query(Likes.id)
+                      .filter_by(user_id=user_id, message_id=message_id)
+                      .first()) is not None
+            state = (stored, stored)
+
+        with self._lock:
+            # a concurrent toggle of the same like may have won meanwhile
+            liked, stored = self._state(key) or state
+            liked = not liked
+
+            if liked == stored and key not in self._flushing:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = (liked, stored)
+
+        self._start()
+        self._wakeup.set()
+
+        return liked
+
+    def apply(self, user_id, message_ids, liked_ids):
+        """`liked_ids` of `message_ids`, with `user_id`'s pending toggles."""
+
+        with self._lock:
+            if not self._pending and not self._flushing:
+                return liked_ids
+
+            for message_id in message_ids:
+                state = self._state((user_id, message_id))
+                if state is not None:
+                    if state[0]:
+                        liked_ids.add(message_id)
+                    else:
+                        liked_ids.discard(message_id)
+
+        return liked_ids
+
+    def flush(self):
+        """Write the pending states now; the number written."""
+
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+
+            saved = {}
+            try:
+                if self._flushing:
+                    saved = {key: liked for key, (liked, stored) in self._flushing.items()}
+                    save_states(saved)
+                return len(saved)
+
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Writing %d like toggles failed; writing them one at a time",
+                                          len(saved))
+                saved = self._save_each(saved)
+                return len(saved)
+
+            finally:
+                with self._lock:
+                    self._flushing = {}
+                    # toggles made during the write compare with what it stored
+                    for key in saved.keys() & self._pending.keys():
+                        liked = self._pending[key][0]
+                        if liked == saved[key]:
+                            del self._pending[key]
+                        else:
+                            self._pending[key] = (liked, saved[key])
+
+    def _save_each(self, states):
+        """Write `states` one transaction each; those written."""
+
+        written = {}
+        for key, liked in states.items():
+            try:
+                save_states({key: liked})
+                written[key] = liked
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Dropped the like toggle of user %s, message %s", *key)
+
+        return written
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-likes", daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_in_app_context)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # let the toggles of the next few milliseconds join this write
+            time.sleep(self.interval)
+            self._wakeup.clear()
+            self._flush_in_app_context()
+
+    def _flush_in_app_context(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            finally:
+                db.session.remove()
+
+
+like_buffer = LikeBuffer()
@@ -1,12 +1,51 @@
 """SQLAlchemy models for Warbler."""
 
-from datetime import datetime
-
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+import snowflake
+from pooling import engine_options
 
 bcrypt = Bcrypt()
-db = SQLAlchemy()
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with the connection pool settings of pooling.py."""
+
+    def apply_driver_hacks(self, app, info, options):
+        result = super().apply_driver_hacks(app, info, options)
+        options.update(engine_options(app.config, info))
+        return result
+
+
+db = PooledSQLAlchemy()
+
+
+class utcnow(FunctionElement):
+    """Current UTC time, evaluated by the database for every row."""
+
+    type = db.DateTime()
+
+
+@compiles(utcnow)
+def compile_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, 'sqlite')
+def compile_utcnow_sqlite(element, compiler, **kw):
+    # same text format SQLAlchemy uses for SQLite datetimes, so stored
+    # values compare correctly with bound parameters
+    return "(STRFTIME('%Y-%m-%d %H:%M:%f000', 'NOW'))"
+
+
+@compiles(utcnow, 'postgresql')
+def compile_utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
 
 
 class Follows(db.Model):
@@ -28,6 +67,20 @@ class Follows(db.Model):
 
     following_confirmed_status = db.Column(db.Boolean, default=False)
 
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        server_default=utcnow(),
+    )
+
+    # keyset pagination of following / followers lists, newest first;
+    # follows created since the last follow graph snapshot
+    __table_args__ = (
+        db.Index('ix_follows_following_created', 'user_following_id', 'created_at'),
+        db.Index('ix_follows_followed_created', 'user_being_followed_id', 'created_at'),
+        db.Index('ix_follows_created', 'created_at'),
+    )
+
 
 class Likes(db.Model):
     """Mapping user likes to warbles."""
@@ -45,9 +98,20 @@ class Likes(db.Model):
     )
 
     message_id = db.Column(
-        db.Integer,
+        db.BigInteger,
         db.ForeignKey('messages.id', ondelete='cascade'),
-        unique=True
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        server_default=utcnow(),
+    )
+
+    # one like per (user, message); keyset pagination of a user's likes
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'message_id'),
+        db.Index('ix_likes_user_created', 'user_id', 'created_at'),
     )
 
 
@@ -108,65 +172,119 @@ class User(db.Model):
         default=False
     )
 
-    messages = db.relationship('Message', cascade="all,delete", backref="user")
+    # set when the account is deleted but its content is still being purged
+    deleted_at = db.Column(
+        db.DateTime,
+    )
+
+    # last progress of the worker purging this account (see purge.claim)
+    purge_claimed_at = db.Column(
+        db.DateTime,
+    )
+
+    # passive_deletes: rely on the ON DELETE CASCADE foreign keys instead of
+    # loading every related row into the session before deleting the user
+    messages = db.relationship('Message', cascade="all,delete", passive_deletes=True, backref="user")
 
 
     followers = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_being_followed_id == id),
-        secondaryjoin=(Follows.user_following_id == id)
+        secondaryjoin=(Follows.user_following_id == id),
+        passive_deletes=True
     )
 
     following = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_following_id == id),
-        secondaryjoin=(Follows.user_being_followed_id == id)
+        secondaryjoin=(Follows.user_being_followed_id == id),
+        passive_deletes=True
     )
 
     likes = db.relationship(
         'Message',
-        secondary="likes"
+        secondary="likes",
+        passive_deletes=True
     )
 
     def __repr__(self):
         return f"<User #{self.id}: {self.username}, {self.email}>"
 
+    @property
+    def is_deleted(self):
+        """Has this account been deleted (and is possibly awaiting purge)?"""
+
+        return self.deleted_at is not None
+
+    def is_visible_to(self, viewer):
+        """May `viewer` (a User, or None if anonymous) see this user's messages?
+
+        Checks one follows row rather than loading the viewer's following list.
+        """
+
+        if not self.private or (viewer and viewer.id == self.id):
+            return True
+
+        if not viewer:
+            return False
+
+        return db.session.query(db.exists().where(db.and_(
+            Follows.user_following_id == viewer.id,
+            Follows.user_being_followed_id == self.id,
+            Follows.following_confirmed_status == True))).scalar()
+
+    def count_messages(self):
+        return db.session.query(db.func.count(Message.id)).filter(Message.user_id == self.id).scalar()
+
+    def count_following(self):
+        return Follows.query.filter(Follows.user_following_id == self.id).count()
+
+    def count_followers(self):
+        return Follows.query.filter(Follows.user_being_followed_id == self.id).count()
+
+    def count_likes(self):
+        return Likes.query.filter(Likes.user_id == self.id).count()
+
+    def pending_followers(self):
+        """Users whose request to follow this user is not yet accepted."""
+
+        return (User
+                .query
+                .join(Follows, Follows.user_following_id == User.id)
+                .filter(Follows.user_being_followed_id == self.id,
+                        Follows.following_confirmed_status != True)
+                .all())
+
     def is_followed_by(self, other_user):
         """Is this user followed by `other_user`?"""
 
-        found_user_list = [user for user in self.followers if user == other_user]
+        from dal import follow_status
 
-        return len(found_user_list) == 1
+        return follow_status(other_user.id, self.id) is not None
 
     def is_followed_by_confirmed(self, other_user):
         """Is this user confirmed to be followed by `other_user`?"""
 
-        if self.is_followed_by(other_user):
-            follow = Follows.query.filter(Follows.user_being_followed_id==self.id, Follows.user_following_id==other_user.id).first()
-            if follow.following_confirmed_status == True:
-                return True
+        from dal import follow_status
 
-        return False
+        return follow_status(other_user.id, self.id) == True
 
 
     def is_following(self, other_user):
         """Is this user following `other_user`?"""
 
-        found_user_list = [user for user in self.following if user == other_user]
+        from dal import follow_status
 
-        return len(found_user_list) == 1
+        return follow_status(self.id, other_user.id) is not None
 
     def is_following_confirmed(self, other_user):
         """Is this user confirmed to follow `other_user`?"""
 
-        if self.is_following(other_user):
-            follow = Follows.query.filter(Follows.user_being_followed_id==other_user.id, Follows.user_following_id==self.id).first()
-            if follow.following_confirmed_status == True:
-                return True
+        from dal import follow_status
 
-        return False
+        return follow_status(self.id, other_user.id) == True
 
     @classmethod
     def signup(cls, username, email, password, image_url):
@@ -198,12 +316,15 @@ class User(db.Model):
         If can't find matching user (or if password is wrong), returns False.
         """
 
-        user = cls.query.filter_by(username=username).first()
+        from dal import credentials
 
-        if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+        found = credentials(username)
+
+        if found:
+            user_id, password_hash = found
+            is_auth = bcrypt.check_password_hash(password_hash, password)
             if is_auth:
-                return user
+                return cls.query.get(user_id)
 
         return False
 
@@ -234,9 +355,12 @@ class Message(db.Model):
 
     __tablename__ = 'messages'
 
+    # time-ordered: sorting by id sorts by creation time (see snowflake.py)
     id = db.Column(
-        db.Integer,
+        db.BigInteger,
         primary_key=True,
+        autoincrement=False,
+        default=snowflake.next_id,
     )
 
     text = db.Column(
@@ -247,7 +371,7 @@ class Message(db.Model):
     timestamp = db.Column(
         db.DateTime,
         nullable=False,
-        default=datetime.utcnow(),
+        server_default=utcnow(),
     )
 
     user_id = db.Column(
@@ -256,10 +380,235 @@ class Message(db.Model):
         nullable=False,
     )
 
+    # hidden by a moderator (see moderation.py); shown to nobody
+    hidden = db.Column(
+        db.Boolean,
+        nullable=False,
+        default=False,
+        server_default=db.false(),
+    )
+
     # user = db.relationship('User')
 
     # user = db.relationship('User', backref=backref("messages", cascade="all,delete"))
 
+    __table_args__ = (
+        db.Index('ix_messages_user_id_timestamp', 'user_id', 'timestamp'),
+        # a user's messages newest first by id alone, read in index order
+        db.Index('ix_messages_user_id_id', 'user_id', 'id'),
+    )
+
+    # fetch the server-side timestamp along with the INSERT where possible
+    __mapper_args__ = {'eager_defaults': True}
+
+
+class MessageTag(db.Model):
+    """A #tag of a message, see tags.py."""
+
+    __tablename__ = 'message_tags'
+
+    # lowercased, without the '#'
+    tag = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    message_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey('messages.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    # the primary key pages through a tag; this one serves the cascades
+    __table_args__ = (
+        db.Index('ix_message_tags_message_id', 'message_id'),
+    )
+
+
+class MessageMention(db.Model):
+    """An @mention of a user in a message, see tags.py."""
+
+    __tablename__ = 'message_mentions'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    message_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey('messages.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    # the primary key pages through a user's mentions; this one serves the cascades
+    __table_args__ = (
+        db.Index('ix_message_mentions_message_id', 'message_id'),
+    )
+
+
+class MessageArchive(db.Model):
+    """Messages moved out of the live table by `partitions.archive_before`.
+
+    In PostgreSQL this is a partitioned table holding detached monthly
+    partitions; in SQLite archived rows are copied here.
+    """
+
+    __tablename__ = 'messages_archive'
+
+    id = db.Column(
+        db.BigInteger,
+        primary_key=True,
+        autoincrement=False,
+    )
+
+    text = db.Column(
+        db.String(140),
+        nullable=False,
+    )
+
+    timestamp = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+    user_id = db.Column(
+        db.Integer,
+        nullable=False,
+        index=True,
+    )
+
+
+class FollowSuggestion(db.Model):
+    """A "who to follow" suggestion, computed by suggestions.py."""
+
+    __tablename__ = 'follow_suggestions'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True,
+    )
+
+    suggested_user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete="cascade"),
+        primary_key=True,
+    )
+
+    # number of the user's followed users who follow the suggested user
+    score = db.Column(
+        db.Integer,
+        nullable=False,
+    )
+
+    computed_at = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+    # a user's suggestions, best first
+    __table_args__ = (
+        db.Index('ix_follow_suggestions_user_score', 'user_id', 'score'),
+    )
+
+
+class TrendingCheckpoint(db.Model):
+    """Saved counters of one worker process, see trending.py."""
+
+    __tablename__ = 'trending_checkpoints'
+
+    # "hostname:pid"
+    worker = db.Column(
+        db.Text,
+        primary_key=True,
+    )
+
+    # JSON of the worker's counters
+    state = db.Column(
+        db.Text,
+        nullable=False,
+    )
+
+    saved_at = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+
+class PrewarmedTimeline(db.Model):
+    """A homepage timeline loaded right after login, see prewarm.py."""
+
+    __tablename__ = 'prewarmed_timelines'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    # JSON of the Timeline; NULL while it is being loaded
+    payload = db.Column(
+        db.Text,
+    )
+
+    submitted_at = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+    loaded_at = db.Column(
+        db.DateTime,
+    )
+
+
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """Turn on ON DELETE CASCADE support for the SQLite fallback.
+
+    Account deletion relies on the database cascading deletes; SQLite
+    ignores foreign keys unless asked per connection.
+    """
+
+    if type(dbapi_connection).__module__.startswith("sqlite3"):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def message_visible_to(viewer_id):
+    """SQL condition: is the message visible to user `viewer_id`?
+
+    Use it in every query listing messages. Public authors' messages are
+    visible to everyone, private authors' only to themselves and to
+    confirmed followers, and messages hidden by moderators to nobody. Pass
+    None for anonymous viewers. Each branch is a correlated EXISTS served
+    by a primary key lookup.
+    """
+
+    # aliases keep the EXISTS subqueries from correlating to users or
+    # follows tables that the enclosing query joins itself
+    author = db.aliased(User)
+    follow = db.aliased(Follows)
+
+    public_author = db.exists().where(db.and_(
+        author.id == Message.user_id,
+        author.private == False,
+        author.deleted_at.is_(None)))
+
+    not_hidden = Message.hidden == False
+
+    if viewer_id is None:
+        return db.and_(not_hidden, public_author)
+
+    confirmed_follower = db.exists().where(db.and_(
+        follow.user_following_id == viewer_id,
+        follow.user_being_followed_id == Message.user_id,
+        follow.following_confirmed_status == True))
+
+    return db.and_(not_hidden, db.or_(Message.user_id == viewer_id, public_author, confirmed_follower))
 
 
 def connect_db(app):
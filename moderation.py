@@ -0,0 +1,381 @@
+"""Bulk moderation of messages and accounts by admins.
+
+A moderation request selects messages with filters, any of:
+
+    {"user_ids": [12, 13], "pattern": "cheap*pills",
+     "since": "2021-03-01T00:00:00", "until": "2021-03-02T00:00:00"}
+
+`pattern` is matched case-insensitively anywhere in the text, with `*`
+matching any run of characters. `preview` counts what the filters
+select; `submit` runs an action on it in the background:
+
+    hide / unhide     set or clear `messages.hidden`; hidden messages are
+                      visible to nobody (see `message_visible_to`)
+    delete            delete the messages; likes, tags and mentions go
+                      with the database cascades
+    delete_accounts   tombstone the accounts of `user_ids` and cut their
+                      follows, then delete their messages and the accounts;
+                      admins are refused
+
+Every step is a set-based UPDATE or DELETE of at most MODERATION_BATCH
+rows, selected by walking the messages primary key from the last batch
+on, and committed on its own, so no statement holds locks for long and
+the whole run is one pass over the matching rows. Progress is reported
+like account purges (see purge.py).
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from itertools import count
+from queue import Queue
+
+from models import db, User, Message, Follows
+from feed import feed_engine
+
+ACTIONS = ('hide', 'unhide', 'delete', 'delete_accounts')
+
+# rows updated or deleted per transaction
+MODERATION_BATCH = 1000
+
+# messages shown with a preview
+PREVIEW_SAMPLE = 10
+
+# number of finished jobs kept around for the progress report
+MAX_FINISHED_JOBS = 100
+
+MAX_USER_IDS = 10000
+
+Filters = namedtuple('Filters', 'user_ids pattern since until')
+
+
+class BadRequest(ValueError):
+    """Moderation filters or action that can't be run."""
+
+
+def _parse_time(value, name):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an ISO 8601 date and time")
+
+
+def parse_filters(data):
+    """Filters from a request's JSON object; at least one is required."""
+
+    if not isinstance(data, dict):
+        raise BadRequest("expected a JSON object")
+
+    user_ids = data.get('user_ids')
+    if user_ids is not None:
+        if (not isinstance(user_ids, list) or len(user_ids) > MAX_USER_IDS or
+                not all(isinstance(user_id, int) for user_id in user_ids)):
+            raise BadRequest(f"user_ids must be a list of at most {MAX_USER_IDS} ids")
+        user_ids = sorted(set(user_ids))
+
+    pattern = data.get('pattern')
+    if pattern is not None and (not isinstance(pattern, str) or not pattern.strip('*')):
+        raise BadRequest("pattern must be a non-empty string")
+
+    filters = Filters(user_ids, pattern,
+                      _parse_time(data.get('since'), 'since'),
+                      _parse_time(data.get('until'), 'until'))
+
+    if filters == Filters(None, None, None, None):
+        raise BadRequest("give at least one of user_ids, pattern, since and until")
+
+    return filters
+
+
+def like_pattern(pattern):
+    """SQL LIKE pattern for a moderation pattern (escape character '\\')."""
+
+    escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped.replace('*', '%')}%"
+
+
+def criteria(filters):
+    """SQL conditions on messages for `filters`."""
+
+    conditions = []
+    if filters.user_ids is not None:
+        conditions.append(Message.user_id.in_(filters.user_ids))
+    if filters.pattern is not None:
+        conditions.append(Message.text.ilike(like_pattern(filters.pattern), escape='\\'))
+    if filters.since is not None:
+        conditions.append(Message.timestamp >= filters.since)
+    if filters.until is not None:
+        conditions.append(Message.timestamp < filters.until)
+
+    return conditions
+
+
+def preview(filters):
+    """Counts of what `filters` select, and a sample of the messages."""
+
+    conditions = criteria(filters)
+
+    messages, hidden, authors = (db.session
+                                 .query(db.func.count(Message.id),
+                                        db.func.count(db.case([(Message.hidden == True, 1)])),
+                                        db.func.count(db.distinct(Message.user_id)))
+                                 .filter(*conditions)
+                                 .one())
+
+    sample = (db.session
+              .query(Message.id, Message.user_id, Message.timestamp, Message.text)
+              .filter(*conditions)
+              .order_by(Message.id.desc())
+              .limit(PREVIEW_SAMPLE))
+
+    accounts = 0
+    if filters.user_ids:
+        accounts = (db.session
+                    .query(db.func.count(User.id))
+                    .filter(User.id.in_(filters.user_ids), User.deleted_at.is_(None))
+                    .scalar())
+
+    return {
+        'messages': messages,
+        'hidden': hidden,
+        'authors': authors,
+        'accounts': accounts,
+        'batches': -(-messages // MODERATION_BATCH),
+        'sample': [{'id': str(message_id), 'user_id': user_id,
+                    'timestamp': timestamp.isoformat(), 'text': text}
+                   for message_id, user_id, timestamp, text in sample],
+    }
+
+
+def _message_batches(conditions, batch_size):
+    """Lists of (id, user id) of the messages matching `conditions`, in id
+    order, `batch_size` at a time.
+
+    Each batch starts after the last id of the one before, so the rows a
+    batch changes are never scanned again.
+    """
+
+    last_id = None
+
+    while True:
+        query = db.session.query(Message.id, Message.user_id).filter(*conditions)
+        if last_id is not None:
+            query = query.filter(Message.id > last_id)
+
+        rows = query.order_by(Message.id).limit(batch_size).all()
+        if not rows:
+            return
+
+        last_id = rows[-1][0]
+        yield rows
+
+
+def moderate_messages(action, filters, batch_size=MODERATION_BATCH, job=None):
+    """Hide, unhide or delete the messages `filters` select, batch by batch.
+
+    Returns the number of messages changed.
+    """
+
+    conditions = criteria(filters)
+    if action == 'hide':
+        conditions.append(Message.hidden == False)
+    elif action == 'unhide':
+        conditions.append(Message.hidden == True)
+
+    done = 0
+
+    for rows in _message_batches(conditions, batch_size):
+        ids = [message_id for message_id, user_id in rows]
+        batch = Message.query.filter(Message.id.in_(ids))
+
+        if action == 'delete':
+            batch.delete(synchronize_session=False)
+        else:
+            batch.update({Message.hidden: action == 'hide'}, synchronize_session=False)
+        db.session.commit()
+
+        # feeds of this process drop or regain the messages right away
+        for user_id in {user_id for message_id, user_id in rows}:
+            feed_engine.forget(user_id)
+
+        done += len(rows)
+        if job:
+            job.done = done
+
+    return done
+
+
+def delete_accounts(user_ids, batch_size=MODERATION_BATCH, job=None):
+    """Delete the accounts `user_ids` and all their messages, batch by batch.
+
+    The accounts are tombstoned and unfollowed first, so they disappear
+    from the site before their messages are gone. Admins among them are
+    left alone (`ModerationWorker.submit` refuses them). Returns the number
+    of messages deleted.
+    """
+
+    user_ids = [user_id for start in range(0, len(user_ids), batch_size)
+                for (user_id,) in (db.session
+                                   .query(User.id)
+                                   .filter(User.id.in_(user_ids[start:start + batch_size]),
+                                           User.admin.is_(False)))]
+    if not user_ids:
+        return 0
+
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        # claimed like a purge, so workers starting meanwhile leave them be
+        now = datetime.utcnow()
+        (User
+         .query
+         .filter(User.id.in_(chunk), User.deleted_at.is_(None))
+         .update({User.deleted_at: now, User.purge_claimed_at: now}, synchronize_session=False))
+        (Follows
+         .query
+         .filter(Follows.user_following_id.in_(chunk) | Follows.user_being_followed_id.in_(chunk))
+         .delete(synchronize_session=False))
+        db.session.commit()
+
+    done = moderate_messages('delete', Filters(user_ids, None, None, None), batch_size, job)
+
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        User.query.filter(User.id.in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+
+    return done
+
+
+class ModerationJob:
+    """Progress of one bulk moderation action."""
+
+    def __init__(self, job_id, action, filters):
+        self.id = job_id
+        self.action = action
+        self.filters = filters
+        self.total = None
+        self.done = 0
+        self.status = "queued"
+        self.error = None
+        self.queued_at = datetime.utcnow()
+        self.finished_at = None
+
+    def to_dict(self):
+        """Serialize job for the admin progress report."""
+
+        return {
+            'id': self.id,
+            'action': self.action,
+            'filters': {
+                'user_ids': self.filters.user_ids,
+                'pattern': self.filters.pattern,
+                'since': self.filters.since and self.filters.since.isoformat(),
+                'until': self.filters.until and self.filters.until.isoformat(),
+            },
+            'status': self.status,
+            'total': self.total,
+            'done': self.done,
+            'error': self.error,
+            'queued_at': self.queued_at.isoformat(),
+            'finished_at': self.finished_at and self.finished_at.isoformat(),
+        }
+
+
+def run_job(job, batch_size=MODERATION_BATCH):
+    """Count, then carry out, the action of `job`."""
+
+    job.status = "counting"
+    job.total = preview(job.filters)['messages']
+
+    job.status = "running"
+    if job.action == 'delete_accounts':
+        delete_accounts(job.filters.user_ids, batch_size, job)
+    else:
+        moderate_messages(job.action, job.filters, batch_size, job)
+
+
+class ModerationWorker:
+    """Background thread running bulk moderation jobs one at a time.
+
+    The thread is started lazily on the first submitted job, so it is
+    never created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, batch_size=MODERATION_BATCH):
+        self.app = app
+        self.batch_size = batch_size
+        self.jobs = OrderedDict()
+        self._ids = count(1)
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.setdefault('MODERATION_BATCH', self.batch_size)
+        app.extensions['moderation_worker'] = self
+
+    def submit(self, action, filters):
+        """Queue `action` on what `filters` select and return its job."""
+
+        if action not in ACTIONS:
+            raise BadRequest(f"action must be one of {', '.join(ACTIONS)}")
+
+        if action == 'delete_accounts' and (not filters.user_ids or any(filters[1:])):
+            raise BadRequest("delete_accounts takes user_ids and no other filters")
+
+        if action == 'delete_accounts':
+            admin_ids = [user_id for (user_id,) in (db.session
+                                                    .query(User.id)
+                                                    .filter(User.id.in_(filters.user_ids), User.admin.is_(True))
+                                                    .order_by(User.id))]
+            if admin_ids:
+                raise BadRequest(f"delete_accounts can't delete admins: {', '.join(map(str, admin_ids))}")
+
+        with self._lock:
+            job = ModerationJob(next(self._ids), action, filters)
+            self.jobs[job.id] = job
+            self._trim_finished()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-moderation", daemon=True)
+                self._thread.start()
+
+        self._queue.put(job)
+        return job
+
+    def progress(self):
+        """List of job dicts, most recent first."""
+
+        with self._lock:
+            return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self.app.app_context():
+                try:
+                    run_job(job, self.batch_size)
+                    job.status = "done"
+                except Exception as exc:
+                    db.session.rollback()
+                    job.status = "failed"
+                    job.error = str(exc)
+                finally:
+                    job.finished_at = datetime.utcnow()
+                    db.session.remove()
+            self._queue.task_done()
+
+
+moderation_worker = ModerationWorker()
@@ -0,0 +1,134 @@
+"""Keyset pagination for long listings.
+
+A page is requested with `?before=<cursor>&limit=<n>`. The cursor encodes
+the (time, id) of the last row of the previous page, so every page is an
+index range scan of at most `limit` rows, however long the list is.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from flask import request, url_for
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# messages per page of the home and profile feeds; more load on scroll
+FEED_PAGE_SIZE = 20
+
+CURSOR_TIME_FORMAT = "%Y%m%d%H%M%S%f"
+
+Page = namedtuple('Page', 'items next_cursor')
+
+
+def page_size():
+    """Page size requested in the querystring, capped at MAX_PAGE_SIZE."""
+
+    try:
+        size = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def page_url(cursor):
+    """URL of the current listing's page after `cursor`, keeping the rest
+    of the querystring (`limit`, ...)."""
+
+    args = dict(request.view_args, **request.args.to_dict())
+    args['before'] = cursor
+    return url_for(request.endpoint, **args)
+
+
+def encode_cursor(time, row_id):
+    return f"{time.strftime(CURSOR_TIME_FORMAT)}-{row_id}"
+
+
+def decode_cursor(cursor):
+    """(time, id) from a cursor string; None for a missing or bad cursor."""
+
+    try:
+        time, row_id = cursor.split('-')
+        return datetime.strptime(time, CURSOR_TIME_FORMAT), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(query, time_column, id_column, cursor=None, size=None):
+    """One page of `query`, newest first by (`time_column`, `id_column`).
+
+    `query` must select the listed entity first and `time_column` and
+    `id_column` as its last two columns.
+    """
+
+    size = size or page_size()
+    position = decode_cursor(cursor)
+
+    if position:
+        time, row_id = position
+        query = query.filter(db.or_(
+            time_column < time,
+            db.and_(time_column == time, id_column < row_id)))
+
+    rows = (query
+            .order_by(time_column.desc(), id_column.desc())
+            .limit(size + 1)
+            .all())
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+
+    return Page([row[0] for row in rows], next_cursor)
+
+
+def id_page(query, id_column, cursor=None, size=None):
+    """One page of `query`, newest first by time-ordered (Snowflake) ids.
+
+    The cursor is the last id of the previous page. `query` must select
+    the listed entity first and `id_column` last.
+    """
+
+    size = size or page_size()
+
+    try:
+        query = query.filter(id_column < int(cursor))
+    except (TypeError, ValueError):
+        pass
+
+    rows = (query
+            .order_by(id_column.desc())
+            .limit(size + 1)
+            .all())
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = str(rows[-1][-1])
+
+    return Page([row[0] for row in rows], next_cursor)
+
+
+def message_cursor():
+    """Message id of the `before` cursor in the querystring, or None."""
+
+    try:
+        return int(request.args['before'])
+    except (KeyError, ValueError):
+        return None
+
+
+def message_page(rows, size):
+    """Page of feed `rows` fetched with a limit of `size` + 1, newest first.
+
+    The cursor of the next page is the id of its last message.
+    """
+
+    if len(rows) > size:
+        return Page(rows[:size], str(rows[size - 1].id))
+
+    return Page(rows, None)
@@ -0,0 +1,305 @@
+"""Monthly partitioning and archiving of the messages table.
+
+PostgreSQL: `messages` is range-partitioned by month on `timestamp`
+(see `convert_messages_table`). `ensure_partitions` creates upcoming
+monthly partitions ahead of time, and `archive_before` detaches old
+partitions and re-attaches them under `messages_archive`, which is
+instant and leaves live indexes small.
+
+SQLite (and any other backend): `messages` stays a plain table; the same
+`archive_before` call moves old rows into `messages_archive` in batches.
+
+Messages of a month with no partition land in `messages_default`, and
+that month's partition can then no longer be created (PostgreSQL refuses
+while the default partition holds rows of its range; `ensure_partitions`
+skips such months and logs them). So besides the daily cron job, each
+worker runs `ensure_partitions` on its first request
+(`ensure_partitions_on_start`, turned off with PARTITIONS_ENSURE=0).
+
+Feed queries go through `recent_messages`, which bounds the time range of
+its first query so the planner only touches the newest partitions.
+"""
+
+import logging
+import re
+from datetime import datetime
+
+from models import db, Message, MessageArchive
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME_RE = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+# months searched by recent_messages' first, partition-pruned, query
+RECENT_MONTHS = 1
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def add_months(start, months):
+    """First day of the month `months` after the month of `start`."""
+
+    month = start.year * 12 + start.month - 1 + months
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(start):
+    return f"messages_y{start.year:04d}m{start.month:02d}"
+
+
+def partition_start(name):
+    """Start of the month covered by partition `name`, or None."""
+
+    match = PARTITION_NAME_RE.match(name)
+    return match and datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(connection, table='messages'):
+    return bool(connection.execute(db.text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"),
+        table=table).scalar())
+
+
+def attached_partitions(connection, parent='messages'):
+    """Names of the monthly partitions attached to `parent`."""
+
+    rows = connection.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :parent"),
+        parent=parent)
+
+    return sorted(name for (name,) in rows if partition_start(name))
+
+
+def _create_partition(connection, start, parent='messages'):
+    connection.execute(db.text(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {parent} '
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"))
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """Create monthly partitions from this month to `months_ahead` months on.
+
+    Meant to run periodically (e.g. daily from cron). No-op unless the
+    messages table is partitioned. Months whose messages already went to
+    the default partition are skipped and logged: moving them needs a
+    maintenance window.
+    """
+
+    if not is_postgres():
+        return []
+
+    this_month = add_months(now or datetime.utcnow(), 0)
+    created = []
+
+    with db.engine.begin() as connection:
+        if not is_partitioned(connection):
+            return []
+
+        existing = set(attached_partitions(connection))
+        for offset in range(months_ahead + 1):
+            start = add_months(this_month, offset)
+            if partition_name(start) in existing:
+                continue
+
+            if _in_default_partition(connection, start):
+                logger.error("Messages of %s are in messages_default; its partition "
+                             "can't be created", f"{start:%Y-%m}")
+                continue
+
+            _create_partition(connection, start)
+            created.append(partition_name(start))
+
+    return created
+
+
+def _in_default_partition(connection, start):
+    return connection.execute(db.text(
+        'SELECT 1 FROM messages_default WHERE "timestamp" >= :start AND "timestamp" < :end LIMIT 1'),
+        start=start, end=add_months(start, 1)).scalar() is not None
+
+
+def ensure_partitions_on_start():
+    """`ensure_partitions` for a worker's first request; errors (e.g. a
+    database user without CREATE rights) are logged, not raised."""
+
+    try:
+        ensure_partitions()
+    except Exception:
+        logger.exception("Creating upcoming message partitions failed")
+
+
+def convert_messages_table(months_ahead=3):
+    """One-off PostgreSQL migration to a monthly-partitioned messages table.
+
+    Partitioned tables need the partition key in every unique constraint,
+    so the primary key becomes (id, timestamp) and the message_id columns
+    of likes, message_tags and message_mentions can no longer be foreign
+    keys; a trigger deletes their rows of deleted messages instead.
+    """
+
+    with db.engine.begin() as connection:
+        if is_partitioned(connection):
+            return
+
+        first, last = connection.execute(db.text(
+            'SELECT min("timestamp"), max("timestamp") FROM messages')).first()
+
+        connection.execute(db.text("""
+            ALTER TABLE messages RENAME TO messages_unpartitioned;
+            ALTER SEQUENCE IF EXISTS messages_id_seq OWNED BY NONE;
+            CREATE TABLE messages (LIKE messages_unpartitioned INCLUDING DEFAULTS)
+                PARTITION BY RANGE ("timestamp");
+            ALTER TABLE messages ADD PRIMARY KEY (id, "timestamp");
+            ALTER TABLE messages ADD FOREIGN KEY (user_id)
+                REFERENCES users (id) ON DELETE CASCADE;
+            CREATE INDEX ix_messages_user_id_timestamp_p ON messages (user_id, "timestamp");
+            CREATE INDEX ix_messages_user_id_id_p ON messages (user_id, id);
+            CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+            DROP TABLE IF EXISTS messages_archive;
+            CREATE TABLE messages_archive (LIKE messages INCLUDING DEFAULTS)
+                PARTITION BY RANGE ("timestamp");
+        """))
+
+        this_month = add_months(datetime.utcnow(), 0)
+        start = add_months(first or this_month, 0)
+        while start <= add_months(max(last or this_month, this_month), months_ahead):
+            _create_partition(connection, start)
+            start = add_months(start, 1)
+
+        connection.execute(db.text("""
+            INSERT INTO messages SELECT * FROM messages_unpartitioned;
+
+            ALTER TABLE likes DROP CONSTRAINT IF EXISTS likes_message_id_fkey;
+            ALTER TABLE message_tags DROP CONSTRAINT IF EXISTS message_tags_message_id_fkey;
+            ALTER TABLE message_mentions DROP CONSTRAINT IF EXISTS message_mentions_message_id_fkey;
+            CREATE OR REPLACE FUNCTION messages_delete_likes() RETURNS trigger AS $$
+            BEGIN
+                DELETE FROM likes WHERE message_id = OLD.id;
+                DELETE FROM message_tags WHERE message_id = OLD.id;
+                DELETE FROM message_mentions WHERE message_id = OLD.id;
+                RETURN OLD;
+            END $$ LANGUAGE plpgsql;
+            CREATE TRIGGER messages_delete_likes AFTER DELETE ON messages
+                FOR EACH ROW EXECUTE PROCEDURE messages_delete_likes();
+
+            DROP TABLE messages_unpartitioned;
+        """))
+
+
+def archive_before(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move messages older than the month of `cutoff` into the archive.
+
+    Returns the number of partitions (PostgreSQL) or rows (other backends)
+    archived. Only whole months before `cutoff` are archived.
+    """
+
+    cutoff = add_months(cutoff, 0)
+
+    if is_postgres():
+        with db.engine.begin() as connection:
+            if is_partitioned(connection):
+                return _detach_partitions(connection, cutoff)
+
+    return _move_rows(cutoff, batch_size)
+
+
+def _detach_partitions(connection, cutoff):
+    archived = 0
+
+    for name in attached_partitions(connection):
+        start = partition_start(name)
+        if add_months(start, 1) > cutoff:
+            continue
+
+        connection.execute(db.text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        connection.execute(db.text(
+            f"ALTER TABLE messages_archive ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{add_months(start, 1):%Y-%m-%d}')"))
+        archived += 1
+
+    return archived
+
+
+def _move_rows(cutoff, batch_size):
+    """Copy old rows to messages_archive and delete them, batch by batch.
+
+    Each batch is a short transaction. Note that deleting the live rows
+    cascades to their likes, tags and mentions, so archived messages
+    leave tag pages and mention timelines.
+    """
+
+    columns = [column.name for column in MessageArchive.__table__.columns]
+    archived = 0
+
+    while True:
+        ids = [message_id for (message_id,) in (db.session
+               .query(Message.id)
+               .filter(Message.timestamp < cutoff)
+               .order_by(Message.id)
+               .limit(batch_size))]
+
+        if not ids:
+            return archived
+
+        rows = (db.session
+                .query(*(getattr(Message, column) for column in columns))
+                .filter(Message.id.in_(ids)))
+        db.session.execute(MessageArchive.__table__.insert().from_select(columns, rows))
+        Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        archived += len(ids)
+
+
+def recent_messages(fetch, limit, now=None, months=RECENT_MONTHS):
+    """Newest `limit` messages, in at most two queries.
+
+    `fetch(lower, upper, limit)` returns the newest `limit` messages with
+    `lower <= timestamp < upper`, either bound None for none. The first
+    query covers the last `months` months ending with the month of `now`,
+    so PostgreSQL prunes every older partition at plan time. Only if they
+    hold fewer than `limit` messages does a second query fetch the rest
+    from before them, so low-activity users cost two queries, not one per
+    ever wider window.
+    """
+
+    lower = add_months(now or datetime.utcnow(), -months + 1)
+
+    rows = fetch(lower, None, limit)
+    if len(rows) < limit:
+        rows += fetch(None, lower, limit - len(rows))
+
+    return rows
+
+
+if __name__ == "__main__":
+    # Maintenance entry point, e.g. from a daily cron job:
+    #
+    #    python partitions.py convert          (one-off, PostgreSQL)
+    #    python partitions.py ensure
+    #    python partitions.py archive 2021-01
+
+    import sys
+
+    from app import app
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else 'ensure'
+
+        if command == 'convert':
+            convert_messages_table()
+        elif command == 'ensure':
+            print(f"Created partitions: {ensure_partitions()}")
+        elif command == 'archive':
+            cutoff = datetime.strptime(sys.argv[2], "%Y-%m")
+            print(f"Archived: {archive_before(cutoff)}")
+        else:
+            sys.exit(f"Unknown command: {command}")
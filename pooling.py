@@ -0,0 +1,130 @@
+"""Database connection pools for multi-process serving.
+
+Each worker process has its own pool of DB_POOL_SIZE connections, plus
+up to DB_MAX_OVERFLOW more under bursts, so PostgreSQL sees at most
+
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+connections from the app servers, plus a few from cron jobs; keep that
+under `max_connections`. Connections are checked with a ping before use
+(DB_POOL_PRE_PING), so a connection dropped by a database restart or a
+proxy timeout is replaced instead of failing a request. Connections are
+also replaced after DB_POOL_RECYCLE seconds.
+
+Forking: a connection shared by two processes corrupts both sides'
+conversations with the server. Before a fork, the parent (e.g. the
+gunicorn master with preload_app) returns its pooled connections to the
+server. The child then starts with an empty pool of its own. The
+parent's pool object is left untouched in the child and never closed
+there, because closing a shared socket would close it for the parent
+too. See gunicorn.conf.py for the serving setup.
+
+Many workers, or many hosts: put PgBouncer in front of PostgreSQL
+------------------------------------------------------------------
+
+When workers * (pool size + overflow) gets close to `max_connections`,
+run PgBouncer on each app host (or next to the database) in transaction
+pooling mode. Each server connection is then only held for one
+transaction, so many app connections share few server connections:
+
+    ; /etc/pgbouncer/pgbouncer.ini
+    [databases]
+    warbler = host=db.internal dbname=warbler
+
+    [pgbouncer]
+    listen_addr = 127.0.0.1
+    listen_port = 6432
+    pool_mode = transaction
+    default_pool_size = 20        ; server connections per database/user
+    max_client_conn = 1000
+    server_reset_query =          ; not needed in transaction mode
+
+Point the app at it, and let PgBouncer do the pooling (DB_POOL_SIZE=0
+means no pool in the app: a connection per checkout, which is cheap
+against a local PgBouncer):
+
+    DATABASE_URL=postgresql://127.0.0.1:6432/warbler DB_POOL_SIZE=0
+
+What transaction pooling allows: everything Warbler does runs in
+transactions, and the server-side cursors of `yield_per` (exports,
+graph loads) live inside one. Session state does not survive between
+transactions: don't rely on SET (use SET LOCAL), advisory session locks,
+or LISTEN. PgBouncer rejects unknown startup parameters, so the test
+harness's `options=-csearch_path=...` needs `ignore_startup_parameters
+= options` or a direct connection.
+"""
+
+import os
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 5
+
+# seconds to wait for a connection when the pool and overflow are in use
+DEFAULT_POOL_TIMEOUT = 10
+
+# seconds before a connection is replaced; below server and proxy idle timeouts
+DEFAULT_POOL_RECYCLE = 1800
+
+# engines that have connected in this process
+_engines = weakref.WeakSet()
+
+# pools inherited from the parent process, kept so their connections are
+# never closed from the child (see the module docstring)
+_inherited_pools = []
+
+
+def engine_options(config, url):
+    """create_engine keyword arguments for the DB_POOL_* settings of `config`.
+
+    SQLite gets SQLAlchemy's default pools, which suit it.
+    """
+
+    if url.drivername.startswith('sqlite'):
+        return {}
+
+    if config['DB_POOL_SIZE'] == 0:
+        return {'poolclass': NullPool, 'pool_pre_ping': config['DB_POOL_PRE_PING']}
+
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+@event.listens_for(Engine, "engine_connect")
+def _track_engine(connection, branch):
+    if not branch:
+        _engines.add(connection.engine)
+
+
+def _in_memory(engine):
+    return engine.url.drivername.startswith('sqlite') and engine.url.database in (None, '', ':memory:')
+
+
+def close_before_fork():
+    """Close this process's idle pooled connections (in the parent)."""
+
+    for engine in list(_engines):
+        if not _in_memory(engine):
+            engine.pool.dispose()
+
+
+def replace_pools_after_fork():
+    """Give every engine a new, empty pool (in the child)."""
+
+    for engine in list(_engines):
+        if not _in_memory(engine):
+            _inherited_pools.append(engine.pool)
+            engine.pool = engine.pool.recreate()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=close_before_fork, after_in_child=replace_pools_after_fork)
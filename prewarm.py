@@ -0,0 +1,302 @@
+"""Pre-warming of the homepage timeline on login.
+
+The first homepage after logging in runs all of its queries cold: the
+followed authors, the feed page (and the feed engine buffers of those
+authors), the likes of the page, the suggestions and the profile card
+counts. `do_login` hands the user to a background thread, which loads
+all of it (`load_timeline`) while the browser follows the redirect, and
+keeps it for PREWARM_TTL seconds.
+
+The homepage takes the timeline once; later loads are computed as usual,
+so they never show data older than the redirect. If the thread is still
+loading it, the homepage waits up to PREWARM_WAIT seconds for it rather
+than doing the same work a second time.
+
+Timelines are shared by the worker processes through the
+prewarmed_timelines table, so the redirect is warm whichever worker it
+reaches: the login writes the user's row (no payload yet, which other
+workers wait for), and the thread fills it in as JSON. The worker that
+served the login also keeps its timelines in memory, and reads those
+without a query. Everything kept is plain tuples, safe to use outside
+the session that loaded them.
+
+First homepage loads after a login are timed as "warm" (served from the
+cache) or "cold", and `stats` compares the two for /admin/prewarm.
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime, timedelta
+from queue import Queue
+
+from models import db, PrewarmedTimeline
+from feed import feed_engine
+import dal
+from pagination import Page, FEED_PAGE_SIZE, message_page
+
+# seconds a pre-warmed timeline is kept for the homepage
+DEFAULT_TTL = 30
+
+# seconds the homepage waits for a timeline that is still being loaded
+DEFAULT_WAIT = 1.0
+
+# seconds between reads of a timeline another worker is loading
+POLL_INTERVAL = 0.005
+
+# memory budget: at most this many timelines are kept (oldest dropped)
+DEFAULT_MAX_ENTRIES = 1000
+
+# first-load latencies kept per kind, for `stats`
+LATENCY_WINDOW = 1000
+
+# "who to follow" suggestions in the homepage sidebar
+SUGGESTIONS_SHOWN = 5
+
+Timeline = namedtuple('Timeline', 'messages next_cursor liked_ids suggestions counts')
+
+
+def load_timeline(user_id):
+    """Everything the homepage shows `user_id`."""
+
+    # only authors whose messages the viewer may see, so the feed
+    # page is not cut short by filtering after the merge
+    author_ids = dal.feed_author_ids(user_id)
+
+    if feed_engine.enabled:
+        ids = feed_engine.feed_ids(author_ids, FEED_PAGE_SIZE + 1)
+        page = Page(dal.feed_rows_by_ids(ids[:FEED_PAGE_SIZE], user_id),
+                    str(ids[FEED_PAGE_SIZE - 1]) if len(ids) > FEED_PAGE_SIZE else None)
+    else:
+        page = message_page(dal.home_feed(author_ids, user_id, FEED_PAGE_SIZE + 1), FEED_PAGE_SIZE)
+
+    return Timeline(messages=page.items,
+                    next_cursor=page.next_cursor,
+                    liked_ids=dal.liked_ids(user_id, [msg.id for msg in page.items]),
+                    suggestions=dal.suggested_users(user_id, SUGGESTIONS_SHOWN),
+                    counts=dal.user_counts(user_id))
+
+
+def to_json(timeline):
+    """`timeline` as JSON, for the other workers."""
+
+    return json.dumps(timeline._replace(liked_ids=sorted(timeline.liked_ids)),
+                      default=datetime.isoformat)
+
+
+def from_json(payload):
+    """The Timeline `to_json` wrote."""
+
+    messages, next_cursor, liked_ids, suggestions, counts = json.loads(payload)
+
+    return Timeline(messages=[dal.FeedRow(message_id, text, datetime.fromisoformat(timestamp),
+                                          user_id, dal.Author(*author))
+                              for message_id, text, timestamp, user_id, author in messages],
+                    next_cursor=next_cursor,
+                    liked_ids=set(liked_ids),
+                    suggestions=[dal.Author(*author) for author in suggestions],
+                    counts=dal.UserCounts(*counts))
+
+
+class Entry:
+    """A timeline being loaded, or loaded, for the homepage."""
+
+    __slots__ = ('ready', 'timeline', 'loaded_at')
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.timeline = None
+        self.loaded_at = None
+
+
+class TimelinePrewarmer:
+    """Background thread loading timelines of users who just logged in.
+
+    The thread is started lazily on the first login, so it is never
+    created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, ttl=DEFAULT_TTL, wait=DEFAULT_WAIT,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.app = app
+        self.enabled = True
+        self.ttl = ttl
+        self.wait = wait
+        self.max_entries = max_entries
+        self._reset()
+
+        if app is not None:
+            self.init_app(app)
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('PREWARM_ENABLED', True)
+        self.ttl = app.config.setdefault('PREWARM_TTL', self.ttl)
+        self.wait = app.config.setdefault('PREWARM_WAIT', self.wait)
+        app.extensions['timeline_prewarmer'] = self
+
+    def _reset(self):
+        self._entries = OrderedDict()
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._counts = {'submitted': 0, 'hits': 0, 'misses': 0,
+                        'late': 0, 'expired': 0, 'failed': 0}
+        self._latencies = {'cold': deque(maxlen=LATENCY_WINDOW),
+                           'warm': deque(maxlen=LATENCY_WINDOW)}
+
+    def submit(self, user_id):
+        """Start loading `user_id`'s timeline in the background."""
+
+        if not self.enabled:
+            return
+
+        entry = Entry()
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._entries[user_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._counts['submitted'] += 1
+
+        # other workers wait for the timeline from now on
+        db.session.merge(PrewarmedTimeline(user_id=user_id, payload=None,
+                                           submitted_at=datetime.utcnow(), loaded_at=None))
+        db.session.commit()
+
+        self._start()
+        self._queue.put((user_id, entry))
+
+    def take(self, user_id):
+        """`user_id`'s pre-warmed Timeline, or None; at most once per login."""
+
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+
+        if entry is None:
+            outcome, timeline = self._take_shared(user_id)
+        elif not entry.ready.wait(self.wait):
+            outcome, timeline = 'late', None
+        elif entry.timeline is None:
+            outcome, timeline = 'failed', None
+        elif time.monotonic() - entry.loaded_at > self.ttl:
+            outcome, timeline = 'expired', None
+        else:
+            outcome, timeline = 'hits', entry.timeline
+
+        with self._lock:
+            self._counts[outcome] += 1
+
+        return timeline
+
+    def _take_shared(self, user_id):
+        """(outcome, Timeline or None) of the timeline another worker loaded."""
+
+        deadline = time.monotonic() + self.wait
+        columns = (PrewarmedTimeline.payload, PrewarmedTimeline.submitted_at, PrewarmedTimeline.loaded_at)
+
+        while True:
+            row = db.session.query(*columns).filter(PrewarmedTimeline.user_id == user_id).first()
+            if row is not None and row.payload is not None:
+                break
+            # still loading, unless left behind by a worker that went away
+            if row is None or datetime.utcnow() - row.submitted_at > timedelta(seconds=self.ttl):
+                return 'misses', None
+            if time.monotonic() >= deadline:
+                return 'late', None
+            time.sleep(POLL_INTERVAL)
+
+        # only one worker gets it, should two take it at once
+        taken = (PrewarmedTimeline.query
+                 .filter(PrewarmedTimeline.user_id == user_id,
+                         PrewarmedTimeline.loaded_at == row.loaded_at)
+                 .delete(synchronize_session=False))
+        db.session.commit()
+
+        if not taken:
+            return 'misses', None
+        if datetime.utcnow() - row.loaded_at > timedelta(seconds=self.ttl):
+            return 'expired', None
+        return 'hits', from_json(row.payload)
+
+    def record_first_load(self, warm, seconds):
+        """Time of a first homepage load after login, served warm or cold."""
+
+        with self._lock:
+            self._latencies['warm' if warm else 'cold'].append(seconds)
+
+    def stats(self):
+        """Counters, and cold versus warm first-load latencies in ms."""
+
+        with self._lock:
+            report = dict(self._counts, pending=len(self._entries))
+            latencies = {kind: sorted(values) for kind, values in self._latencies.items()}
+
+        for kind, values in latencies.items():
+            report[kind] = {
+                'loads': len(values),
+                'mean_ms': round(statistics.mean(values) * 1000, 2) if values else None,
+                'median_ms': round(statistics.median(values) * 1000, 2) if values else None,
+                'p95_ms': round(values[int(len(values) * 0.95)] * 1000, 2) if values else None,
+            }
+
+        return report
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-prewarm", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            user_id, entry = self._queue.get()
+            self._warm(user_id, entry)
+            self._queue.task_done()
+
+    def _warm(self, user_id, entry):
+        with self.app.app_context():
+            try:
+                entry.timeline = load_timeline(user_id)
+                entry.loaded_at = time.monotonic()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Pre-warming the timeline of user %s failed", user_id)
+            finally:
+                entry.ready.set()
+
+            try:
+                self._share(user_id, entry.timeline)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Sharing the timeline of user %s failed", user_id)
+            finally:
+                db.session.remove()
+
+    def _share(self, user_id, timeline):
+        """Fill in `user_id`'s row for the other workers (or drop it, if
+        loading failed), and drop rows past the TTL."""
+
+        now = datetime.utcnow()
+        rows = PrewarmedTimeline.query.filter(PrewarmedTimeline.user_id == user_id)
+
+        if timeline is None:
+            rows.delete(synchronize_session=False)
+        else:
+            rows.update({'payload': to_json(timeline), 'loaded_at': now}, synchronize_session=False)
+
+        (PrewarmedTimeline.query
+         .filter(PrewarmedTimeline.submitted_at < now - timedelta(seconds=self.ttl))
+         .delete(synchronize_session=False))
+        db.session.commit()
+
+
+timeline_prewarmer = TimelinePrewarmer()
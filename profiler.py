@@ -0,0 +1,179 @@
+"""Opt-in cProfile profiling of live requests.
+
+A request is profiled when an admin sends the profiling header
+(`X-Profile: 1` by default) or when it is picked by the sampling rate
+(`PROFILE_SAMPLE_RATE`, 0 by default, so nothing is sampled). Profiles
+are written as pstats files to `PROFILE_DIR`; they open in pstats,
+snakeviz, or flameprof for a flame graph. Only the `PROFILE_KEEP`
+slowest profiles of each endpoint are kept.
+
+File names carry the endpoint, duration and time of the request, so the
+listing reads the directory alone and covers every worker process.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+
+DEFAULT_HEADER = 'X-Profile'
+
+# slowest profiles kept per endpoint
+DEFAULT_KEEP = 20
+
+TIME_FORMAT = "%Y%m%dT%H%M%S%f"
+
+PROFILE_NAME = re.compile(r'^(?P<endpoint>[\w.]+)-(?P<micros>\d+)-(?P<time>\d{8}T\d{12})\.prof$')
+
+
+def profile_name(endpoint, seconds, when):
+    return f"{endpoint}-{round(seconds * 1e6)}-{when.strftime(TIME_FORMAT)}.prof"
+
+
+def parse_profile_name(name):
+    """Dict of endpoint, duration_ms and profiled_at; None if not a profile."""
+
+    match = PROFILE_NAME.match(name)
+    if not match:
+        return None
+
+    return {
+        'name': name,
+        'endpoint': match.group('endpoint'),
+        'duration_ms': int(match.group('micros')) / 1000,
+        'profiled_at': datetime.strptime(match.group('time'), TIME_FORMAT).isoformat(),
+    }
+
+
+class RequestProfiler:
+    """Profile requests picked by header or sampling; one at a time.
+
+    cProfile can't run two profiles at once, and one profiled request per
+    process bounds the overhead, so a request arriving while another one
+    is profiled is not profiled.
+    """
+
+    def __init__(self, app=None, sample_rate=0.0, keep=DEFAULT_KEEP):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.header = DEFAULT_HEADER
+        self.directory = None
+        self._busy = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register the request hooks.
+
+        Call this after the hook that loads `g.user`: the header is only
+        honoured for admins.
+        """
+
+        self.sample_rate = app.config.setdefault('PROFILE_SAMPLE_RATE', self.sample_rate)
+        self.keep = app.config.setdefault('PROFILE_KEEP', self.keep)
+        self.header = app.config.setdefault('PROFILE_HEADER', self.header)
+        self.directory = app.config.setdefault(
+            'PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abandon)
+        app.extensions['profiler'] = self
+
+    def _wanted(self):
+        if request.headers.get(self.header):
+            user = g.get('user')
+            return bool(user and user.admin)
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start(self):
+        if not self._wanted() or not self._busy.acquire(blocking=False):
+            return
+
+        profile = cProfile.Profile()
+        g._profile = (profile, time.perf_counter())
+        profile.enable()
+
+    def _finish(self, response):
+        if g.get('_profile') is None:
+            return response
+
+        profile, start = g._profile
+        profile.disable()
+        duration = time.perf_counter() - start
+        g._profile = None
+        self._busy.release()
+
+        name = self.save(profile, request.endpoint or 'unknown', duration)
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def _abandon(self, exc):
+        """Stop a profile whose request failed before `_finish`."""
+
+        if g.get('_profile') is not None:
+            g._profile[0].disable()
+            g._profile = None
+            self._busy.release()
+
+    def path(self, name):
+        """Path of profile `name`; ValueError for names that aren't profiles."""
+
+        if parse_profile_name(name) is None:
+            raise ValueError(f"not a profile name: {name!r}")
+
+        return os.path.join(self.directory, name)
+
+    def save(self, profile, endpoint, duration):
+        """Write `profile` as a pstats file and prune `endpoint`'s profiles."""
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        name = profile_name(endpoint, duration, datetime.utcnow())
+        profile.dump_stats(self.path(name))
+        self._prune(endpoint)
+
+        return name
+
+    def _prune(self, endpoint):
+        for info in self.slowest().get(endpoint, [])[self.keep:]:
+            try:
+                os.remove(self.path(info['name']))
+            except FileNotFoundError:
+                pass  # pruned by another worker
+
+    def slowest(self):
+        """{endpoint: [profile dicts, slowest first]}."""
+
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {}
+
+        by_endpoint = {}
+        for info in filter(None, map(parse_profile_name, names)):
+            by_endpoint.setdefault(info['endpoint'], []).append(info)
+
+        for profiles in by_endpoint.values():
+            profiles.sort(key=lambda info: info['duration_ms'], reverse=True)
+
+        return by_endpoint
+
+    def summary(self, name, limit=40):
+        """Text report of profile `name`'s top functions by cumulative time."""
+
+        stream = io.StringIO()
+        pstats.Stats(self.path(name), stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,241 @@
+"""Account deletion and background purging for Warbler.
+
+Small accounts are deleted inside the request, relying on the database's
+ON DELETE CASCADE foreign keys. Large accounts are tombstoned (marked as
+deleted and unfollowed by everyone) and their messages are removed in
+batches by a background worker, so a request never waits on them.
+
+The tombstone is the durable record of a purge: the user row goes last.
+Each worker process resumes the purges of all tombstoned accounts on its
+first request, so purges cut short by a restart, or by a worker recycled
+after max_requests, are finished. A worker claims a purge before running
+it (`claim`) and renews the claim with every batch. A claim not renewed
+for PURGE_LEASE seconds is given up, so of several workers resuming the
+same account only one purges it.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from queue import Queue
+
+from models import db, User, Message, Follows
+
+# accounts with at most this many messages are deleted in the request
+IMMEDIATE_DELETE_LIMIT = 500
+
+# number of messages removed per transaction while purging
+PURGE_BATCH_SIZE = 1000
+
+# number of finished jobs kept around for the admin progress report
+MAX_FINISHED_JOBS = 100
+
+# seconds without progress after which another worker may take over a purge
+PURGE_LEASE = 300
+
+
+class PurgeJob:
+    """Progress of purging one tombstoned account."""
+
+    def __init__(self, user_id, username, total):
+        self.user_id = user_id
+        self.username = username
+        self.total = total
+        self.deleted = 0
+        self.status = "queued"
+        self.error = None
+        self.queued_at = datetime.utcnow()
+        self.finished_at = None
+
+    def to_dict(self):
+        """Serialize job for the admin progress report."""
+
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'error': self.error,
+            'queued_at': self.queued_at.isoformat(),
+            'finished_at': self.finished_at and self.finished_at.isoformat(),
+        }
+
+
+class PurgeWorker:
+    """Background thread removing tombstoned accounts in batches.
+
+    The thread is started lazily on the first submitted job, so it is
+    never created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, batch_size=PURGE_BATCH_SIZE):
+        self.app = app
+        self.batch_size = batch_size
+        self.jobs = OrderedDict()
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['purge_worker'] = self
+
+        if app.config.setdefault('PURGE_RESUME', True):
+            app.before_first_request(self.resume)
+
+    def resume(self):
+        """Queue the purges of tombstoned accounts not queued here; the jobs."""
+
+        totals = dict(db.session
+                      .query(Message.user_id, db.func.count(Message.id))
+                      .join(User, User.id == Message.user_id)
+                      .filter(User.deleted_at.isnot(None))
+                      .group_by(Message.user_id))
+
+        with self._lock:
+            pending = {user_id for user_id, job in self.jobs.items()
+                       if job.status in ("queued", "running")}
+
+        return [self.submit(user_id, username, totals.get(user_id, 0))
+                for user_id, username in (db.session
+                                          .query(User.id, User.username)
+                                          .filter(User.deleted_at.isnot(None))
+                                          .order_by(User.id))
+                if user_id not in pending]
+
+    def submit(self, user_id, username, total):
+        """Queue account `user_id` for purging and return its job."""
+
+        job = PurgeJob(user_id, username, total)
+
+        with self._lock:
+            self.jobs[user_id] = job
+            self._trim_finished()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-purge", daemon=True)
+                self._thread.start()
+
+        self._queue.put(job)
+        return job
+
+    def progress(self):
+        """List of job dicts, most recent first."""
+
+        with self._lock:
+            return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def _trim_finished(self):
+        finished = [user_id for user_id, job in self.jobs.items()
+                    if job.status in ("done", "failed", "skipped")]
+        for user_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[user_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self.app.app_context():
+                try:
+                    if claim(job.user_id):
+                        job.status = "running"
+                        purge_account(job.user_id, self.batch_size, job)
+                        job.status = "done"
+                    else:
+                        # another worker is purging it, or it is gone
+                        job.status = "skipped"
+                except Exception as exc:
+                    db.session.rollback()
+                    job.status = "failed"
+                    job.error = str(exc)
+                finally:
+                    job.finished_at = datetime.utcnow()
+                    db.session.remove()
+            self._queue.task_done()
+
+
+purge_worker = PurgeWorker()
+
+
+def claim(user_id, now=None):
+    """Claim the purge of tombstoned account `user_id` for this worker.
+
+    False if the account is gone, or another worker made progress on it
+    in the last PURGE_LEASE seconds.
+    """
+
+    now = now or datetime.utcnow()
+
+    claimed = (User
+               .query
+               .filter(User.id == user_id,
+                       User.deleted_at.isnot(None),
+                       User.purge_claimed_at.is_(None) |
+                       (User.purge_claimed_at < now - timedelta(seconds=PURGE_LEASE)))
+               .update({User.purge_claimed_at: now}, synchronize_session=False))
+    db.session.commit()
+
+    return claimed == 1
+
+
+def purge_account(user_id, batch_size=PURGE_BATCH_SIZE, job=None):
+    """Delete all messages of `user_id` in batches, then the user row.
+
+    Each batch is its own short transaction, which also renews the
+    worker's claim. Likes of those messages, and the user's follows and
+    likes, go with the database cascades.
+    """
+
+    while True:
+        ids = [message_id for (message_id,) in (db.session
+               .query(Message.id)
+               .filter(Message.user_id == user_id)
+               .limit(batch_size))]
+
+        if not ids:
+            break
+
+        (Message
+         .query
+         .filter(Message.id.in_(ids))
+         .delete(synchronize_session=False))
+        (User
+         .query
+         .filter(User.id == user_id)
+         .update({User.purge_claimed_at: datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+
+        if job:
+            job.deleted += len(ids)
+
+    User.query.filter(User.id == user_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def delete_account(user):
+    """Delete `user`, in the request if small or in the background if not.
+
+    Returns the purge job for large accounts, otherwise None.
+    """
+
+    total = (db.session
+             .query(db.func.count(Message.id))
+             .filter(Message.user_id == user.id)
+             .scalar())
+
+    if total <= IMMEDIATE_DELETE_LIMIT:
+        db.session.delete(user)
+        db.session.commit()
+        return None
+
+    # tombstone: hide the account and cut its follows right away, so it
+    # disappears from feeds while its messages are purged
+    user.deleted_at = datetime.utcnow()
+    (Follows
+     .query
+     .filter((Follows.user_following_id == user.id) |
+             (Follows.user_being_followed_id == user.id))
+     .delete(synchronize_session=False))
+    db.session.commit()
+
+    return purge_worker.submit(user.id, user.username, total)
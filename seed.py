@@ -1,8 +1,11 @@
 """Seed database with sample data from CSV Files."""
 
 from csv import DictReader
-from app import db
+from datetime import datetime
+from app import app, db
 from models import User, Message, Follows
+from blobstore import store_data_uri
+import snowflake
 
 
 db.drop_all()
@@ -11,8 +14,16 @@ db.create_all()
 with open('generator/users.csv') as users:
     db.session.bulk_insert_mappings(User, DictReader(users))
 
+def with_snowflake_ids(rows):
+    """Give seeded messages ids matching their (historical) timestamps."""
+
+    for sequence, row in enumerate(rows):
+        timestamp = datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S.%f')
+        yield dict(row, id=snowflake.from_datetime(timestamp, sequence), timestamp=timestamp)
+
+
 with open('generator/messages.csv') as messages:
-    db.session.bulk_insert_mappings(Message, DictReader(messages))
+    db.session.bulk_insert_mappings(Message, with_snowflake_ids(DictReader(messages)))
 
 with open('generator/follows.csv') as follows:
     db.session.bulk_insert_mappings(Follows, DictReader(follows))
@@ -33,7 +44,13 @@ private_user2.private = True;
 
 db.session.commit()
 
-curr_user = User.signup(username='christen', email='christen@mail.com', password='password', image_url='data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAANoAAADoCAMAAAC+cQpPAAAAkFBMVEUtLS3///8uLi7z8/P09PT+/v77+/v39/cqKiohISEoKCglJSUdHR0ZGRkXFxceHh7q6uoRERHU1NQAAABeXl7IyMivr69BQUGgoKDh4eGVlZVMTExGRkYyMjI8PDympqbb29uPj4+AgIBwcHB8fHycnJxvb2+RkZG9vb1nZ2dUVFTOzs7Dw8NaWlpLS0u3t7fQ2K63AAAP70lEQVR4nN2deX+iPBDHE1AIp2CtV+tZ26dqd33/7+4B5BJCmAmXW/9o59PdYL5MMr8khAyh8WcsZUgW687I/YnEv7VxydBQxvjRoBCD962t1YPe0TRdS761aEA4YGR6amgyBroepOqKepUx1uM6QgyqJ1csGzAy+XqEaNooKSYyRnExmJFwqIlR/kvJ0FRIPcAVIvkbogqMUWrE5dXyFdXUiCtbNnhkesFoqR4k8F7ppvGuOC5csdpVmc+EQO2QCZxHqAYio3UXypGBXNWMbFRPRsl4XH8hwC3ql0zYdmIj0TVks0b1sw7JBPXQErTW7tXQESQx9FSyIREE1BqfI4JEwkbAV3yWfgaIIHfjUbIlI0iH/WxUNiC9QiDZxSv+UxEkk2yRsD1rBIEMHcSS3XYESYe9HUaQtB4gyW4YQcbB75G32u+n1+t+v/KCy8b/0kkEiSvEk2yU82v7mT69Hb4ui61iGRPbtieGpWwXl6//blM1CtL1QHK9QijZDSNIcJ3V7bh1HduwTMYYIQqJPoHNLMNxXOVjN63++iYRJD/Llh3rV5Jp3s9h++IYLAEiiqIUDGbZvvEx94JiLUcQsWQ3iiD6z2njB1g8oEeDWY4/W+4RZJAIwpPsUvuWiSCrz3fXYiKgB4OYtnX+1lqMIPd6PEp2tfPh/Wz/ZUxY2ggrW+OjYbmbtZfJUHUEEYa0xzscSnabqwXTP74l6F7VBpv4J69ZPQoV4ko2KoJk/WxM9+cXC+6qgkGMl6PXQsdPbjUZV5PhIsiIqsfAY3kyNKJhBc2ypUl+TrIbRhCdzjcTOaB8s7Q386p6iCcfxQrlJLtZBNE1b+Yy0sxnkcWcmcetEG7EoCVoTSOIrs3DttgCWRgt/V34rah6lCrEkWypCKJ5J78BkFK8If5spRUrhOse4V8qJBsVQbT9X7tNssBxm2sTMj2R7HFZsnGh6Me02iVTFGYvwWSlCKJzJFuqn413DivWTAaxUN49Qeccd6M8t89LthSZtvZ5NWtKRoh9UfXqegCCZE6y5SLIoUzWtDXGhvEWD7zkJvkcycb1s2ZkXFenhvHuoSukCyS7buGylqxFRCtgg9SDR5ZJtlwEWbrd+Sz8aS1UXaqf5SRbal6kzRuRQRCtd5XKkGWSLRdBrkYp6rdMRhTjXFePysW0SLKlIoi+2nShZ0XDOYArJJRsRLPWtbfSGKQDskC7b8gIovMkGzN7GB+cXsgIc/ecUAJ4hFKWbNh6o/bj9kNGiLnlhBLAcnwq2SA9S1cLdG/LeiILQsmpsh7VZJlkI6dD9DiRB0KSKcT/qakQ55lQTrJRwkivfm8+Cwy2GeEiSLQRLJFsTAQJjK38OggYKGdMjhQVQVLJFncv3oU+HWlXySHaVx0RQfKSjYkgQTG1bzJi/kFEkLxkY6dDR6O/fhYbUSSBRZC8ZCP7GV0ZfQFlhrmg0AiSk2wsWei0XltjZPjfwAhSkmxwPwucZrH+yQhbUNSmolSyEWT0v0nP/ez+2/3RMWQJGjjqh6U3bAgyYp1poUKibcyJZKOeFMzdQcgUYqweXSVCFEl2dYd9Qz/NbYVMIfaaXyFpyS6W3/syQC2QEfOvButnKMnOPbc6GAORBfF/CtyzV5Ls+ggSLhuUF0T6IiOT/zQEWYiGWt6blpYNeiMj7K306EJAxpNs0TsW9NMejIwo/qpUIUnJ5pW/mFig9sgUZw72mViyeWQeYUifNQfKDOtUA8SRbFAECY2rO1hrVMKFBCAZT7LrhtbryWCtMfz5oiPCf4VkV0n+2RqSjPhXWPiP1sMrJLsiAo0WbEgyYs91MBlfsivnst6EpF82ABkxDhRMxpfsStV4dQclU5KJDYRsnGyGB03OtZ09KJlivoHJeJItmDQkY+OhyO7RH0bGk2zBGIaerEHJCDOhZBzJrowgkXG2BiUjzIKR5SQbuAg2DkeQA5IRYmkgn3Eku2Zyri3YsGTEUkWvrj9uWn6UbDEZ1bZsWDJignzGkey6WZC+IcOSERNOlpdscQSJfhMyKFkQ/WvJuJJdP3NVN+mXDUKm3HUN5LNxJtk1ESQy4mfzg5ER9g71WV6yAWSjYOA/KBkxZ0Cf5SW7vjUGxhi8MtINWbSCACLLSXZtBLkbZ2tQMjJZw1pjZESSDYggd+NkDUpGnDlvll3xymL0/lpx4bIS8WAMSkbcb84su+o16EyyIQuXy8mgZMTfg32Wk2zQUtG3MygZ8eE+40m2aOFymu7IHYJMucsakCxd8wct7408pU7YuiRTrCO4NaaSDTyRoV7YOiVT7B3UZ6lkw5dkT2Jh65YsfHYI9Fki2bVAmbGz+wbKkRFDB/oskWzQoWuxMXXIYD4j1gxDdpdsMFk4rRmMrDDMqj2whGSnE0I6HP1jDkYWdDUNQZaTbFCH05Z2/st67XBs640AEaQk2dBQcn9MP0gosc4awmeZZMPIgmLRmSgDtMZw2D/O1aPGZxzJrl3BjDZDDkFG2AruM6xkR8Ve/WHIlGjxAEqGlOy4mFEK//1Itj2Ht0akZMfF6NEawmcKcVSwz5CSnTbiV//xW/shix+IYg66y0k27BmIri0ejiPqiYz4rzifgSU7XyzcptU7WbwbBkFGYZL9UGw16Z+M2J9IMqBkF4qF+2J6JiOOhyRLJRtDli3+9EdmnVARJCfZKDJNjZ9q9EdG3KmG8RlQssvlx5+lk1M6JrNmODKYZPOKqZXvHHaEaN90FFnULOskm1/+VHFeVjc+I2yBmajlJBtPRvcvfZIRZweZzhQPAhNLduWFZmaPZEyR8FmNZFcr/bcLqWM7ZMluahyZWLIFsXX0ZvZGxjaaBJlQsoUXuh810geZ4uzwZGLJFl9otGU9kbGNXluh8lGCySkxeDJK13Y/ZLHTkEc/J5KNeD6cGV7+8M4Oydh2hCeL9tNVSDZgOvRh9UEWzWaQZPHuzlzGExRZupDQMRkzVWw/S94OzU6JwZEFxqbyxJH2yIhxlGuNlC/ZwKF1tH28YzLie5JkXMmGTho8v3syayZLxpNs+IXezM7Dv/s9lokguYwnUmR0bXTss6A9qrCT1Ys+40k2Zmh9c7omM2eSqbjSJGX4fhYa+rTz8G8cxhJkXMnGkKm6Vzo2t23nTXYyZDzJxjk/frG+s9ZIkj0wuAiSGnnJxjbreSvCJiBTJp+AO/zos/QlmrxkI31G6V+zYzJifWBudUTGk+xasrn6eIzw0e6ajBBbL9RDE5NlwpaT7HqfXc25FpcP/uJ9uN2ThQdxZPXQ6Gi+BpLlJBvQGrXzy/vnVA997V2PSsWBU62SRadD0tgN2vSwfVmBIkiW8QQY9b0X07Y375fLQgmztPRBppDJaRpWd/V9XNjG5CSMIA+DkViygXoWHpjLGDNZO9MZAFkYSlzftn03upkv3hgSQUaZZIOV+o/VHAhJli/m5HtebfoJaF7Ru7EivNOY+kJkW5WXUaeCDJlXtIcRscBwv8uH2FefkiVOUla+RePPlsaNEmT2EXU8vzCvKBcxOlV8iA5nvcEjCIXmFdUfLnR0B/EZY7l8GgUyTrOE5RUt3qtD8pSmVzL7WiIrK3VZspELKku/+gTuzsh+Ksl4Z9yUU4HDhtb0ahv9kplGmaz2EHu5VOCjL5fJkkkgGts9iqxZKvDb1pbbPIIfgzD37GEiiJxk56ZD3pI5VYcft0pmb+bViXQ6SQVOqbrb+tgnUeh+ZvgHQdoy0ZGdDVOBX08T17YYeIKD8xmzHPfo0epxY5epwINuOl2eF4rhOHbwcVxHuOkCQcZMw2V/5jpFzGLwkl3frL3r6/d8t9zNv69rowQEJlNcN75DvrGdHX888R3uIxU4Tbo51cZLwM60CjJ/tQrv0G5++5nuvdp69J0KPDz5TbY1+qtEhji5xZ4gFfihdpxSiehPBTL0BKnAj3V77qqd517h9RBX6A7Udirwc83qiaBZuj9wMsjh2i2nAtcW3LElKOrfd5mhnliIKtR2KnDPl9cz47+qetD6eowe60HbTwU+t+UlO3xXvqUI0kUq8EandL+seM/knyQV+M1vQEasL0AS6IFSgcdHJEiPiJ2fSjJUBLlXqNVU4BerRIZADPerehV3eOBU4OqsPDRGzjytrdegHoUKtZcKfPXWiOxuWNs9bdrx1VSyq8lQEeRbadQas7Wrucw6CIesrVTg+tFpFEGyZknck8qvxzCpwG8bo+wqGcSwmKHMpft7RtZOKvDpu89RalmyYFjiL67ZCqJMBGkpFfj07DfM7lJcngvhZo0SZjdPBR785fXsc1+vbEQWGJZ7fs25qudU4COq3S4uf37WlCz4YbmXW9pzUBFE50g2op8F/dRbb5y6rUzyZMHHtDdrtaYeWYVKoUQyFTgd/Xy9TGoXxhuRBQabvHxdKRX6rDJIyqUC95bvfiu5YMVk4U/L/7uMT+OARRCBZNf3s+vJFD2maQMobzCbna5QMl0g2XULl+ruzUleOem2NWYGM5y/O29cTqlQFUEoNhV48H+mHxPbFD6dadtnydjSnnxcS2SV/QyXClzX7k+dWnMVEjHoddudSmEJRjGpwKn6erLrnxV2RxaNwBz79JrlKq6MIDnJru9nQQ9zq0NiI0RMswwCpnOZq3yy4guGoFTg++PGNjH16IwsMExHOe7vpxwIySCpwL8vLiwk9kIWfJgRjMFogayMKE4FHrZExReHxN7JIjpXCUOK6MhOYSpwna4OlsOwX989WWgwxzqs0hdLRJJdJtO16cmGbzHuNjbyDGbYH9OKfiZKBU7Hr7Nou9Jz+uxuEMs+T7lkglTg9HoRjH8bkTUGejAs/zLlvKJcnVd0eva7CvatI5r+jN8seUnKvJOLe+d6SDISLjacPE6zLCcp09ZWsvL2zP3swTCsT710JkApFfjr1n46GQNES3v7TQvNspAKfPTlYzc6DtwaE4P5H6MHskJe0VfTwF76ScgCwzBfeZIdkY0PPnroIYPYVbNk/mGkFyU7IlNnjvyln4As+Nh/kr1dD6nAvU2DN9KegyzQgftz1UfJ3tcul/4DZOFsbl+U7BV8K6oMUF9k97c4HiTb2+KPantKsmDgtV09SPbsF/Sz5Mus+IDk+8FuywZv6z4bmaK4y0yyvZffRBa+UppK9vEfHoPwvsw4JpLtockQiJ0CVdXD8uKddUv7N7XG8BMdCxHq2l/ka7vP3RpDg72PI7Sr+9vIFBJu0SbZUe+/h0yJThYjVPYU42cmI2yrB2iShw89NVn4PkSAdn9V5JeRhel6SJxU55eREfMPJZrMoapPTxbESI1MJV78f34yRfGn5IY/fOhfICPOjay7HBoPR0aMNfkCnoSIAHoGMmJ9kbfuBpBDkhF2IVvyK8lIAPYrW2P4SdKW/zqy0Ni0fsXnIAvAFvAzGv4lsmA2SmZRfleSlOvB6OfLzDNZp093f9fH+Pwf0ll35MAaQEMAAAAASUVORK5CYII=')
+ADMIN_IMAGE_DATA_URI = 'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAANoAAADoCAMAAAC+cQpPAAAAkFBMVEUtLS3///8uLi7z8/P09PT+/v77+/v39/cqKiohISEoKCglJSUdHR0ZGRkXFxceHh7q6uoRERHU1NQAAABeXl7IyMivr69BQUGgoKDh4eGVlZVMTExGRkYyMjI8PDympqbb29uPj4+AgIBwcHB8fHycnJxvb2+RkZG9vb1nZ2dUVFTOzs7Dw8NaWlpLS0u3t7fQ2K63AAAP70lEQVR4nN2deX+iPBDHE1AIp2CtV+tZ26dqd33/7+4B5BJCmAmXW/9o59PdYL5MMr8khAyh8WcsZUgW687I/YnEv7VxydBQxvjRoBCD962t1YPe0TRdS761aEA4YGR6amgyBroepOqKepUx1uM6QgyqJ1csGzAy+XqEaNooKSYyRnExmJFwqIlR/kvJ0FRIPcAVIvkbogqMUWrE5dXyFdXUiCtbNnhkesFoqR4k8F7ppvGuOC5csdpVmc+EQO2QCZxHqAYio3UXypGBXNWMbFRPRsl4XH8hwC3ql0zYdmIj0TVks0b1sw7JBPXQErTW7tXQESQx9FSyIREE1BqfI4JEwkbAV3yWfgaIIHfjUbIlI0iH/WxUNiC9QiDZxSv+UxEkk2yRsD1rBIEMHcSS3XYESYe9HUaQtB4gyW4YQcbB75G32u+n1+t+v/KCy8b/0kkEiSvEk2yU82v7mT69Hb4ui61iGRPbtieGpWwXl6//blM1CtL1QHK9QijZDSNIcJ3V7bh1HduwTMYYIQqJPoHNLMNxXOVjN63++iYRJD/Llh3rV5Jp3s9h++IYLAEiiqIUDGbZvvEx94JiLUcQsWQ3iiD6z2njB1g8oEeDWY4/W+4RZJAIwpPsUvuWiSCrz3fXYiKgB4OYtnX+1lqMIPd6PEp2tfPh/Wz/ZUxY2ggrW+OjYbmbtZfJUHUEEYa0xzscSnabqwXTP74l6F7VBpv4J69ZPQoV4ko2KoJk/WxM9+cXC+6qgkGMl6PXQsdPbjUZV5PhIsiIqsfAY3kyNKJhBc2ypUl+TrIbRhCdzjcTOaB8s7Q386p6iCcfxQrlJLtZBNE1b+Yy0sxnkcWcmcetEG7EoCVoTSOIrs3DttgCWRgt/V34rah6lCrEkWypCKJ5J78BkFK8If5spRUrhOse4V8qJBsVQbT9X7tNssBxm2sTMj2R7HFZsnGh6Me02iVTFGYvwWSlCKJzJFuqn413DivWTAaxUN49Qeccd6M8t89LthSZtvZ5NWtKRoh9UfXqegCCZE6y5SLIoUzWtDXGhvEWD7zkJvkcycb1s2ZkXFenhvHuoSukCyS7buGylqxFRCtgg9SDR5ZJtlwEWbrd+Sz8aS1UXaqf5SRbal6kzRuRQRCtd5XKkGWSLRdBrkYp6rdMRhTjXFePysW0SLKlIoi+2nShZ0XDOYArJJRsRLPWtbfSGKQDskC7b8gIovMkGzN7GB+cXsgIc/ecUAJ4hFKWbNh6o/bj9kNGiLnlhBLAcnwq2SA9S1cLdG/LeiILQsmpsh7VZJlkI6dD9DiRB0KSKcT/qakQ55lQTrJRwkivfm8+Cwy2GeEiSLQRLJFsTAQJjK38OggYKGdMjhQVQVLJFncv3oU+HWlXySHaVx0RQfKSjYkgQTG1bzJi/kFEkLxkY6dDR6O/fhYbUSSBRZC8ZCP7GV0ZfQFlhrmg0AiSk2wsWei0XltjZPjfwAhSkmxwPwucZrH+yQhbUNSmolSyEWT0v0nP/ez+2/3RMWQJGjjqh6U3bAgyYp1poUKibcyJZKOeFMzdQcgUYqweXSVCFEl2dYd9Qz/NbYVMIfaaXyFpyS6W3/syQC2QEfOvButnKMnOPbc6GAORBfF/CtyzV5Ls+ggSLhuUF0T6IiOT/zQEWYiGWt6blpYNeiMj7K306EJAxpNs0TsW9NMejIwo/qpUIUnJ5pW/mFig9sgUZw72mViyeWQeYUifNQfKDOtUA8SRbFAECY2rO1hrVMKFBCAZT7LrhtbryWCtMfz5oiPCf4VkV0n+2RqSjPhXWPiP1sMrJLsiAo0WbEgyYs91MBlfsivnst6EpF82ABkxDhRMxpfsStV4dQclU5KJDYRsnGyGB03OtZ09KJlivoHJeJItmDQkY+OhyO7RH0bGk2zBGIaerEHJCDOhZBzJrowgkXG2BiUjzIKR5SQbuAg2DkeQA5IRYmkgn3Eku2Zyri3YsGTEUkWvrj9uWn6UbDEZ1bZsWDJignzGkey6WZC+IcOSERNOlpdscQSJfhMyKFkQ/WvJuJJdP3NVN+mXDUKm3HUN5LNxJtk1ESQy4mfzg5ER9g71WV6yAWSjYOA/KBkxZ0Cf5SW7vjUGxhi8MtINWbSCACLLSXZtBLkbZ2tQMjJZw1pjZESSDYggd+NkDUpGnDlvll3xymL0/lpx4bIS8WAMSkbcb84su+o16EyyIQuXy8mgZMTfg32Wk2zQUtG3MygZ8eE+40m2aOFymu7IHYJMucsakCxd8wct7408pU7YuiRTrCO4NaaSDTyRoV7YOiVT7B3UZ6lkw5dkT2Jh65YsfHYI9Fki2bVAmbGz+wbKkRFDB/oskWzQoWuxMXXIYD4j1gxDdpdsMFk4rRmMrDDMqj2whGSnE0I6HP1jDkYWdDUNQZaTbFCH05Z2/st67XBs640AEaQk2dBQcn9MP0gosc4awmeZZMPIgmLRmSgDtMZw2D/O1aPGZxzJrl3BjDZDDkFG2AruM6xkR8Ve/WHIlGjxAEqGlOy4mFEK//1Itj2Ht0akZMfF6NEawmcKcVSwz5CSnTbiV//xW/shix+IYg66y0k27BmIri0ejiPqiYz4rzifgSU7XyzcptU7WbwbBkFGYZL9UGw16Z+M2J9IMqBkF4qF+2J6JiOOhyRLJRtDli3+9EdmnVARJCfZKDJNjZ9q9EdG3KmG8RlQssvlx5+lk1M6JrNmODKYZPOKqZXvHHaEaN90FFnULOskm1/+VHFeVjc+I2yBmajlJBtPRvcvfZIRZweZzhQPAhNLduWFZmaPZEyR8FmNZFcr/bcLqWM7ZMluahyZWLIFsXX0ZvZGxjaaBJlQsoUXuh810geZ4uzwZGLJFl9otGU9kbGNXluh8lGCySkxeDJK13Y/ZLHTkEc/J5KNeD6cGV7+8M4Oydh2hCeL9tNVSDZgOvRh9UEWzWaQZPHuzlzGExRZupDQMRkzVWw/S94OzU6JwZEFxqbyxJH2yIhxlGuNlC/ZwKF1tH28YzLie5JkXMmGTho8v3syayZLxpNs+IXezM7Dv/s9lokguYwnUmR0bXTss6A9qrCT1Ys+40k2Zmh9c7omM2eSqbjSJGX4fhYa+rTz8G8cxhJkXMnGkKm6Vzo2t23nTXYyZDzJxjk/frG+s9ZIkj0wuAiSGnnJxjbreSvCJiBTJp+AO/zos/QlmrxkI31G6V+zYzJifWBudUTGk+xasrn6eIzw0e6ajBBbL9RDE5NlwpaT7HqfXc25FpcP/uJ9uN2ThQdxZPXQ6Gi+BpLlJBvQGrXzy/vnVA997V2PSsWBU62SRadD0tgN2vSwfVmBIkiW8QQY9b0X07Y375fLQgmztPRBppDJaRpWd/V9XNjG5CSMIA+DkViygXoWHpjLGDNZO9MZAFkYSlzftn03upkv3hgSQUaZZIOV+o/VHAhJli/m5HtebfoJaF7Ru7EivNOY+kJkW5WXUaeCDJlXtIcRscBwv8uH2FefkiVOUla+RePPlsaNEmT2EXU8vzCvKBcxOlV8iA5nvcEjCIXmFdUfLnR0B/EZY7l8GgUyTrOE5RUt3qtD8pSmVzL7WiIrK3VZspELKku/+gTuzsh+Ksl4Z9yUU4HDhtb0ahv9kplGmaz2EHu5VOCjL5fJkkkgGts9iqxZKvDb1pbbPIIfgzD37GEiiJxk56ZD3pI5VYcft0pmb+bViXQ6SQVOqbrb+tgnUeh+ZvgHQdoy0ZGdDVOBX08T17YYeIKD8xmzHPfo0epxY5epwINuOl2eF4rhOHbwcVxHuOkCQcZMw2V/5jpFzGLwkl3frL3r6/d8t9zNv69rowQEJlNcN75DvrGdHX888R3uIxU4Tbo51cZLwM60CjJ/tQrv0G5++5nuvdp69J0KPDz5TbY1+qtEhji5xZ4gFfihdpxSiehPBTL0BKnAj3V77qqd517h9RBX6A7Udirwc83qiaBZuj9wMsjh2i2nAtcW3LElKOrfd5mhnliIKtR2KnDPl9cz47+qetD6eowe60HbTwU+t+UlO3xXvqUI0kUq8EandL+seM/knyQV+M1vQEasL0AS6IFSgcdHJEiPiJ2fSjJUBLlXqNVU4BerRIZADPerehV3eOBU4OqsPDRGzjytrdegHoUKtZcKfPXWiOxuWNs9bdrx1VSyq8lQEeRbadQas7Wrucw6CIesrVTg+tFpFEGyZknck8qvxzCpwG8bo+wqGcSwmKHMpft7RtZOKvDpu89RalmyYFjiL67ZCqJMBGkpFfj07DfM7lJcngvhZo0SZjdPBR785fXsc1+vbEQWGJZ7fs25qudU4COq3S4uf37WlCz4YbmXW9pzUBFE50g2op8F/dRbb5y6rUzyZMHHtDdrtaYeWYVKoUQyFTgd/Xy9TGoXxhuRBQabvHxdKRX6rDJIyqUC95bvfiu5YMVk4U/L/7uMT+OARRCBZNf3s+vJFD2maQMobzCbna5QMl0g2XULl+ruzUleOem2NWYGM5y/O29cTqlQFUEoNhV48H+mHxPbFD6dadtnydjSnnxcS2SV/QyXClzX7k+dWnMVEjHoddudSmEJRjGpwKn6erLrnxV2RxaNwBz79JrlKq6MIDnJru9nQQ9zq0NiI0RMswwCpnOZq3yy4guGoFTg++PGNjH16IwsMExHOe7vpxwIySCpwL8vLiwk9kIWfJgRjMFogayMKE4FHrZExReHxN7JIjpXCUOK6MhOYSpwna4OlsOwX989WWgwxzqs0hdLRJJdJtO16cmGbzHuNjbyDGbYH9OKfiZKBU7Hr7Nou9Jz+uxuEMs+T7lkglTg9HoRjH8bkTUGejAs/zLlvKJcnVd0eva7CvatI5r+jN8seUnKvJOLe+d6SDISLjacPE6zLCcp09ZWsvL2zP3swTCsT710JkApFfjr1n46GQNES3v7TQvNspAKfPTlYzc6DtwaE4P5H6MHskJe0VfTwF76ScgCwzBfeZIdkY0PPnroIYPYVbNk/mGkFyU7IlNnjvyln4As+Nh/kr1dD6nAvU2DN9KegyzQgftz1UfJ3tcul/4DZOFsbl+U7BV8K6oMUF9k97c4HiTb2+KPantKsmDgtV09SPbsF/Sz5Mus+IDk+8FuywZv6z4bmaK4y0yyvZffRBa+UppK9vEfHoPwvsw4JpLtockQiJ0CVdXD8uKddUv7N7XG8BMdCxHq2l/ka7vP3RpDg72PI7Sr+9vIFBJu0SbZUe+/h0yJThYjVPYU42cmI2yrB2iShw89NVn4PkSAdn9V5JeRhel6SJxU55eREfMPJZrMoapPTxbESI1MJV78f34yRfGn5IY/fOhfICPOjay7HBoPR0aMNfkCnoSIAHoGMmJ9kbfuBpBDkhF2IVvyK8lIAPYrW2P4SdKW/zqy0Ni0fsXnIAvAFvAzGv4lsmA2SmZRfleSlOvB6OfLzDNZp093f9fH+Pwf0ll35MAaQEMAAAAASUVORK5CYII='
+
+# keep the admin's avatar in the blob store rather than in the users table
+with app.app_context():
+    admin_image_url = store_data_uri(ADMIN_IMAGE_DATA_URI)
+
+curr_user = User.signup(username='christen', email='christen@mail.com', password='password', image_url=admin_image_url)
 db.session.commit()
 
 curr_user.bio = 'I like to smile.'
@@ -0,0 +1,274 @@
+"""Slow-query log with automatic EXPLAIN capture.
+
+Every SQL statement is timed (two cursor events per statement). One that
+takes SLOW_QUERY_MS or longer (200 by default; 0 turns the log off) is
+recorded in a ring buffer of the last SLOW_QUERY_KEEP entries: the
+normalized statement, its duration, the endpoint and path of the request
+that ran it, and its plan.
+
+Plans are captured by a background thread, so the request that ran the
+slow statement doesn't wait for them, using a pooled connection:
+
+    PostgreSQL   EXPLAIN (ANALYZE, BUFFERS) for SELECTs, which runs the
+                 statement again; plain EXPLAIN for anything else, which
+                 must not run twice
+    SQLite       EXPLAIN QUERY PLAN (in-memory databases are skipped:
+                 another connection is another database)
+
+A statement is explained at most once per EXPLAIN_INTERVAL seconds;
+entries in between show the last plan. Parameters are only used for the
+EXPLAIN and never stored, so the log holds no user data beyond the
+statements' literals, which normalizing replaces with '?'.
+
+The buffer is per process; /admin/slow-queries shows (or downloads, as
+JSON) that of the worker serving the request.
+"""
+
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque, OrderedDict
+from datetime import datetime
+from itertools import count
+from queue import Queue, Full
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_THRESHOLD_MS = 200
+
+# entries kept
+DEFAULT_KEEP = 200
+
+# seconds before the same normalized statement is explained again
+EXPLAIN_INTERVAL = 60
+
+# statements waiting for EXPLAIN; more are not explained
+EXPLAIN_BACKLOG = 100
+
+# statements that have a plan (not DDL, SET, ...)
+EXPLAINED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|(?<!:):\w+\b|\$\d+|%s|\?")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(statement):
+    """`statement` with literals and bind parameters as '?', IN lists of
+    any length as '(...)', and whitespace collapsed."""
+
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def explain_sql(dialect_name, statement):
+    """The EXPLAIN statement of `statement` for the dialect, or None."""
+
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    if keyword not in EXPLAINED:
+        return None
+
+    is_select = keyword == 'SELECT'
+
+    if dialect_name == 'postgresql':
+        if is_select:
+            return f"EXPLAIN (ANALYZE, BUFFERS) {statement}"
+        return f"EXPLAIN {statement}"
+
+    if dialect_name == 'sqlite':
+        return f"EXPLAIN QUERY PLAN {statement}"
+
+    return None
+
+
+def explain(dbapi_connection, dialect_name, statement, parameters):
+    """Plan of `statement`, as text, from `dbapi_connection`."""
+
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(explain_sql(dialect_name, statement), parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    # PostgreSQL: one line per row; SQLite: (id, parent, notused, detail)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _in_memory(engine):
+    return engine.url.drivername.startswith('sqlite') and engine.url.database in (None, '', ':memory:')
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements and the thread explaining them.
+
+    The thread is started lazily on the first slow statement, so it is
+    never created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, threshold_ms=DEFAULT_THRESHOLD_MS, keep=DEFAULT_KEEP):
+        self.app = app
+        self.threshold_ms = threshold_ms
+        self.keep = keep
+        self._reset()
+
+        if app is not None:
+            self.init_app(app)
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold_ms = app.config.setdefault('SLOW_QUERY_MS', self.threshold_ms)
+        self.keep = app.config.setdefault('SLOW_QUERY_KEEP', self.keep)
+        self._entries = deque(self._entries, maxlen=self.keep)
+        app.extensions['slow_query_log'] = self
+
+        if self.threshold_ms > 0:
+            self.listen(Engine)
+
+    def listen(self, target):
+        """Time the statements of `target`: an engine, or Engine for all."""
+
+        if not event.contains(target, 'before_cursor_execute', self._before):
+            event.listen(target, 'before_cursor_execute', self._before)
+            event.listen(target, 'after_cursor_execute', self._after)
+
+    def _reset(self):
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._entries = deque(maxlen=self.keep)
+        self._ids = count(1)
+        # normalized statement: (monotonic time, plan) of its last EXPLAIN
+        self._plans = OrderedDict()
+        self._queue = Queue(maxsize=EXPLAIN_BACKLOG)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        # listening started between the two events of this statement
+        starts = conn.info.get('slow_query_start')
+        if not starts:
+            return
+
+        started = starts.pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if 0 < self.threshold_ms <= duration_ms and not statement.lstrip().upper().startswith("EXPLAIN"):
+            self.record(conn.engine, statement, parameters, executemany, duration_ms)
+
+    def record(self, engine, statement, parameters, executemany, duration_ms):
+        """Add a slow statement to the log and queue its EXPLAIN."""
+
+        normalized = normalize(statement)
+        entry = {
+            'statement': normalized,
+            'duration_ms': round(duration_ms, 2),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'path': request.path if has_request_context() else None,
+            'at': datetime.utcnow().isoformat(),
+            'plan': None,
+            'explain': "pending",
+        }
+
+        with self._lock:
+            entry['id'] = next(self._ids)
+            self._entries.append(entry)
+            last = self._plans.get(normalized)
+
+        if executemany:
+            entry['explain'] = "skipped: executemany"
+        elif explain_sql(engine.dialect.name, statement) is None:
+            entry['explain'] = f"skipped: no plan on {engine.dialect.name}"
+        elif _in_memory(engine):
+            entry['explain'] = "skipped: in-memory database"
+        elif last is not None and time.monotonic() - last[0] < EXPLAIN_INTERVAL:
+            entry['plan'], entry['explain'] = last[1], "cached"
+        else:
+            try:
+                self._queue.put_nowait((entry, engine, statement, parameters))
+                self._start()
+            except Full:
+                entry['explain'] = "skipped: backlog full"
+
+        return entry
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-slow-queries", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._explain(*self._queue.get())
+            self._queue.task_done()
+
+    def _explain(self, entry, engine, statement, parameters):
+        connection = engine.raw_connection()
+        try:
+            plan = explain(connection, engine.dialect.name, statement, parameters)
+            status = "done"
+        except Exception as exc:
+            plan, status = None, f"failed: {exc}"
+        finally:
+            if engine.dialect.name != 'sqlite':
+                connection.rollback()
+            connection.close()
+
+        with self._lock:
+            entry['plan'], entry['explain'] = plan, status
+            if plan is not None:
+                self._plans[entry['statement']] = (time.monotonic(), plan)
+                self._plans.move_to_end(entry['statement'])
+                while len(self._plans) > self.keep:
+                    self._plans.popitem(last=False)
+
+    def entries(self):
+        """Logged statements, newest first."""
+
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def report(self):
+        """The log, and its statements grouped, most total time first."""
+
+        entries = self.entries()
+
+        groups = {}
+        for entry in entries:
+            group = groups.setdefault(entry['statement'], {
+                'statement': entry['statement'], 'count': 0, 'total_ms': 0, 'max_ms': 0,
+                'endpoints': set(), 'last_at': entry['at']})
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['endpoints'].add(entry['endpoint'])
+
+        summary = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+        for group in summary:
+            group['total_ms'] = round(group['total_ms'], 2)
+            group['endpoints'] = sorted(filter(None, group['endpoints']))
+
+        return {
+            'worker': self.worker,
+            'threshold_ms': self.threshold_ms,
+            'summary': summary,
+            'queries': entries,
+        }
+
+
+slow_query_log = SlowQueryLog()
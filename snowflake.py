@@ -0,0 +1,138 @@
+"""Time-ordered 64-bit ids ("Snowflake" ids) for messages.
+
+An id is laid out as
+
+    | 41 bits: ms since EPOCH | 10 bits: worker id | 12 bits: sequence |
+
+so ids sort by creation time and feeds can order and page by primary key
+alone. Each process needs its own worker id. A single process takes it
+from SNOWFLAKE_WORKER_ID (0-1023), or derives it from the host name and
+process id, which can collide between hosts. Forked workers must each be
+given one with `set_worker_id`, as gunicorn.conf.py's post_fork hook
+does: a child forked from a process whose id came from
+SNOWFLAKE_WORKER_ID would share it, so it refuses to make ids until then.
+
+Ids exceed JavaScript's safe integer range, so send them to browsers as
+strings.
+"""
+
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+# 2010-01-01T00:00:00Z; old enough for the seed data's timestamps
+EPOCH = datetime(2010, 1, 1)
+EPOCH_MS = 1262304000000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = WORKER_BITS + SEQUENCE_BITS
+
+
+def default_worker_id():
+    """Worker id from SNOWFLAKE_WORKER_ID, else from host name and pid."""
+
+    if 'SNOWFLAKE_WORKER_ID' in os.environ:
+        worker_id = int(os.environ['SNOWFLAKE_WORKER_ID'])
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"SNOWFLAKE_WORKER_ID must be 0-{MAX_WORKER_ID}")
+        return worker_id
+
+    host = zlib.crc32(socket.gethostname().encode())
+    return (host + os.getpid()) & MAX_WORKER_ID
+
+
+class SnowflakeGenerator:
+    """Thread-safe generator of unique, increasing ids for one worker."""
+
+    def __init__(self, worker_id=None):
+        self.worker_id = default_worker_id() if worker_id is None else worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            now = int(time.time() * 1000)
+
+            # never go back in time, even if the wall clock does
+            if now <= self._last_ms:
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # sequence exhausted for this millisecond; borrow the next
+                    now += 1
+            else:
+                self._sequence = 0
+
+            self._last_ms = now
+
+            return (((now - EPOCH_MS) << TIMESTAMP_SHIFT) |
+                    (self.worker_id << SEQUENCE_BITS) |
+                    self._sequence)
+
+
+class _Unassigned:
+    """Generator of a forked child that still has its parent's worker id."""
+
+    def next_id(self):
+        raise RuntimeError("SNOWFLAKE_WORKER_ID is shared with the parent process; "
+                           "give each forked worker its own with snowflake.set_worker_id")
+
+
+_generator = SnowflakeGenerator()
+
+
+def _reset_after_fork():
+    global _generator
+    if 'SNOWFLAKE_WORKER_ID' in os.environ:
+        _generator = _Unassigned()
+    else:
+        _generator = SnowflakeGenerator()
+
+
+def set_worker_id(worker_id):
+    """Make this process's ids with `worker_id` from now on."""
+
+    global _generator
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"worker id must be 0-{MAX_WORKER_ID}")
+    _generator = SnowflakeGenerator(worker_id)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def worker_id():
+    """This process's worker id; None in a forked child not given one yet."""
+
+    return getattr(_generator, 'worker_id', None)
+
+
+def next_id():
+    """A new id; use as the column default of snowflake-keyed tables."""
+
+    return _generator.next_id()
+
+
+def from_datetime(dt, sequence=0):
+    """Id for a message created at naive UTC `dt`, e.g. when importing.
+
+    `sequence` (taken modulo 2**22) tells apart ids of the same millisecond.
+    """
+
+    ms = (dt - EPOCH) // timedelta(milliseconds=1)
+    return (ms << TIMESTAMP_SHIFT) | (sequence & ((1 << TIMESTAMP_SHIFT) - 1))
+
+
+def to_datetime(snowflake_id):
+    """Naive UTC creation time encoded in `snowflake_id`."""
+
+    return EPOCH + timedelta(milliseconds=snowflake_id >> TIMESTAMP_SHIFT)
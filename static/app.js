@@ -1,11 +1,11 @@
-$thumbsupBtn = $("#messages button")
 $newMessageText = $("#newMessageText")
 $newMessageSaveButton = $("#newMessageSaveButton")
 
 $messages = $("#messages")
 
 
-$thumbsupBtn.click(async function() {
+// delegated, so buttons of messages loaded on scroll work too
+$messages.on('click', 'button.fa-thumbs-up', async function(event) {
     let $button = $(event.target)
     let msg_id = event.target.id
     msg_id = msg_id.slice(12)
@@ -39,3 +39,29 @@ $newMessageSaveButton.click(async function() {
     }
     console.log(message.image_url)
 })
+
+
+// Infinite scroll: the "load-more" item at the end of a message list is
+// replaced by the next page's messages (and its own load-more item, if
+// there are more) when it comes near the viewport.
+const moreObserver = new IntersectionObserver(function(entries, observer) {
+    for (const entry of entries) {
+        if (entry.isIntersecting) {
+            observer.unobserve(entry.target)
+            loadMore($(entry.target))
+        }
+    }
+}, {rootMargin: "600px"})
+
+async function loadMore($item) {
+    try {
+        const response = await axios.get($item.data("url"))
+        $item.replaceWith(response.data)
+    } catch (err) {
+        $item.text("Couldn't load more messages.")
+        return
+    }
+    $messages.find(".load-more").each(function() { moreObserver.observe(this) })
+}
+
+$messages.find(".load-more").each(function() { moreObserver.observe(this) })
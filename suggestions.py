@@ -0,0 +1,198 @@
+"""Friends-of-friends "who to follow" suggestions.
+
+The follow graph is loaded into a SciPy CSR adjacency matrix A, where
+A[u, v] = 1 when u follows v. Row u of A @ A counts, for every user, how
+many of the people u follows follow them. The top scorers that u doesn't
+already follow become u's rows in `follow_suggestions`, which the homepage
+reads with one indexed query.
+
+Memory is bounded by the edge arrays plus one block of rows of A @ A,
+which is computed BLOCK_SIZE users at a time and stored before the next.
+Only follows that show up in feeds count as edges: confirmed ones, and
+any follow of a public account.
+
+A full run recomputes everyone. An incremental run only recomputes users
+whose suggestions new follows may change: the new followers, and everyone
+following them. Unfollows and confirmed requests leave no such trace, so
+schedule a full run too, e.g.:
+
+    python suggestions.py full        (nightly)
+    python suggestions.py changed     (every few minutes)
+"""
+
+from array import array
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+
+from models import db, User, Follows, FollowSuggestion
+
+# suggestions stored per user
+TOP_K = 10
+
+# users whose suggestions are computed and stored together
+BLOCK_SIZE = 500
+
+# follows fetched per database round trip while loading the graph
+EDGE_CHUNK = 50000
+
+# `ids` maps matrix rows to user ids; `feed` has the edges that count for
+# scoring, `follows` all follows, pending ones included
+FollowGraph = namedtuple('FollowGraph', 'ids feed follows')
+
+
+def load_graph():
+    """FollowGraph of the `follows` table, streamed in chunks."""
+
+    counts = db.or_(Follows.following_confirmed_status == True, User.private == False)
+    query = (db.session
+             .query(Follows.user_following_id, Follows.user_being_followed_id, counts)
+             .join(User, User.id == Follows.user_being_followed_id)
+             .filter(User.deleted_at == None)
+             .yield_per(EDGE_CHUNK))
+
+    followers, followed, in_feed = array('q'), array('q'), array('b')
+    for follower_id, followed_id, edge_counts in query:
+        followers.append(follower_id)
+        followed.append(followed_id)
+        in_feed.append(bool(edge_counts))
+
+    followers = np.asarray(followers, dtype=np.int64)
+    followed = np.asarray(followed, dtype=np.int64)
+    in_feed = np.asarray(in_feed, dtype=bool)
+
+    ids = np.unique(np.concatenate([followers, followed]))
+    rows = np.searchsorted(ids, followers)
+    cols = np.searchsorted(ids, followed)
+
+    def adjacency(mask):
+        ones = np.ones(np.count_nonzero(mask), dtype=np.int32)
+        return sparse.csr_matrix((ones, (rows[mask], cols[mask])), shape=(len(ids), len(ids)))
+
+    return FollowGraph(ids, adjacency(in_feed), adjacency(np.ones(len(rows), dtype=bool)))
+
+
+def top_suggestions(graph, rows, k=TOP_K):
+    """Yield (row, suggested rows, scores), best first, for each of `rows`.
+
+    Users already followed (or requested) and the user themselves are
+    skipped; ties go to the lower user id.
+    """
+
+    scores = (graph.feed[rows] @ graph.feed).tocsr()
+
+    own = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (np.arange(len(rows)), rows)),
+                            shape=scores.shape)
+    skipped = (graph.follows[rows] + own) > 0
+    scores = scores - scores.multiply(skipped)
+    scores.eliminate_zeros()
+
+    for i, row in enumerate(rows):
+        cols = scores.indices[scores.indptr[i]:scores.indptr[i + 1]]
+        counts = scores.data[scores.indptr[i]:scores.indptr[i + 1]]
+
+        if len(cols) > k:
+            best = np.argpartition(-counts, k - 1)[:k]
+            cols, counts = cols[best], counts[best]
+
+        order = np.lexsort((cols, -counts))
+        yield row, cols[order], counts[order]
+
+
+def store(graph, rows, results, computed_at):
+    """Replace the stored suggestions of `rows`' users with `results`."""
+
+    user_ids = graph.ids[rows].tolist()
+
+    (FollowSuggestion
+     .query
+     .filter(FollowSuggestion.user_id.in_(user_ids))
+     .delete(synchronize_session=False))
+
+    db.session.bulk_insert_mappings(FollowSuggestion, [
+        {'user_id': int(graph.ids[row]), 'suggested_user_id': int(graph.ids[col]),
+         'score': int(score), 'computed_at': computed_at}
+        for row, cols, scores in results
+        for col, score in zip(cols, scores)])
+
+    db.session.commit()
+
+
+def compute(user_ids=None, k=TOP_K, block_size=BLOCK_SIZE):
+    """Recompute the suggestions of `user_ids`, or of everyone.
+
+    Returns the number of users recomputed.
+    """
+
+    computed_at = datetime.utcnow()
+    graph = load_graph()
+
+    if user_ids is None:
+        rows = np.arange(len(graph.ids))
+    else:
+        rows = np.flatnonzero(np.isin(graph.ids, list(user_ids)))
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        store(graph, block, top_suggestions(graph, block, k), computed_at)
+
+    # users who follow nobody any more have no suggestions left
+    if user_ids is None:
+        stale = FollowSuggestion.computed_at < computed_at
+    else:
+        stale = FollowSuggestion.user_id.in_(set(user_ids) - set(graph.ids[rows].tolist()))
+
+    FollowSuggestion.query.filter(stale).delete(synchronize_session=False)
+    db.session.commit()
+
+    return len(rows)
+
+
+def last_computed():
+    return db.session.query(db.func.max(FollowSuggestion.computed_at)).scalar()
+
+
+def changed_user_ids(since):
+    """Users whose suggestions follows created after `since` may change.
+
+    A new follow a -> b adds b's followed users to a's friends of friends,
+    and b to the friends of friends of everyone following a.
+    """
+
+    new_followers = (db.session
+                     .query(Follows.user_following_id)
+                     .filter(Follows.created_at > since))
+    their_followers = (db.session
+                       .query(Follows.user_following_id)
+                       .filter(Follows.user_being_followed_id.in_(new_followers)))
+
+    return {user_id for (user_id,) in new_followers.union(their_followers)}
+
+
+def compute_changed():
+    """Recompute users affected by follows since the last run (everyone
+    on the first run). Returns the number of users recomputed."""
+
+    since = last_computed()
+    if since is None:
+        return compute()
+
+    return compute(changed_user_ids(since))
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app import app
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else 'changed'
+
+        if command == 'full':
+            print(f"Recomputed suggestions of {compute()} users.")
+        elif command == 'changed':
+            print(f"Recomputed suggestions of {compute_changed()} users.")
+        else:
+            sys.exit(f"Unknown command: {command}")
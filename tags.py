@@ -0,0 +1,175 @@
+"""#tags and @mentions of messages, indexed when the message is written.
+
+Each #tag of a message is a row of `message_tags`, keyed by (tag,
+message id), and each @mention of an existing user a row of
+`message_mentions`, keyed by (user id, message id). Message ids are
+time-ordered (see snowflake.py), so a tag page or a user's mentions,
+newest first, is a backwards range scan of one primary key; see
+`tag_page` and `mentions_page`.
+
+Tags are matched case-insensitively and stored lowercased. Mentions are
+resolved to user ids when the message is written: a mention of an
+unknown username is not stored, and renaming a user keeps their
+mentions. Usernames that aren't made of word characters can't be
+mentioned.
+
+Messages posted before this index existed are added by the backfill:
+
+    python tags.py backfill [after message id]
+
+It works through messages in id order, BACKFILL_BATCH at a time, one
+transaction per batch, and can be stopped and resumed from the last id
+it printed. Re-indexing a message replaces its rows, so running it
+again is harmless.
+"""
+
+import re
+
+from markupsafe import Markup, escape
+
+from models import db, User, Message, MessageTag, MessageMention, message_visible_to
+from pagination import id_page
+
+# a '#' or '@' in the middle of a word (e.g. an email address) starts no tag
+TAG_RE = re.compile(r"(?<![\w#@&])#(\w+)")
+MENTION_RE = re.compile(r"(?<![\w#@])@(\w+)")
+
+BACKFILL_BATCH = 1000
+
+
+def extract_tags(text):
+    """Lowercased #tags of `text`, without duplicates."""
+
+    return {tag.lower() for tag in TAG_RE.findall(text)}
+
+
+def extract_mentions(text):
+    """Usernames @mentioned in `text`, without duplicates."""
+
+    return set(MENTION_RE.findall(text))
+
+
+def index_messages(messages):
+    """Add the tags and mentions of `messages`, (id, text) pairs, to the
+    index in the current transaction.
+
+    Returns the number of (tag rows, mention rows) added.
+    """
+
+    tag_rows = []
+    mentioned = {}
+    for message_id, text in messages:
+        tag_rows.extend({'tag': tag, 'message_id': message_id} for tag in extract_tags(text))
+        for username in extract_mentions(text):
+            mentioned.setdefault(username, []).append(message_id)
+
+    mention_rows = []
+    if mentioned:
+        users = (db.session
+                 .query(User.username, User.id)
+                 .filter(User.username.in_(mentioned), User.deleted_at.is_(None)))
+        mention_rows = [{'user_id': user_id, 'message_id': message_id}
+                        for username, user_id in users
+                        for message_id in mentioned[username]]
+
+    if tag_rows:
+        db.session.execute(MessageTag.__table__.insert(), tag_rows)
+    if mention_rows:
+        db.session.execute(MessageMention.__table__.insert(), mention_rows)
+
+    return len(tag_rows), len(mention_rows)
+
+
+def index_message(msg):
+    """Add the tags and mentions of a new (flushed) message to the index."""
+
+    return index_messages([(msg.id, msg.text)])
+
+
+def backfill(after=0, batch_size=BACKFILL_BATCH, progress=None):
+    """(Re-)index every message with an id above `after`, batch by batch.
+
+    `progress(last id, messages done)` is called after every batch.
+    Returns the number of messages indexed.
+    """
+
+    done = 0
+
+    while True:
+        batch = (db.session
+                 .query(Message.id, Message.text)
+                 .filter(Message.id > after)
+                 .order_by(Message.id)
+                 .limit(batch_size)
+                 .all())
+
+        if not batch:
+            return done
+
+        ids = [message_id for message_id, text in batch]
+        MessageTag.query.filter(MessageTag.message_id.in_(ids)).delete(synchronize_session=False)
+        MessageMention.query.filter(MessageMention.message_id.in_(ids)).delete(synchronize_session=False)
+        index_messages(batch)
+        db.session.commit()
+
+        after = ids[-1]
+        done += len(batch)
+        if progress:
+            progress(after, done)
+
+
+def normalize_tag(tag):
+    """`tag` as stored: lowercased, without a leading '#'."""
+
+    return tag.lstrip('#').lower()
+
+
+def tag_page(tag, viewer_id, cursor=None):
+    """Page of visible messages tagged `tag`, newest first."""
+
+    query = (db.session
+             .query(Message, MessageTag.message_id)
+             .join(MessageTag, MessageTag.message_id == Message.id)
+             .options(db.joinedload(Message.user))
+             .filter(MessageTag.tag == normalize_tag(tag), message_visible_to(viewer_id)))
+
+    return id_page(query, MessageTag.message_id, cursor)
+
+
+def mentions_page(user_id, viewer_id, cursor=None):
+    """Page of visible messages mentioning `user_id`, newest first."""
+
+    query = (db.session
+             .query(Message, MessageMention.message_id)
+             .join(MessageMention, MessageMention.message_id == Message.id)
+             .options(db.joinedload(Message.user))
+             .filter(MessageMention.user_id == user_id, message_visible_to(viewer_id)))
+
+    return id_page(query, MessageMention.message_id, cursor)
+
+
+def link_tags(text):
+    """Jinja filter: `text`, escaped, with its #tags linked to their pages."""
+
+    def link(match):
+        return Markup('<a href="/tags/{}">#{}</a>').format(match.group(1).lower(), match.group(1))
+
+    # TAG_RE skips the '#' of entities such as '&#39;' that escaping adds
+    return Markup(TAG_RE.sub(link, str(escape(text))))
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app import app
+
+    with app.app_context():
+        command = sys.argv[1] if len(sys.argv) > 1 else 'backfill'
+
+        if command == 'backfill':
+            after = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+            total = backfill(after, progress=lambda last_id, done: print(
+                f"Indexed {done} messages, up to id {last_id}", flush=True))
+            print(f"Indexed {total} messages.")
+        else:
+            sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,50 @@
+"""App factory and profile tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_app_factory.py
+
+
+import os
+from unittest import TestCase, mock
+
+from flask import url_for
+
+from db_harness import DatabaseTestCase
+
+from app import app, create_app
+import config
+
+
+class ProfileTestCase(TestCase):
+    """Test picking the configuration profile."""
+
+    def test_profile_name(self):
+        """Does WARBLER_ENV win over FLASK_ENV, with production as default?"""
+
+        with mock.patch.dict(os.environ, {'WARBLER_ENV': '', 'FLASK_ENV': ''}):
+            self.assertEqual(config.profile_name(), 'production')
+
+        with mock.patch.dict(os.environ, {'WARBLER_ENV': '', 'FLASK_ENV': 'development'}):
+            self.assertEqual(config.profile_name(), 'development')
+
+        with mock.patch.dict(os.environ, {'WARBLER_ENV': 'production', 'FLASK_ENV': 'development'}):
+            self.assertEqual(config.profile_name(), 'production')
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            create_app('staging')
+
+
+class AppTestCase(DatabaseTestCase):
+    """Test the app built by the factory."""
+
+    def test_production_app(self):
+        """Is the test app free of the debug toolbar, with blueprint endpoints?"""
+
+        self.assertFalse(app.debug)
+        self.assertNotIn('debugtoolbar', app.extensions)
+
+        with app.test_request_context():
+            self.assertEqual(url_for('users.users_show', user_id=1), "/users/1")
+            self.assertEqual(url_for('home.homepage'), "/")
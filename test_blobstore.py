@@ -0,0 +1,122 @@
+"""Blob store tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_blobstore.py
+
+
+import base64
+import tempfile
+
+from db_harness import DatabaseTestCase
+
+from app import app
+from models import User
+import blobstore
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+# 1x1 transparent PNG
+PIXEL = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==")
+PIXEL_URI = "data:image/png;base64," + base64.b64encode(PIXEL).decode()
+
+
+class BlobStoreTestCase(DatabaseTestCase):
+    """Test storing and serving images."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_path = app.config['BLOB_STORE_PATH']
+        app.config['BLOB_STORE_PATH'] = self.tmp.name
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config['BLOB_STORE_PATH'] = self.old_path
+        self.tmp.cleanup()
+
+    def test_store_data_uri(self):
+        """Is a data URI replaced by a short, stable blob URL?"""
+
+        with app.app_context():
+            url = blobstore.store_data_uri(PIXEL_URI)
+            self.assertEqual(url, blobstore.store_data_uri(PIXEL_URI))
+
+        self.assertTrue(url.startswith("/blobs/"))
+        self.assertTrue(url.endswith(".png"))
+        self.assertLess(len(url), 80)
+
+    def test_other_urls_unchanged(self):
+        """Are regular image URLs left alone?"""
+
+        with app.app_context():
+            url = blobstore.store_data_uri("/static/images/default-pic.png")
+
+        self.assertEqual(url, "/static/images/default-pic.png")
+
+    def test_serve_blob(self):
+        """Is a blob served with its digest as ETag and cached?"""
+
+        with app.app_context():
+            url = blobstore.store_data_uri(PIXEL_URI)
+
+        resp = self.client.get(url)
+        name = url.rsplit("/", 1)[1]
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, PIXEL)
+        self.assertEqual(resp.headers['ETag'], f'"{name}"')
+        self.assertIn("immutable", resp.headers['Cache-Control'])
+
+        resp = self.client.get(url, headers={'If-None-Match': f'"{name}"'})
+        self.assertEqual(resp.status_code, 304)
+
+    def test_serve_thumbnail(self):
+        """Is a thumbnail served for a stored blob?"""
+
+        with app.app_context():
+            url = blobstore.store_data_uri(PIXEL_URI)
+
+        resp = self.client.get(blobstore.thumbnail_url(url))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_missing_blob(self):
+        """Do unknown or malformed blob names 404?"""
+
+        self.assertEqual(self.client.get("/blobs/" + "0" * 64 + ".png").status_code, 404)
+        self.assertEqual(self.client.get("/blobs/../app.py").status_code, 404)
+
+    def test_not_an_image(self):
+        """Are bytes that aren't an image of the declared type refused?"""
+
+        with app.app_context():
+            store = blobstore.get_store()
+            for data, content_type in ((b"<svg/>", 'image/svg+xml'), (b"not a png", 'image/png'),
+                                       (PIXEL[:20], 'image/png'), (PIXEL, 'image/gif')):
+                with self.subTest(content_type=content_type, data=data[:10]):
+                    with self.assertRaises(ValueError):
+                        store.put(data, content_type)
+
+    def test_thumbnail_of_broken_blob(self):
+        """Does the thumbnail of a blob Pillow can't read 404?"""
+
+        with app.app_context():
+            store = blobstore.get_store()
+            name = "f" * 64 + ".png"
+            store._write(store.path(name), b"not a png")
+
+        self.assertEqual(self.client.get(f"/blobs/thumb/{name}").status_code, 404)
+
+    def test_signup_with_unsupported_image(self):
+        """Does signup with an SVG data URI show a form error?"""
+
+        svg = "data:image/svg+xml;base64," + base64.b64encode(b"<svg/>").decode()
+
+        resp = self.client.post("/signup", data={"username": "svguser", "email": "svg@test.com",
+                                                 "password": "password", "image_url": svg})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"Unsupported image type", resp.data)
+        self.assertIsNone(User.query.filter_by(username="svguser").first())
@@ -0,0 +1,70 @@
+"""Data-access layer tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_dal.py
+
+
+from models import db, User, Message, Follows, Likes
+
+from db_harness import DatabaseTestCase
+
+from app import app
+import dal
+
+
+class DataAccessTestCase(DatabaseTestCase):
+    """Test the baked hot-path queries."""
+
+    def setUp(self):
+        """Create a private author followed (confirmed) by u2, pending by u3."""
+
+        super().setUp()
+
+        self.u1 = User(email="test1@test.com", username="testuser1", password="HASHED_PASSWORD", private=True)
+        self.u2 = User(email="test2@test.com", username="testuser2", password="HASHED_PASSWORD")
+        self.u3 = User(email="test3@test.com", username="testuser3", password="HASHED_PASSWORD")
+        db.session.add_all([self.u1, self.u2, self.u3])
+        db.session.commit()
+
+        self.messages = [Message(text=f"message {i}", user_id=self.u1.id) for i in range(3)]
+        db.session.add_all(self.messages)
+        db.session.add(Follows(user_being_followed_id=self.u1.id, user_following_id=self.u2.id,
+                               following_confirmed_status=True))
+        db.session.add(Follows(user_being_followed_id=self.u1.id, user_following_id=self.u3.id))
+        db.session.commit()
+
+    def test_profile_feed(self):
+        """Are profile feed rows newest first and visibility-filtered?"""
+
+        rows = dal.profile_feed(self.u1.id, self.u2.id, 2)
+
+        self.assertEqual([row.id for row in rows], [self.messages[2].id, self.messages[1].id])
+        self.assertEqual(rows[0].user.username, "testuser1")
+        self.assertEqual(dal.profile_feed(self.u1.id, self.u3.id, 2), [])
+        self.assertEqual(dal.profile_feed(self.u1.id, None, 2), [])
+
+    def test_home_feed(self):
+        """Do feed author ids skip unconfirmed private follows?"""
+
+        self.assertEqual(dal.feed_author_ids(self.u2.id), [self.u2.id, self.u1.id])
+        self.assertEqual(dal.feed_author_ids(self.u3.id), [self.u3.id])
+
+        rows = dal.home_feed([self.u2.id, self.u1.id], self.u2.id, 10)
+        self.assertEqual(len(rows), 3)
+
+    def test_follow_status(self):
+        """Does follow_status tell none, pending and confirmed apart?"""
+
+        self.assertTrue(dal.follow_status(self.u2.id, self.u1.id))
+        self.assertFalse(dal.follow_status(self.u3.id, self.u1.id))
+        self.assertIsNone(dal.follow_status(self.u1.id, self.u2.id))
+
+    def test_liked_ids(self):
+        """Are only the liked message ids returned?"""
+
+        db.session.add(Likes(user_id=self.u2.id, message_id=self.messages[0].id))
+        db.session.commit()
+
+        ids = [msg.id for msg in self.messages]
+        self.assertEqual(dal.liked_ids(self.u2.id, ids), {self.messages[0].id})
@@ -0,0 +1,114 @@
+"""Account export tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_export.py
+
+
+import csv
+import io
+import json
+from unittest import mock
+
+from models import db, User, Message, Likes, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import export
+
+
+class ExportViewsTestCase(DatabaseTestCase):
+    """Test streaming exports of a user's data."""
+
+    def setUp(self):
+        """u1 has 5 messages, likes one of u2's, follows u2 and is
+        followed by u3."""
+
+        super().setUp()
+
+        self.u1, self.u2, self.u3 = [
+            User.signup(username=f"testuser{i}", email=f"test{i}@test.com",
+                        password="password", image_url=None) for i in (1, 2, 3)]
+        db.session.commit()
+
+        messages = [Message(text=f"message {i}", user_id=self.u1.id) for i in range(5)]
+        liked = Message(text="liked", user_id=self.u2.id)
+        db.session.add_all(messages + [liked])
+        db.session.commit()
+
+        db.session.add_all([
+            Likes(user_id=self.u1.id, message_id=liked.id),
+            Follows(user_following_id=self.u1.id, user_being_followed_id=self.u2.id,
+                    following_confirmed_status=True),
+            Follows(user_following_id=self.u3.id, user_being_followed_id=self.u1.id),
+        ])
+        db.session.commit()
+
+        self.ids = [user.id for user in (self.u1, self.u2, self.u3)]
+        self.client = app.test_client()
+
+    def get_as(self, user_id, url):
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+            return c.get(url)
+
+    def export_ndjson(self, query=""):
+        resp = self.get_as(self.ids[0], f"/users/{self.ids[0]}/export{query}")
+        self.assertEqual(resp.status_code, 200)
+        return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+    def test_ndjson(self):
+        """Are all sections exported, in order, in small chunks?"""
+
+        with mock.patch.object(export, 'EXPORT_CHUNK', 2):
+            records = self.export_ndjson()
+
+        self.assertEqual([record['section'] for record in records],
+                         ['messages'] * 5 + ['likes', 'following', 'followers'])
+        self.assertEqual([record['text'] for record in records[:5]],
+                         [f"message {i}" for i in range(5)])
+        self.assertEqual(records[5]['text'], "liked")
+        self.assertEqual(records[6], dict(records[6], user_id=self.ids[1], confirmed=True))
+        self.assertEqual(records[7], dict(records[7], user_id=self.ids[2], confirmed=False))
+
+    def test_resume(self):
+        """Does a download resumed after any record return exactly the rest?"""
+
+        records = self.export_ndjson()
+
+        for i, record in enumerate(records):
+            rest = self.export_ndjson(f"?after={record['cursor']}")
+            self.assertEqual(rest, records[i + 1:])
+
+        first = self.export_ndjson("?limit=3")
+        self.assertEqual(first, records[:3])
+
+    def test_csv(self):
+        """Is the CSV export a header plus one row per record?"""
+
+        resp = self.get_as(self.ids[0], f"/users/{self.ids[0]}/export?format=csv")
+        rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+
+        self.assertEqual(resp.mimetype, 'text/csv')
+        self.assertIn('attachment', resp.headers['Content-Disposition'])
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[5]['username'], "testuser2")
+
+    def test_access(self):
+        """Can only the user themselves and admins export, with valid params?"""
+
+        resp = self.get_as(self.ids[1], f"/users/{self.ids[0]}/export")
+        self.assertEqual(resp.status_code, 302)
+
+        User.query.get(self.ids[1]).admin = True
+        db.session.commit()
+        resp = self.get_as(self.ids[1], f"/users/{self.ids[0]}/export")
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.get_as(self.ids[0], f"/users/{self.ids[0]}/export?after=nonsense")
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.get_as(self.ids[0], f"/users/{self.ids[0]}/export?format=xml")
+        self.assertEqual(resp.status_code, 400)
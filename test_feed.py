@@ -0,0 +1,81 @@
+"""Feed engine tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_feed.py
+
+
+from datetime import datetime, timedelta
+
+from models import db, User, Message, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app
+from feed import FeedEngine
+
+
+class FeedEngineTestCase(DatabaseTestCase):
+    """Test merging per-author buffers into feeds."""
+
+    def setUp(self):
+        """Create two users with interleaved messages."""
+
+        super().setUp()
+
+        self.u1 = User.signup(username="testuser1", email="test1@test.com",
+                              password="password", image_url=None)
+        self.u2 = User.signup(username="testuser2", email="test2@test.com",
+                              password="password", image_url=None)
+        db.session.commit()
+
+        start = datetime(2021, 1, 1)
+        self.messages = []
+        for i in range(6):
+            user = self.u1 if i % 2 else self.u2
+            msg = Message(text=f"message {i}", user_id=user.id,
+                          timestamp=start + timedelta(minutes=i))
+            db.session.add(msg)
+            self.messages.append(msg)
+        db.session.commit()
+
+        self.engine = FeedEngine(buffer_size=3)
+
+    def test_feed_ids_merged_newest_first(self):
+        """Are both authors' messages merged newest first?"""
+
+        ids = self.engine.feed_ids([self.u1.id, self.u2.id], 4)
+
+        self.assertEqual(ids, [msg.id for msg in reversed(self.messages)][:4])
+
+    def test_add_message(self):
+        """Does a new message show up at the top without a reload?"""
+
+        self.engine.feed_ids([self.u1.id], 3)
+
+        msg = Message(text="new", user_id=self.u1.id, timestamp=datetime(2022, 1, 1))
+        db.session.add(msg)
+        db.session.commit()
+        self.engine.add(msg)
+
+        self.assertEqual(self.engine.feed_ids([self.u1.id], 1), [msg.id])
+
+    def test_remove_message(self):
+        """Is a deleted message dropped from the feed?"""
+
+        newest = self.messages[-1]
+        self.engine.feed_ids([self.u1.id], 3)
+        self.engine.remove(newest)
+        db.session.delete(newest)
+        db.session.commit()
+
+        self.assertNotIn(newest.id, self.engine.feed_ids([self.u1.id], 3))
+
+    def test_memory_budget(self):
+        """Are least recently used author buffers evicted?"""
+
+        engine = FeedEngine(buffer_size=3, max_authors=1)
+        engine.feed_ids([self.u1.id], 3)
+        engine.feed_ids([self.u2.id], 3)
+
+        self.assertEqual(engine.stats()['authors'], 1)
@@ -0,0 +1,128 @@
+"""Follow graph snapshot tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_followgraph.py
+
+
+import os
+import tempfile
+from unittest import mock
+
+from models import db, User, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import dal
+import views.users
+from followgraph import FollowGraph, Snapshot, build_snapshot
+
+
+class FollowGraphTestCase(DatabaseTestCase):
+    """Test building, reading and patching the follow graph snapshot."""
+
+    def setUp(self):
+        """u1 follows u2 (confirmed) and u3 (pending)."""
+
+        super().setUp()
+
+        self.users = [User(email=f"test{i}@test.com", username=f"testuser{i}",
+                           password="HASHED_PASSWORD") for i in range(4)]
+        db.session.add_all(self.users)
+        db.session.commit()
+        self.u0, self.u1, self.u2, self.u3 = [user.id for user in self.users]
+
+        db.session.add(Follows(user_following_id=self.u1, user_being_followed_id=self.u2,
+                               following_confirmed_status=True))
+        db.session.add(Follows(user_following_id=self.u1, user_being_followed_id=self.u3))
+        db.session.commit()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "follow_graph.bin")
+
+    def make_graph(self):
+        build_snapshot(self.path)
+
+        graph = FollowGraph(rebuild_interval=3600, poll_interval=0)
+        graph.enabled = True
+        graph.path = self.path
+        return graph
+
+    def test_snapshot_lookups(self):
+        """Does the snapshot tell none, pending and confirmed apart?"""
+
+        build_snapshot(self.path)
+        snapshot = Snapshot(self.path)
+
+        self.assertTrue(snapshot.status(self.u1, self.u2))
+        self.assertFalse(snapshot.status(self.u1, self.u3))
+        self.assertIsNone(snapshot.status(self.u1, self.u0))
+        self.assertIsNone(snapshot.status(self.u2, self.u1))
+        self.assertIsNone(snapshot.status(self.u3 + 100, self.u1))
+
+    def test_delta_log(self):
+        """Do recorded changes override the snapshot?"""
+
+        graph = self.make_graph()
+        self.assertTrue(graph.available())
+
+        graph.record(self.u1, self.u2, None)
+        graph.record(self.u1, self.u3, True)
+
+        self.assertIsNone(graph.status(self.u1, self.u2))
+        self.assertTrue(graph.status(self.u1, self.u3))
+
+    def test_polls_new_follows(self):
+        """Are follows created after the build picked up from the database?"""
+
+        graph = self.make_graph()
+        graph.available()
+
+        db.session.add(Follows(user_following_id=self.u2, user_being_followed_id=self.u0))
+        db.session.commit()
+        graph.available()
+
+        self.assertFalse(graph.status(self.u2, self.u0))
+        self.assertTrue(graph.status(self.u1, self.u2))
+
+    def test_dal_uses_snapshot(self):
+        """Do the follow checks answer from the snapshot when there is one?"""
+
+        graph = self.make_graph()
+
+        with mock.patch.object(dal, 'follow_graph', graph):
+            graph.record(self.u1, self.u0, False)
+
+            self.assertEqual(dal.follow_statuses(self.u1, [self.u0, self.u2, self.u3]),
+                             {self.u0: False, self.u2: True, self.u3: False})
+            self.assertTrue(self.users[1].is_following_confirmed(self.users[2]))
+            self.assertFalse(self.users[3].is_followed_by_confirmed(self.users[1]))
+
+    def test_follow_after_poll(self):
+        """Is a follow the graph hasn't seen yet found, and can it be undone?"""
+
+        graph = self.make_graph()
+        graph.available()
+        graph.poll_interval = 3600
+
+        # made by another worker after this one's last poll
+        db.session.add(Follows(user_following_id=self.u2, user_being_followed_id=self.u0))
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.u2
+
+        with mock.patch.object(dal, 'follow_graph', graph), \
+                mock.patch.object(views.users, 'follow_graph', graph):
+            self.assertFalse(dal.follow_status(self.u2, self.u0))
+            self.assertEqual(dal.follow_statuses(self.u2, [self.u0, self.u1]), {self.u0: False})
+
+            # twice, as from a page showing the button before the first
+            for _ in range(2):
+                resp = client.post(f"/users/stop-following/{self.u0}")
+                self.assertEqual(resp.status_code, 302)
+
+            self.assertIsNone(dal.follow_status(self.u2, self.u0))
@@ -0,0 +1,97 @@
+"""Infinite scroll fragment tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_fragments.py
+
+
+import re
+
+from models import db, User, Message, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+from pagination import FEED_PAGE_SIZE
+
+
+class FragmentTestCase(DatabaseTestCase):
+    """Test first feed pages and the fragments that continue them."""
+
+    def setUp(self):
+        """A reader following an author of FEED_PAGE_SIZE + 5 messages."""
+
+        super().setUp()
+
+        self.client = app.test_client()
+
+        reader = User.signup(username="reader", email="reader@test.com",
+                             password="password", image_url=None)
+        author = User.signup(username="author", email="author@test.com",
+                             password="password", image_url=None)
+        db.session.commit()
+        self.reader_id, self.author_id = reader.id, author.id
+
+        db.session.add(Follows(user_following_id=self.reader_id, user_being_followed_id=self.author_id,
+                               following_confirmed_status=True))
+        messages = [Message(text=f"message number {i}", user_id=self.author_id)
+                    for i in range(FEED_PAGE_SIZE + 5)]
+        db.session.add_all(messages)
+        db.session.commit()
+
+        # newest first
+        self.message_ids = sorted((msg.id for msg in messages), reverse=True)
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.reader_id
+
+    def shown_ids(self, html):
+        return [int(message_id) for message_id in re.findall(r'href="/messages/(\d+)"', html)]
+
+    def more_url(self, html):
+        match = re.search(r'class="[^"]*load-more" data-url="([^"]+)"', html)
+        return match and match.group(1)
+
+    def assert_scrolls(self, url, fragment_path):
+        """The page at `url` and its fragment show every message once."""
+
+        html = self.client.get(url).get_data(as_text=True)
+        self.assertEqual(self.shown_ids(html), self.message_ids[:FEED_PAGE_SIZE])
+
+        more = self.more_url(html)
+        self.assertEqual(more, f"{fragment_path}?before={self.message_ids[FEED_PAGE_SIZE - 1]}")
+
+        resp = self.client.get(more)
+        fragment = resp.get_data(as_text=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("<html", fragment)
+        self.assertEqual(self.shown_ids(fragment), self.message_ids[FEED_PAGE_SIZE:])
+        self.assertIsNone(self.more_url(fragment))
+
+    def test_home(self):
+        """Does the homepage continue through /fragments/home?"""
+
+        self.assert_scrolls("/", "/fragments/home")
+
+    def test_profile(self):
+        """Do profile and messages pages continue through the profile fragment?"""
+
+        self.assert_scrolls(f"/users/{self.author_id}", f"/fragments/users/{self.author_id}")
+        self.assert_scrolls(f"/users/{self.author_id}/messages", f"/fragments/users/{self.author_id}")
+
+    def test_fragment_pages(self):
+        """Is a fragment page the right size, with its own next cursor?"""
+
+        html = self.client.get(f"/fragments/home?before={self.message_ids[2]}").get_data(as_text=True)
+
+        self.assertEqual(self.shown_ids(html), self.message_ids[3:3 + FEED_PAGE_SIZE])
+        self.assertEqual(self.more_url(html),
+                         f"/fragments/home?before={self.message_ids[2 + FEED_PAGE_SIZE]}")
+        self.assertIn('id="like-button-', html)
+
+    def test_bad_cursor(self):
+        """Are fragments without a valid cursor rejected?"""
+
+        self.assertEqual(self.client.get("/fragments/home").status_code, 400)
+        self.assertEqual(self.client.get(f"/fragments/users/{self.author_id}?before=x").status_code, 400)
+        self.assertEqual(self.client.get("/fragments/users/0?before=1").status_code, 404)
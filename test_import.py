@@ -0,0 +1,127 @@
+"""Bulk import tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_import.py
+
+
+import json
+from unittest import mock
+
+from models import db, User, Message, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import importer
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+class ImportViewsTestCase(DatabaseTestCase):
+    """Test importing messages and follows from NDJSON."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.u1, self.u2 = [
+            User.signup(username=f"testuser{i}", email=f"test{i}@test.com",
+                        password="password", image_url=None) for i in (1, 2)]
+        db.session.commit()
+        self.ids = [self.u1.id, self.u2.id]
+
+        self.client = app.test_client()
+
+    def post_as(self, user_id, url, data):
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+            return c.post(url, data=data, content_type='application/x-ndjson')
+
+    def import_as_u1(self, data):
+        resp = self.post_as(self.ids[0], f"/users/{self.ids[0]}/import", data)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json
+
+    def test_import(self):
+        """Are valid lines imported in batches and bad ones reported?"""
+
+        data = ndjson(
+            {"section": "messages", "text": "old", "created_at": "2019-05-01T12:00:00"},
+            {"section": "messages", "text": "now"},
+            {"section": "messages", "text": "x" * 141},
+            {"section": "following", "user_id": self.ids[1]},
+            {"section": "following", "user_id": self.ids[0]},
+            {"section": "following", "user_id": 999999},
+            {"section": "likes", "id": "1"},
+        ) + "not json\n\n"
+
+        with mock.patch.object(importer, 'IMPORT_BATCH', 3):
+            report = self.import_as_u1(data)
+
+        self.assertEqual(report['inserted'], 3)
+        self.assertEqual(report['error_count'], 5)
+        self.assertEqual([batch['lines'] for batch in report['batches']],
+                         [[1, 3], [4, 6], [7, 9]])
+        self.assertEqual([error['line'] for batch in report['batches']
+                          for error in batch['errors']], [3, 5, 6, 7, 8])
+        self.assertIn("140 characters", report['batches'][0]['errors'][0]['error'])
+
+        old = Message.query.filter_by(text="old").one()
+        self.assertEqual(old.timestamp.year, 2019)
+        self.assertEqual(Message.query.filter_by(user_id=self.ids[0]).count(), 2)
+        follow = Follows.query.one()
+        self.assertEqual((follow.user_following_id, follow.following_confirmed_status),
+                         (self.ids[0], False))
+
+    def test_import_again(self):
+        """Does importing the same file again skip what is already there?"""
+
+        data = ndjson(
+            {"section": "messages", "text": "old", "created_at": "2019-05-01T12:00:00+02:00"},
+            {"section": "following", "user_id": self.ids[1]},
+        )
+
+        self.assertEqual(self.import_as_u1(data)['inserted'], 2)
+        report = self.import_as_u1(data)
+
+        self.assertEqual((report['inserted'], report['skipped']), (0, 2))
+        self.assertEqual(Message.query.one().timestamp.hour, 10)
+
+    def test_import_edited_file(self):
+        """Are messages recognized again after lines are added or moved?"""
+
+        old = {"section": "messages", "text": "old", "created_at": "2019-05-01T12:00:00"}
+        other = {"section": "messages", "text": "other", "created_at": "2019-05-01T12:00:00"}
+
+        self.assertEqual(self.import_as_u1(ndjson(old, old))['inserted'], 1)
+        report = self.import_as_u1(ndjson(other, {"section": "following", "user_id": self.ids[1]}, old))
+
+        self.assertEqual((report['inserted'], report['skipped']), (2, 1))
+        self.assertEqual(sorted(message.text for message in Message.query), ["old", "other"])
+
+    def test_export_round_trip(self):
+        """Can an export of one account be imported into another?"""
+
+        db.session.add(Message(text="exported", user_id=self.ids[1]))
+        db.session.commit()
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.ids[1]
+            exported = c.get(f"/users/{self.ids[1]}/export").get_data()
+
+        report = self.import_as_u1(exported)
+
+        self.assertEqual(report['inserted'], 1)
+        self.assertEqual(Message.query.filter_by(user_id=self.ids[0]).one().text, "exported")
+
+    def test_access(self):
+        """Can't users import into someone else's account?"""
+
+        data = ndjson({"section": "messages", "text": "sneaky"})
+        resp = self.post_as(self.ids[1], f"/users/{self.ids[0]}/import", data)
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Message.query.count(), 0)
@@ -0,0 +1,159 @@
+"""Coalesced like toggle tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_likebuffer.py
+
+
+from unittest import mock
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Message, Likes
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import likebuffer
+from likebuffer import LikeBuffer, like_buffer
+import dal
+
+
+@mock.patch.object(LikeBuffer, '_start')
+class LikeBufferTestCase(DatabaseTestCase):
+    """Test pending like states and their batched writes.
+
+    The flushing thread is not started; tests flush by hand.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.users = [User.signup(username=f"testuser{i}", email=f"test{i}@test.com",
+                                  password="password", image_url=None) for i in range(5)]
+        db.session.commit()
+        self.user_ids = [user.id for user in self.users]
+
+        self.messages = [Message(text=f"message {i}", user_id=self.user_ids[0]) for i in range(3)]
+        db.session.add_all(self.messages)
+        db.session.commit()
+        self.message_ids = [msg.id for msg in self.messages]
+
+        self.buffer = LikeBuffer()
+        self.buffer.app = app
+
+    def test_double_click(self, start):
+        """Do two toggles of the same like cancel out without a write?"""
+
+        user_id, message_id = self.user_ids[1], self.message_ids[0]
+
+        self.assertTrue(self.buffer.toggle(user_id, message_id))
+        self.assertFalse(self.buffer.toggle(user_id, message_id))
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(Likes.query.count(), 0)
+
+    def test_like_storm(self, start):
+        """Are many users' likes of one message written together?"""
+
+        for user_id in self.user_ids:
+            self.buffer.toggle(user_id, self.message_ids[0])
+        self.assertEqual(Likes.query.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(Likes.query.filter_by(message_id=self.message_ids[0]).count(), 5)
+
+    def test_unlike_and_reads(self, start):
+        """Do reads see pending likes and unlikes before they are written?"""
+
+        user_id = self.user_ids[1]
+        db.session.add(Likes(user_id=user_id, message_id=self.message_ids[0]))
+        db.session.commit()
+
+        self.assertFalse(self.buffer.toggle(user_id, self.message_ids[0]))
+        self.assertTrue(self.buffer.toggle(user_id, self.message_ids[1]))
+
+        with mock.patch.object(dal, 'like_buffer', self.buffer):
+            self.assertEqual(dal.liked_ids(user_id, self.message_ids), {self.message_ids[1]})
+            self.buffer.flush()
+            self.assertEqual(dal.liked_ids(user_id, self.message_ids), {self.message_ids[1]})
+
+        self.assertEqual([like.message_id for like in Likes.query], [self.message_ids[1]])
+
+    def test_toggle_during_flush(self, start):
+        """Does a toggle made while a flush writes compare with what it wrote?"""
+
+        user_id, message_id = self.user_ids[1], self.message_ids[0]
+        save_states = likebuffer.save_states
+
+        def toggle_while_saving(states):
+            self.assertFalse(self.buffer.toggle(user_id, message_id))
+            save_states(states)
+
+        self.assertTrue(self.buffer.toggle(user_id, message_id))
+        with mock.patch.object(likebuffer, 'save_states', toggle_while_saving):
+            self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertTrue(self.buffer.toggle(user_id, message_id))
+        self.assertFalse(self.buffer.toggle(user_id, message_id))
+        self.assertEqual(self.buffer.flush(), 1)
+
+        self.assertEqual(Likes.query.count(), 0)
+
+    def test_deleted_message(self, start):
+        """Is a like of a message deleted before the write dropped quietly?"""
+
+        self.buffer.toggle(self.user_ids[1], self.message_ids[2])
+        self.buffer.toggle(self.user_ids[1], self.message_ids[1])
+        Message.query.filter_by(id=self.message_ids[2]).delete()
+        db.session.commit()
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual([like.message_id for like in Likes.query], [self.message_ids[1]])
+
+    def test_deleted_user(self, start):
+        """Is a like by a user deleted before the write dropped quietly?"""
+
+        self.buffer.toggle(self.user_ids[1], self.message_ids[0])
+        self.buffer.toggle(self.user_ids[2], self.message_ids[0])
+        User.query.filter_by(id=self.user_ids[2]).delete()
+        db.session.commit()
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual([like.user_id for like in Likes.query], [self.user_ids[1]])
+
+    def test_failed_toggle(self, start):
+        """Does one toggle failing to write leave the others of its batch written?"""
+
+        bad = (self.user_ids[3], self.message_ids[0])
+        save_states = likebuffer.save_states
+
+        def fail_on_bad(states):
+            if bad in states:
+                raise IntegrityError("INSERT INTO likes", {}, Exception("foreign key"))
+            save_states(states)
+
+        for user_id in self.user_ids[1:]:
+            self.buffer.toggle(user_id, self.message_ids[0])
+
+        with mock.patch.object(likebuffer, 'save_states', fail_on_bad):
+            self.assertEqual(self.buffer.flush(), len(self.user_ids) - 2)
+
+        self.assertEqual(sorted(like.user_id for like in Likes.query),
+                         [user_id for user_id in self.user_ids[1:] if user_id != bad[0]])
+
+    def test_view(self, start):
+        """Does likes_add answer from the buffer when it is enabled?"""
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.user_ids[1]
+
+        with mock.patch.object(like_buffer, 'enabled', True):
+            first = client.post(f"/users/add_like/{self.message_ids[0]}").json
+            second = client.post(f"/users/add_like/{self.message_ids[0]}").json
+            third = client.post(f"/users/add_like/{self.message_ids[0]}").json
+            like_buffer.flush()
+
+        self.assertEqual([first, second, third], [{"liked": True}, {"liked": False}, {"liked": True}])
+        self.assertEqual(Likes.query.count(), 1)
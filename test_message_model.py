@@ -1,32 +1,22 @@
 """Message model tests."""
 
 
-import os
-from unittest import TestCase
 from sqlalchemy.exc import IntegrityError
 
 from models import db, User, Message, Follows, Likes
 
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+from db_harness import DatabaseTestCase
 
 from app import app
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
 
-db.create_all()
-
-
-class MessageModelTestCase(TestCase):
+class MessageModelTestCase(DatabaseTestCase):
     """Test views for messages."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
-        Follows.query.delete()
+        super().setUp()
 
         self.client = app.test_client()
 
@@ -54,6 +44,33 @@ class MessageModelTestCase(TestCase):
         self.assertIsInstance(m, Message)
         self.assertEqual(m.user, u)
 
+    def test_message_ids_time_ordered(self):
+        """Do messages get increasing ids and their own timestamps?"""
+
+        u = User.signup(
+            email="test@test.com",
+            username="testuser",
+            password="HASHED_PASSWORD",
+            image_url="User.image_url.default.arg"
+        )
+        db.session.add(u)
+        db.session.commit()
+
+        m1 = Message(text="first", user_id=u.id)
+        db.session.add(m1)
+        db.session.commit()
+
+        m2 = Message(text="second", user_id=u.id)
+        db.session.add(m2)
+        db.session.commit()
+
+        self.assertLess(m1.id, m2.id)
+        self.assertIsNotNone(m1.timestamp)
+        self.assertLessEqual(m1.timestamp, m2.timestamp)
+
+        newest = Message.query.order_by(Message.id.desc()).first()
+        self.assertEqual(newest, m2)
+
     def test_no_message(self):
         """Does Message fail to create a new Message when a non-nullable field is left blank?"""
         u = User.signup(
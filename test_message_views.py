@@ -5,42 +5,31 @@
 #    FLASK_ENV=production python -m unittest test_message_views.py
 
 
-import os
-from unittest import TestCase
+from models import db, connect_db, Message, User, Likes
 
-from models import db, connect_db, Message, User
+# BEFORE we import our app, import the test harness: it points the app
+# at the test database and creates our tables (once for all tests ---
+# each test runs in a transaction that is rolled back afterwards)
 
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+from db_harness import DatabaseTestCase
 
 
 # Now we can import app
 
 from app import app, CURR_USER_KEY
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
-
 # Don't have WTForms use CSRF at all, since it's a pain to test
 
 app.config['WTF_CSRF_ENABLED'] = False
 
 
-class MessageViewTestCase(TestCase):
+class MessageViewTestCase(DatabaseTestCase):
     """Test views for messages."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
+        super().setUp()
 
         self.client = app.test_client()
 
@@ -109,3 +98,27 @@ class MessageViewTestCase(TestCase):
 
             self.assertIn(f'<p class="single-message">{m.text}</p>', html)
 
+
+    def test_like_invisible_message(self):
+        """Are likes of messages the user may not see turned away?"""
+
+        author = User.signup(username="private", email="private@test.com",
+                             password="private", image_url=None)
+        author.private = True
+        db.session.commit()
+
+        private = Message(text="followers only", user_id=author.id)
+        hidden = Message(text="hidden by a moderator", user_id=self.testuser.id, hidden=True)
+        db.session.add_all([private, hidden])
+        db.session.commit()
+        user_id, message_ids = self.testuser.id, [private.id, hidden.id]
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+
+            for message_id in message_ids:
+                resp = c.post(f"/users/add_like/{message_id}")
+                self.assertEqual(resp.status_code, 404)
+
+        self.assertEqual(Likes.query.count(), 0)
@@ -0,0 +1,157 @@
+"""Bulk moderation tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_moderation.py
+
+
+from datetime import datetime
+from unittest import mock
+
+from models import db, User, Message, Likes, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import moderation
+from moderation import moderation_worker, Filters
+
+
+class ModerationTestCase(DatabaseTestCase):
+    """Test previewing and carrying out bulk moderation."""
+
+    def setUp(self):
+        """An admin, a regular user and two spammers with a few messages each."""
+
+        super().setUp()
+
+        self.client = app.test_client()
+
+        users = [User.signup(username=name, email=f"{name}@test.com", password="password", image_url=None)
+                 for name in ("admin", "regular", "spammer1", "spammer2")]
+        users[0].admin = True
+        db.session.commit()
+        self.admin_id, self.regular_id, *self.spammer_ids = [user.id for user in users]
+
+        for user_id in self.spammer_ids:
+            db.session.add_all([Message(text=f"Buy CHEAP_pills {i}", user_id=user_id,
+                                        timestamp=datetime(2021, 3, 1 + i)) for i in range(3)])
+        db.session.add(Message(text="no cheap pills here, 100% honest", user_id=self.regular_id,
+                               timestamp=datetime(2021, 3, 2)))
+        db.session.add(Follows(user_following_id=self.regular_id, user_being_followed_id=self.spammer_ids[0],
+                               following_confirmed_status=True))
+        db.session.commit()
+
+        db.session.add(Likes(user_id=self.regular_id, message_id=Message.query.first().id))
+        db.session.commit()
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.admin_id
+
+    def test_parse_filters(self):
+        """Are missing or malformed filters rejected?"""
+
+        for data in ({}, [], {"user_ids": "1"}, {"user_ids": [1.5]}, {"pattern": "**"},
+                     {"since": "yesterday"}):
+            with self.subTest(data=data):
+                with self.assertRaises(moderation.BadRequest):
+                    moderation.parse_filters(data)
+
+        self.assertEqual(moderation.parse_filters({"user_ids": [3, 2, 3], "until": "2021-03-02"}),
+                         Filters([2, 3], None, None, datetime(2021, 3, 2)))
+
+    def test_pattern(self):
+        """Are LIKE wildcards in patterns literal, and '*' a wildcard?"""
+
+        def matches(pattern):
+            return moderation.preview(Filters(None, pattern, None, None))['messages']
+
+        self.assertEqual(matches("cheap_pills"), 6)
+        self.assertEqual(matches("cheap*pills"), 7)
+        self.assertEqual(matches("100%"), 1)
+        self.assertEqual(matches("cheap%pills"), 0)
+
+    def test_preview(self):
+        """Does the preview count messages, authors and accounts?"""
+
+        resp = self.client.post("/admin/moderation/preview",
+                                json={"pattern": "cheap*pills", "since": "2021-03-02T00:00:00"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json['messages'], 5)
+        self.assertEqual(resp.json['authors'], 3)
+        self.assertEqual(resp.json['accounts'], 0)
+        self.assertEqual(len(resp.json['sample']), 5)
+
+        resp = self.client.post("/admin/moderation/preview", json={})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_hide_and_unhide(self):
+        """Are hidden messages invisible, and back after unhiding?"""
+
+        filters = Filters(None, "cheap_pills", None, None)
+
+        self.assertEqual(moderation.moderate_messages('hide', filters, batch_size=4), 6)
+        self.assertEqual(moderation.moderate_messages('hide', filters, batch_size=4), 0)
+
+        self.assertEqual(Message.query.filter_by(hidden=True).count(), 6)
+        html = self.client.get(f"/users/{self.spammer_ids[0]}").get_data(as_text=True)
+        self.assertNotIn("CHEAP_pills", html)
+
+        self.assertEqual(moderation.moderate_messages('unhide', filters), 6)
+        html = self.client.get(f"/users/{self.spammer_ids[0]}").get_data(as_text=True)
+        self.assertIn("CHEAP_pills", html)
+
+    def test_delete_job(self):
+        """Does a submitted delete job remove the messages and their likes?"""
+
+        # run the job here rather than in the worker thread, which would
+        # share the test's connection with the request's teardown
+        with mock.patch.object(moderation_worker, '_run'), \
+                mock.patch.object(moderation_worker, '_queue') as queue:
+            resp = self.client.post("/admin/moderation", json={"action": "delete", "pattern": "cheap_pills"})
+        self.assertEqual(resp.status_code, 202)
+
+        job, = queue.put.call_args[0]
+        moderation.run_job(job)
+        job.status = "done"
+
+        report = self.client.get("/admin/moderation").json['jobs'][0]
+        self.assertEqual((report['id'], report['total'], report['done']), (job.id, 6, 6))
+        self.assertEqual(Message.query.count(), 1)
+        self.assertEqual(Likes.query.count(), 0)
+
+    def test_delete_accounts(self):
+        """Are the accounts, their messages and follows deleted?"""
+
+        resp = self.client.post("/admin/moderation", json={"action": "delete_accounts", "pattern": "x"})
+        self.assertEqual(resp.status_code, 400)
+
+        self.assertEqual(moderation.delete_accounts(self.spammer_ids, batch_size=2), 6)
+
+        self.assertEqual(User.query.filter(User.id.in_(self.spammer_ids)).count(), 0)
+        self.assertEqual(Message.query.count(), 1)
+        self.assertEqual(Follows.query.count(), 0)
+
+    def test_delete_accounts_spares_admins(self):
+        """Are admins refused, and left alone by delete_accounts?"""
+
+        resp = self.client.post("/admin/moderation", json={
+            "action": "delete_accounts", "user_ids": [self.spammer_ids[0], self.admin_id]})
+        self.assertEqual(resp.status_code, 400)
+
+        self.assertEqual(moderation.delete_accounts([self.admin_id, self.spammer_ids[0]]), 3)
+
+        self.assertIsNotNone(User.query.get(self.admin_id))
+        self.assertIsNone(User.query.get(self.spammer_ids[0]))
+
+    def test_admin_only(self):
+        """Are regular users turned away?"""
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.regular_id
+
+        resp = self.client.post("/admin/moderation", json={"action": "delete", "pattern": "pills"})
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Message.query.count(), 7)
@@ -0,0 +1,88 @@
+"""Message partitioning and archive tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_partitions.py
+
+
+from datetime import datetime
+from unittest import mock
+
+from models import db, User, Message, MessageArchive
+
+from db_harness import DatabaseTestCase
+
+from app import app
+import dal
+import partitions
+
+
+class PartitionsTestCase(DatabaseTestCase):
+    """Test archiving old messages and windowed recent-message lookups."""
+
+    def setUp(self):
+        """Create a user with one message per month of 2020."""
+
+        super().setUp()
+
+        self.user = User.signup(username="testuser", email="test@test.com",
+                                password="password", image_url=None)
+        db.session.commit()
+
+        for month in range(1, 13):
+            db.session.add(Message(text=f"month {month}", user_id=self.user.id,
+                                   timestamp=datetime(2020, month, 15)))
+        db.session.commit()
+
+    def test_month_helpers(self):
+        """Do month arithmetic and partition names round-trip?"""
+
+        self.assertEqual(partitions.add_months(datetime(2020, 11, 30), 3),
+                         datetime(2021, 2, 1))
+        self.assertEqual(partitions.add_months(datetime(2020, 1, 5), -1),
+                         datetime(2019, 12, 1))
+
+        name = partitions.partition_name(datetime(2020, 7, 1))
+        self.assertEqual(name, "messages_y2020m07")
+        self.assertEqual(partitions.partition_start(name), datetime(2020, 7, 1))
+        self.assertIsNone(partitions.partition_start("messages_default"))
+
+    def test_archive_before(self):
+        """Are whole months before the cutoff moved to the archive?"""
+
+        partitions.archive_before(datetime(2020, 7, 10), batch_size=2)
+
+        live = [msg.timestamp.month for msg in Message.query.all()]
+        archived = [msg.timestamp.month for msg in MessageArchive.query.all()]
+
+        self.assertEqual(sorted(live), list(range(7, 13)))
+        self.assertEqual(sorted(archived), list(range(1, 7)))
+
+    def profile_months(self, limit, now):
+        """Months of the newest `limit` messages of the user's profile feed
+        as of `now`, and the number of queries that took."""
+
+        queries = []
+
+        def counted_recent(fetch, limit, now=None):
+            def counted_fetch(*args):
+                queries.append(args)
+                return fetch(*args)
+            return partitions.recent_messages(counted_fetch, limit, now)
+
+        with mock.patch.object(dal, 'recent_messages', counted_recent):
+            rows = dal.profile_feed(self.user.id, self.user.id, limit, now=now)
+
+        return [row.timestamp.month for row in rows], len(queries)
+
+    def test_recent_messages_window(self):
+        """Does the newest month suffice when it holds enough messages?"""
+
+        self.assertEqual(self.profile_months(1, now=datetime(2020, 12, 20)), ([12], 1))
+
+    def test_recent_messages_rest(self):
+        """Are the rest fetched from before the newest month in one query?"""
+
+        self.assertEqual(self.profile_months(3, now=datetime(2020, 12, 20)), ([12, 11, 10], 2))
+        self.assertEqual(self.profile_months(20, now=datetime(2021, 6, 1)),
+                         (list(range(12, 0, -1)), 2))
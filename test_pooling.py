@@ -0,0 +1,66 @@
+"""Connection pool settings and fork safety tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_pooling.py
+
+
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+import pooling
+
+CONFIG = {'DB_POOL_SIZE': 3, 'DB_MAX_OVERFLOW': 2, 'DB_POOL_TIMEOUT': 10,
+          'DB_POOL_RECYCLE': 600, 'DB_POOL_PRE_PING': True}
+
+
+class EngineOptionsTestCase(TestCase):
+    """Test translating DB_POOL_* settings into engine options."""
+
+    def test_postgresql(self):
+        options = pooling.engine_options(CONFIG, make_url("postgresql:///warbler"))
+
+        self.assertEqual(options, {'pool_size': 3, 'max_overflow': 2, 'pool_timeout': 10,
+                                   'pool_recycle': 600, 'pool_pre_ping': True})
+
+    def test_no_pool(self):
+        """Does DB_POOL_SIZE=0 leave the pooling to PgBouncer?"""
+
+        options = pooling.engine_options(dict(CONFIG, DB_POOL_SIZE=0),
+                                         make_url("postgresql://127.0.0.1:6432/warbler"))
+
+        self.assertIs(options['poolclass'], NullPool)
+        self.assertNotIn('pool_size', options)
+
+    def test_sqlite(self):
+        self.assertEqual(pooling.engine_options(CONFIG, make_url("sqlite://")), {})
+
+
+@skipUnless(hasattr(os, 'fork'), "needs os.fork")
+class ForkTestCase(TestCase):
+    """Test that forked children never use their parent's connections."""
+
+    def test_fork(self):
+        """Does the parent close its idle connections, and the child get a new pool?"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            # pooled like a PostgreSQL engine
+            engine = create_engine(f"sqlite:///{directory}/fork.db", poolclass=QueuePool)
+            engine.execute("SELECT 1")
+            parent_pool = engine.pool
+
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if engine.pool is not parent_pool else 1)
+
+            _, status = os.waitpid(pid, 0)
+
+            self.assertEqual(os.WEXITSTATUS(status), 0)
+            self.assertIs(engine.pool, parent_pool)
+            self.assertEqual(parent_pool.checkedin(), 0)
+            engine.dispose()
@@ -0,0 +1,145 @@
+"""Login pre-warming tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_prewarm.py
+
+
+from unittest import mock
+
+from models import db, User, Message, Follows, PrewarmedTimeline
+
+from db_harness import DatabaseTestCase
+
+from app import app
+import dal
+from prewarm import TimelinePrewarmer, timeline_prewarmer
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+@mock.patch.object(TimelinePrewarmer, '_start')
+class PrewarmTestCase(DatabaseTestCase):
+    """Test pre-warming the homepage on login and timing first loads.
+
+    The loading thread is not started; tests load queued timelines here.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.client = app.test_client()
+
+        reader = User.signup(username="reader", email="reader@test.com",
+                             password="password", image_url=None)
+        author = User.signup(username="author", email="author@test.com",
+                             password="password", image_url=None)
+        db.session.commit()
+        self.reader_id, self.author_id = reader.id, author.id
+
+        db.session.add(Follows(user_following_id=self.reader_id, user_being_followed_id=self.author_id,
+                               following_confirmed_status=True))
+        db.session.add(Message(text="warm hello", user_id=self.author_id))
+        db.session.commit()
+
+        timeline_prewarmer._reset()
+        self.addCleanup(timeline_prewarmer._reset)
+
+        enabled = mock.patch.object(timeline_prewarmer, 'enabled', True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+
+    def login(self):
+        resp = self.client.post("/login", data={"username": "reader", "password": "password"})
+        self.assertEqual(resp.status_code, 302)
+
+    def load_queued(self):
+        user_id, entry = timeline_prewarmer._queue.get_nowait()
+        timeline_prewarmer._warm(user_id, entry)
+
+    def test_warm_first_load(self, start):
+        """Is the homepage after login served from the pre-warmed timeline?"""
+
+        self.login()
+        self.load_queued()
+
+        with mock.patch('views.home.load_timeline') as load_timeline:
+            html = self.client.get("/").get_data(as_text=True)
+
+        load_timeline.assert_not_called()
+        self.assertIn("warm hello", html)
+
+        stats = timeline_prewarmer.stats()
+        self.assertEqual((stats['hits'], stats['warm']['loads'], stats['cold']['loads']), (1, 1, 0))
+
+        # later loads are computed as usual, and not timed
+        self.assertIn("warm hello", self.client.get("/").get_data(as_text=True))
+        self.assertEqual(timeline_prewarmer.stats()['warm']['loads'], 1)
+
+    def test_other_worker(self, start):
+        """Is the homepage warm when another worker serves the redirect?"""
+
+        self.login()
+        self.load_queued()
+
+        other = TimelinePrewarmer(app)
+        other.enabled = True
+        with mock.patch('views.home.timeline_prewarmer', other), \
+                mock.patch('views.home.load_timeline') as load_timeline:
+            html = self.client.get("/").get_data(as_text=True)
+
+        load_timeline.assert_not_called()
+        self.assertIn("warm hello", html)
+        self.assertEqual(other.stats()['hits'], 1)
+
+        # taken once
+        self.assertIsNone(PrewarmedTimeline.query.get(self.reader_id))
+
+    def test_other_worker_loading(self, start):
+        """Does another worker wait for a timeline still being loaded?"""
+
+        self.login()
+
+        other = TimelinePrewarmer(app)
+        with mock.patch.object(other, 'wait', 0):
+            self.assertIsNone(other.take(self.reader_id))
+        self.assertIsNone(other.take(self.author_id))
+
+        stats = other.stats()
+        self.assertEqual((stats['late'], stats['misses']), (1, 1))
+
+    def test_cold_first_load(self, start):
+        """Are first loads without a ready timeline served cold, and timed?"""
+
+        with mock.patch.object(timeline_prewarmer, 'enabled', False):
+            self.login()
+        self.client.get("/")
+
+        self.login()
+        with mock.patch.object(timeline_prewarmer, 'wait', 0):
+            html = self.client.get("/").get_data(as_text=True)
+
+        self.assertIn("warm hello", html)
+        stats = timeline_prewarmer.stats()
+        self.assertEqual((stats['misses'], stats['late'], stats['cold']['loads']), (1, 1, 2))
+        self.assertIsNotNone(stats['cold']['median_ms'])
+
+    def test_expired(self, start):
+        """Is a timeline older than the TTL ignored?"""
+
+        self.login()
+        self.load_queued()
+
+        with mock.patch.object(timeline_prewarmer, 'ttl', -1):
+            self.client.get("/")
+
+        self.assertEqual(timeline_prewarmer.stats()['expired'], 1)
+
+    def test_user_counts(self, start):
+        """Does user_counts match the model's counts?"""
+
+        author = User.query.get(self.author_id)
+
+        self.assertEqual(dal.user_counts(self.author_id),
+                         (author.count_messages(), author.count_following(), author.count_followers()))
+        self.assertEqual(dal.user_counts(self.author_id), (1, 0, 1))
@@ -0,0 +1,103 @@
+"""Request profiler tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_profiler.py
+
+
+import pstats
+import tempfile
+from datetime import datetime
+
+from models import db, User
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+from profiler import profiler, profile_name, parse_profile_name
+
+
+class ProfilerTestCase(DatabaseTestCase):
+    """Test picking, storing and listing request profiles."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(setattr, profiler, 'directory', profiler.directory)
+        self.addCleanup(setattr, profiler, 'sample_rate', profiler.sample_rate)
+        profiler.directory = self.tmp.name
+
+        self.admin = User.signup(username="admin", email="admin@test.com",
+                                 password="password", image_url=None)
+        self.admin.admin = True
+        self.user = User.signup(username="user", email="user@test.com",
+                                password="password", image_url=None)
+        db.session.commit()
+
+        self.admin_id = self.admin.id
+        self.user_id = self.user.id
+        self.client = app.test_client()
+
+    def get_as(self, user_id, url, **kwargs):
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+            return c.get(url, **kwargs)
+
+    def test_profile_names(self):
+        """Do profile names round-trip and reject other files?"""
+
+        name = profile_name("users.users_show", 0.25, datetime(2021, 3, 4, 5, 6, 7, 8))
+        info = parse_profile_name(name)
+
+        self.assertEqual(info['endpoint'], "users.users_show")
+        self.assertEqual(info['duration_ms'], 250)
+        self.assertEqual(info['profiled_at'], "2021-03-04T05:06:07.000008")
+        self.assertIsNone(parse_profile_name("../app.py"))
+
+    def test_admin_header(self):
+        """Is a request profiled for an admin sending the header?"""
+
+        resp = self.get_as(self.admin_id, "/users", headers={'X-Profile': "1"})
+        name = resp.headers['X-Profile-Id']
+
+        profiles = profiler.slowest()['users.list_users']
+        self.assertEqual([info['name'] for info in profiles], [name])
+        pstats.Stats(profiler.path(name))
+
+    def test_header_ignored_for_users(self):
+        """Is the header ignored for everyone else?"""
+
+        resp = self.get_as(self.user_id, "/users", headers={'X-Profile': "1"})
+
+        self.assertNotIn('X-Profile-Id', resp.headers)
+        self.assertEqual(profiler.slowest(), {})
+
+    def test_sampling_keeps_slowest(self):
+        """Are sampled requests profiled and pruned to the slowest few?"""
+
+        profiler.sample_rate = 1.0
+        for i in range(profiler.keep + 3):
+            self.get_as(self.user_id, "/users")
+
+        profiles = profiler.slowest()['users.list_users']
+        durations = [info['duration_ms'] for info in profiles]
+
+        self.assertEqual(len(profiles), profiler.keep)
+        self.assertEqual(durations, sorted(durations, reverse=True))
+
+    def test_admin_views(self):
+        """Can admins, and only admins, list and read profiles?"""
+
+        name = self.get_as(self.admin_id, "/users", headers={'X-Profile': "1"}).headers['X-Profile-Id']
+
+        resp = self.get_as(self.admin_id, "/admin/profiles")
+        self.assertEqual(resp.json['profiles']['users.list_users'][0]['name'], name)
+
+        resp = self.get_as(self.admin_id, f"/admin/profiles/{name}?format=text")
+        self.assertIn(b"cumulative", resp.data)
+
+        self.assertEqual(self.get_as(self.admin_id, "/admin/profiles/app.py").status_code, 404)
+        self.assertEqual(self.get_as(self.user_id, "/admin/profiles").status_code, 302)
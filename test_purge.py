@@ -0,0 +1,134 @@
+"""Account deletion and purge tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_purge.py
+
+
+from datetime import datetime, timedelta
+from unittest import mock
+
+from models import db, User, Message, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import purge
+
+
+class PurgeTestCase(DatabaseTestCase):
+    """Test deleting accounts directly and through the purge worker."""
+
+    def setUp(self):
+        """Create two users; u1 has a few messages and follows u2."""
+
+        super().setUp()
+
+        self.u1 = User.signup(username="testuser1", email="test1@test.com",
+                              password="password", image_url=None)
+        self.u2 = User.signup(username="testuser2", email="test2@test.com",
+                              password="password", image_url=None)
+        db.session.commit()
+
+        for i in range(5):
+            db.session.add(Message(text=f"message {i}", user_id=self.u1.id))
+        db.session.add(Follows(user_being_followed_id=self.u2.id,
+                               user_following_id=self.u1.id))
+        db.session.commit()
+
+        self.u1_id = self.u1.id
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_delete_small_account(self):
+        """Is a small account deleted in the request, messages included?"""
+
+        job = purge.delete_account(self.u1)
+
+        self.assertIsNone(job)
+        self.assertIsNone(User.query.get(self.u1_id))
+        self.assertEqual(Message.query.filter_by(user_id=self.u1_id).count(), 0)
+        self.assertEqual(Follows.query.count(), 0)
+
+    def test_purge_account_in_batches(self):
+        """Does purge_account remove everything with a small batch size?"""
+
+        purge.purge_account(self.u1_id, batch_size=2)
+
+        self.assertIsNone(User.query.get(self.u1_id))
+        self.assertEqual(Message.query.count(), 0)
+
+    def test_tombstone_large_account(self):
+        """Is a large account tombstoned and purged in the background?"""
+
+        with mock.patch.object(purge, 'IMMEDIATE_DELETE_LIMIT', 1):
+            job = purge.delete_account(self.u1)
+
+        self.assertEqual(job.total, 5)
+        self.assertEqual(Follows.query.count(), 0)
+
+        purge.purge_worker._queue.join()
+        db.session.expire_all()
+
+        self.assertEqual(job.status, "done")
+        self.assertEqual(job.deleted, 5)
+        self.assertIsNone(User.query.get(self.u1_id))
+        self.assertEqual(Message.query.count(), 0)
+
+    def tombstone(self, claimed_at=None):
+        user = User.query.get(self.u1_id)
+        user.deleted_at = datetime.utcnow()
+        user.purge_claimed_at = claimed_at
+        db.session.commit()
+
+    def test_resume_purges(self):
+        """Are tombstoned accounts left by an exited worker purged on resume?"""
+
+        self.tombstone()
+
+        worker = purge.PurgeWorker()
+        worker.app = app
+        jobs = worker.resume()
+        worker._queue.join()
+        db.session.expire_all()
+
+        self.assertEqual([(job.user_id, job.total, job.status) for job in jobs], [(self.u1_id, 5, "done")])
+        self.assertIsNone(User.query.get(self.u1_id))
+        self.assertEqual(Message.query.count(), 0)
+
+    def test_claimed_purge_skipped(self):
+        """Is a purge another worker is making progress on left alone, until
+        its claim expires?"""
+
+        self.tombstone(claimed_at=datetime.utcnow())
+
+        worker = purge.PurgeWorker()
+        worker.app = app
+        jobs = worker.resume()
+        worker._queue.join()
+        db.session.expire_all()
+
+        self.assertEqual(jobs[0].status, "skipped")
+        self.assertEqual(Message.query.count(), 5)
+
+        later = datetime.utcnow() + timedelta(seconds=purge.PURGE_LEASE + 1)
+        self.assertTrue(purge.claim(self.u1_id, now=later))
+        self.assertFalse(purge.claim(self.u1_id, now=later))
+
+    def test_tombstoned_pages_gone(self):
+        """Are all pages of a tombstoned account gone before the purge?"""
+
+        self.tombstone(claimed_at=datetime.utcnow())
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.u2.id
+
+        for page in ("", "/messages", "/likes", "/following", "/followers", "/mentions"):
+            with self.subTest(page=page):
+                self.assertEqual(client.get(f"/users/{self.u1_id}{page}").status_code, 404)
+
+        for listing in ("following", "followers", "likes"):
+            with self.subTest(listing=listing):
+                self.assertEqual(client.get(f"/api/users/{self.u1_id}/{listing}").status_code, 404)
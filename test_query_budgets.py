@@ -0,0 +1,152 @@
+"""Query-count and wall-time budgets for hot routes.
+
+Each route has a budget of SQL statements per request that must hold at
+every dataset size: a route whose query count grows with the data (an N+1
+in a view or template) fails here.
+"""
+
+# run these tests like:
+#
+#    python -m unittest test_query_budgets.py
+
+
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import db, User, Message, Follows, Likes
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+# number of followed users / followers / liked messages of the test user
+DATASET_SIZES = (5, 50)
+
+# route: (max SQL statements, max wall seconds) per request
+BUDGETS = {
+    'homepage': (10, 1.0),
+    'users_show': (12, 1.0),
+    'list_users': (5, 1.0),
+    'users_followers': (10, 1.0),
+    'users_likes': (9, 1.0),
+    'likes_add': (6, 1.0),
+}
+
+
+class QueryCounter:
+    """Count SQL statements executed on a connection."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(connection):
+    counter = QueryCounter()
+    event.listen(connection, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(connection, 'before_cursor_execute', counter)
+
+
+class QueryBudgetTestCase(DatabaseTestCase):
+    """Hot routes stay within their statement budgets as data grows."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.client = app.test_client()
+
+        self.testuser = User.signup(username="testuser", email="test@test.com",
+                                    password="password", image_url=None)
+        db.session.commit()
+        self.testuser_id = self.testuser.id
+
+    def populate(self, size):
+        """`size` users who follow and are followed by the test user,
+        two messages each, all liked by the test user."""
+
+        db.session.bulk_insert_mappings(User, [
+            {'username': f"other{i}", 'email': f"other{i}@test.com", 'password': "x"}
+            for i in range(size)])
+        db.session.commit()
+
+        other_ids = [user_id for (user_id,) in
+                     db.session.query(User.id).filter(User.id != self.testuser_id)]
+
+        db.session.bulk_insert_mappings(Message, [
+            {'text': f"message {i}", 'user_id': other_id}
+            for other_id in other_ids for i in range(2)])
+        db.session.bulk_insert_mappings(Follows, [
+            {'user_being_followed_id': other_id, 'user_following_id': self.testuser_id,
+             'following_confirmed_status': True}
+            for other_id in other_ids])
+        db.session.bulk_insert_mappings(Follows, [
+            {'user_being_followed_id': self.testuser_id, 'user_following_id': other_id,
+             'following_confirmed_status': True}
+            for other_id in other_ids])
+        db.session.commit()
+
+        message_ids = [message_id for (message_id,) in db.session.query(Message.id)]
+        db.session.bulk_insert_mappings(Likes, [
+            {'user_id': self.testuser_id, 'message_id': message_id}
+            for message_id in message_ids])
+        db.session.commit()
+
+        return message_ids
+
+    def assert_within_budget(self, route, method, url):
+        max_statements, max_seconds = BUDGETS[route]
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser_id
+
+            with count_queries(self.connection) as counter:
+                start = time.perf_counter()
+                resp = c.open(url, method=method)
+                elapsed = time.perf_counter() - start
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertLessEqual(
+            counter.count, max_statements,
+            f"{route} ran {counter.count} statements:\n" + "\n".join(counter.statements))
+        self.assertLessEqual(elapsed, max_seconds, f"{route} took {elapsed:.3f}s")
+
+    def check_at_all_sizes(self, route, method, url_for_size):
+        for size in DATASET_SIZES:
+            with self.subTest(size=size):
+                self.doCleanups()
+                self.setUp()
+                message_ids = self.populate(size)
+                self.assert_within_budget(route, method, url_for_size(message_ids))
+
+    def test_homepage(self):
+        self.check_at_all_sizes('homepage', 'GET', lambda ids: "/")
+
+    def test_users_show(self):
+        self.check_at_all_sizes('users_show', 'GET', lambda ids: f"/users/{self.testuser_id}")
+
+    def test_list_users(self):
+        self.check_at_all_sizes('list_users', 'GET', lambda ids: "/users")
+
+    def test_users_followers(self):
+        self.check_at_all_sizes('users_followers', 'GET', lambda ids: f"/users/{self.testuser_id}/followers")
+
+    def test_users_likes(self):
+        self.check_at_all_sizes('users_likes', 'GET', lambda ids: f"/users/{self.testuser_id}/likes")
+
+    def test_likes_add(self):
+        self.check_at_all_sizes('likes_add', 'POST', lambda ids: f"/users/add_like/{ids[0]}")
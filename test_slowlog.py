@@ -0,0 +1,139 @@
+"""Slow-query log tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_slowlog.py
+
+
+import time
+from unittest import mock
+
+from sqlalchemy import event
+
+from models import db, User, Message
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import slowlog
+from slowlog import SlowQueryLog, slow_query_log
+
+
+@mock.patch.object(SlowQueryLog, '_start')
+class SlowQueryLogTestCase(DatabaseTestCase):
+    """Test logging slow statements and explaining them.
+
+    Every statement counts as slow. The explaining thread is not started;
+    tests explain queued statements here.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        self.client = app.test_client()
+
+        admin = User.signup(username="admin", email="admin@test.com",
+                            password="password", image_url=None)
+        admin.admin = True
+        db.session.add(Message(text="hello", user=admin))
+        db.session.commit()
+        self.admin_id = admin.id
+
+        slow_query_log._reset()
+        self.addCleanup(slow_query_log._reset)
+
+        threshold = mock.patch.object(slow_query_log, 'threshold_ms', 1e-9)
+        threshold.start()
+        self.addCleanup(threshold.stop)
+
+        slow_query_log.listen(db.engine)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', slow_query_log._before)
+        self.addCleanup(event.remove, db.engine, 'after_cursor_execute', slow_query_log._after)
+
+    def test_normalize(self, start):
+        """Do statements differing only in values and IN list lengths match?"""
+
+        self.assertEqual(
+            slowlog.normalize("SELECT *\n  FROM messages WHERE id IN (%(ids_1)s, %(ids_2)s)"
+                              " AND text LIKE 'it''s%' AND user_id = 12 AND x::text = :y"),
+            "SELECT * FROM messages WHERE id IN (...) AND text LIKE ? AND user_id = ? AND x::text = ?")
+        self.assertEqual(slowlog.normalize("SELECT 1 FROM t1 WHERE a IN (?, ?, ?)"),
+                         slowlog.normalize("SELECT 2 FROM t1 WHERE a IN (?, ?)"))
+
+    def test_explain_sql(self, start):
+        """Are only SELECTs run again by EXPLAIN ANALYZE?"""
+
+        self.assertEqual(slowlog.explain_sql('postgresql', "SELECT 1"),
+                         "EXPLAIN (ANALYZE, BUFFERS) SELECT 1")
+        self.assertEqual(slowlog.explain_sql('postgresql', "DELETE FROM messages"),
+                         "EXPLAIN DELETE FROM messages")
+        self.assertEqual(slowlog.explain_sql('sqlite', "SELECT 1"), "EXPLAIN QUERY PLAN SELECT 1")
+        self.assertIsNone(slowlog.explain_sql('postgresql', "CREATE TABLE t1 (a INTEGER)"))
+
+    def test_request_logged(self, start):
+        """Are a request's statements logged with its endpoint?"""
+
+        resp = self.client.get(f"/users/{self.admin_id}")
+        self.assertEqual(resp.status_code, 200)
+
+        entries = [entry for entry in slow_query_log.entries() if entry['endpoint'] == 'users.users_show']
+        self.assertTrue(entries)
+        self.assertTrue(all(entry['path'] == f"/users/{self.admin_id}" for entry in entries))
+        self.assertTrue(any("FROM messages" in entry['statement'] for entry in entries))
+
+    @mock.patch.object(slowlog, '_in_memory', return_value=False)
+    def test_explain(self, in_memory, start):
+        """Is a queued statement's plan captured, and reused for a while?"""
+
+        Message.query.filter(Message.user_id.in_([self.admin_id, 0])).all()
+
+        queued = []
+        while not slow_query_log._queue.empty():
+            queued.append(slow_query_log._queue.get_nowait())
+
+        entry, engine, statement, parameters = next(
+            item for item in queued if "FROM messages" in item[2])
+        self.assertEqual(entry['explain'], "pending")
+        self.assertIn("IN (...)", entry['statement'])
+        self.assertNotIn(str(self.admin_id), entry['statement'])
+
+        # the test's own connection: its rows are not committed
+        plan = slowlog.explain(db.session.connection().connection, engine.dialect.name, statement, parameters)
+        self.assertIn("messages", plan)
+
+        slow_query_log._plans[entry['statement']] = (time.monotonic(), plan)
+        again = slow_query_log.record(engine, statement, parameters, False, 1.0)
+        self.assertEqual((again['explain'], again['plan']), ("cached", plan))
+
+    def test_unmatched_after(self, start):
+        """Is a statement whose start wasn't timed skipped?"""
+
+        connection = mock.Mock(info={})
+        slow_query_log._after(connection, None, "SELECT 1", {}, None, False)
+        connection.info['slow_query_start'] = []
+        slow_query_log._after(connection, None, "SELECT 1", {}, None, False)
+
+        self.assertEqual(slow_query_log.entries(), [])
+
+    def test_ring_buffer(self, start):
+        """Are only the newest entries kept?"""
+
+        log = SlowQueryLog(keep=2)
+        for duration_ms in (1, 2, 3):
+            log.record(db.engine, "SELECT 1", {}, True, duration_ms)
+
+        self.assertEqual([entry['duration_ms'] for entry in log.entries()], [3, 2])
+        self.assertEqual(log.report()['summary'][0]['count'], 2)
+
+    def test_export(self, start):
+        """Can admins download the log as JSON?"""
+
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.admin_id
+
+        resp = self.client.get("/admin/slow-queries?format=download")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers['Content-Disposition'], "attachment; filename=slow-queries.json")
+        self.assertIn('queries', resp.json)
+        self.assertIn('summary', resp.json)
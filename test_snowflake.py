@@ -0,0 +1,68 @@
+"""Snowflake id tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_snowflake.py
+
+
+import os
+from datetime import datetime
+from unittest import TestCase, mock
+
+import snowflake
+
+
+class SnowflakeTestCase(TestCase):
+    """Test generating and decoding time-ordered ids."""
+
+    def test_ids_increase(self):
+        """Are ids from one generator unique and strictly increasing?"""
+
+        generator = snowflake.SnowflakeGenerator(worker_id=1)
+        ids = [generator.next_id() for i in range(10000)]
+
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_workers_differ(self):
+        """Do two workers never produce the same id?"""
+
+        ids1 = {snowflake.SnowflakeGenerator(worker_id=1).next_id() for i in range(100)}
+        ids2 = {snowflake.SnowflakeGenerator(worker_id=2).next_id() for i in range(100)}
+
+        self.assertFalse(ids1 & ids2)
+
+    def test_id_encodes_time(self):
+        """Does an id decode back to its creation time?"""
+
+        before = datetime.utcnow().replace(microsecond=0)
+        created = snowflake.to_datetime(snowflake.next_id())
+
+        self.assertGreaterEqual(created, before)
+        self.assertLess((created - before).total_seconds(), 5)
+
+    def test_from_datetime(self):
+        """Do historical ids sort by time and round-trip to the millisecond?"""
+
+        early = snowflake.from_datetime(datetime(2017, 1, 1, 12), sequence=5)
+        late = snowflake.from_datetime(datetime(2017, 1, 1, 12, 0, 0, 1000))
+
+        self.assertLess(early, late)
+        self.assertEqual(snowflake.to_datetime(early), datetime(2017, 1, 1, 12))
+
+    def test_forked_worker_needs_its_own_id(self):
+        """Does a child that inherited SNOWFLAKE_WORKER_ID refuse to make ids
+        until it is given its own?"""
+
+        self.addCleanup(snowflake.set_worker_id, snowflake._generator.worker_id)
+
+        with mock.patch.dict(os.environ, SNOWFLAKE_WORKER_ID="7"):
+            snowflake._reset_after_fork()
+
+        with self.assertRaises(RuntimeError):
+            snowflake.next_id()
+
+        snowflake.set_worker_id(8)
+        self.assertEqual((snowflake.next_id() >> snowflake.SEQUENCE_BITS) & snowflake.MAX_WORKER_ID, 8)
+
+        with self.assertRaises(ValueError):
+            snowflake.set_worker_id(snowflake.MAX_WORKER_ID + 1)
@@ -0,0 +1,105 @@
+"""Follow suggestion tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_suggestions.py
+
+
+from models import db, User, Follows, FollowSuggestion
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import dal
+import suggestions
+
+
+class SuggestionsTestCase(DatabaseTestCase):
+    """Test friends-of-friends scoring, storage and the homepage sidebar."""
+
+    def setUp(self):
+        """u1 follows u2 and u3, who both follow u4; u3 also follows u5."""
+
+        super().setUp()
+
+        self.users = [User(email=f"test{i}@test.com", username=f"testuser{i}",
+                           password="HASHED_PASSWORD") for i in range(7)]
+        db.session.add_all(self.users)
+        db.session.commit()
+        self.ids = [user.id for user in self.users]
+
+        for follower, followed in [(1, 2), (1, 3), (2, 4), (3, 4), (3, 5)]:
+            self.follow(follower, followed)
+        db.session.commit()
+
+    def follow(self, follower, followed, confirmed=False):
+        db.session.add(Follows(user_following_id=self.ids[follower],
+                               user_being_followed_id=self.ids[followed],
+                               following_confirmed_status=confirmed))
+
+    def stored(self, user):
+        return [(row.suggested_user_id, row.score) for row in
+                FollowSuggestion.query
+                .filter_by(user_id=self.ids[user])
+                .order_by(FollowSuggestion.score.desc(), FollowSuggestion.suggested_user_id)]
+
+    def test_friends_of_friends(self):
+        """Are friends of friends ranked by how many friends follow them?"""
+
+        self.assertEqual(suggestions.compute(block_size=2), 5)
+
+        self.assertEqual(self.stored(1), [(self.ids[4], 2), (self.ids[5], 1)])
+        self.assertEqual(self.stored(4), [])
+
+    def test_skips_followed_and_private(self):
+        """Are followed users, and unconfirmed follows of private users, left out?"""
+
+        self.follow(1, 5)
+        self.users[4].private = True
+        db.session.commit()
+
+        suggestions.compute()
+
+        self.assertEqual(self.stored(1), [])
+
+    def test_top_k(self):
+        """Are only the k best suggestions stored?"""
+
+        suggestions.compute(k=1)
+
+        self.assertEqual(self.stored(1), [(self.ids[4], 2)])
+
+    def test_changed_users(self):
+        """Does an incremental run recompute only users a new follow affects?"""
+
+        suggestions.compute()
+        self.follow(5, 6)
+        db.session.commit()
+
+        since = suggestions.last_computed()
+        db.session.query(Follows).filter_by(user_following_id=self.ids[5]).update(
+            {'created_at': since.replace(year=since.year + 1)})
+        db.session.commit()
+
+        self.assertEqual(suggestions.changed_user_ids(since), {self.ids[3], self.ids[5]})
+        self.assertEqual(suggestions.compute_changed(), 2)
+        self.assertEqual(self.stored(3), [(self.ids[6], 1)])
+
+    def test_homepage_sidebar(self):
+        """Does the homepage show suggestions not followed since the run?"""
+
+        suggestions.compute()
+        self.follow(1, 5)
+        db.session.commit()
+
+        self.assertEqual([author.id for author in dal.suggested_users(self.ids[1], 5)],
+                         [self.ids[4]])
+
+        with app.test_client() as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.ids[1]
+            resp = c.get("/")
+
+        html = resp.get_data(as_text=True)
+        self.assertIn("Who to follow", html)
+        self.assertIn("@testuser4", html)
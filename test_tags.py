@@ -0,0 +1,122 @@
+"""Tag and mention index tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_tags.py
+
+
+from models import db, User, Message, MessageTag, MessageMention, Follows
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+import tags
+
+
+class TagsTestCase(DatabaseTestCase):
+    """Test indexing tags and mentions and the pages listing them."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.client = app.test_client()
+
+        self.alice = User.signup(username="alice", email="alice@test.com",
+                                 password="password", image_url=None)
+        self.bob = User.signup(username="bob", email="bob@test.com",
+                               password="password", image_url=None)
+        db.session.commit()
+
+        self.alice_id, self.bob_id = self.alice.id, self.bob.id
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user_id
+
+    def post(self, text):
+        resp = self.client.post("/messages/new", json={"text": text})
+        self.assertEqual(resp.status_code, 201)
+        return int(resp.json['message']['id'])
+
+    def test_extract(self):
+        """Are tags and mentions found, but not inside words or entities?"""
+
+        text = "#Flask and #flask, @bob@alice mail@example.com a#b &#39; #ünï"
+
+        self.assertEqual(tags.extract_tags(text), {"flask", "ünï"})
+        self.assertEqual(tags.extract_mentions(text), {"bob"})
+
+    def test_index_on_post(self):
+        """Does posting a message index its tags and known mentions?"""
+
+        self.login(self.alice_id)
+        message_id = self.post("#Python tips for @bob and @nobody #python")
+
+        self.assertEqual([(row.tag, row.message_id) for row in MessageTag.query],
+                         [("python", message_id)])
+        self.assertEqual([(row.user_id, row.message_id) for row in MessageMention.query],
+                         [(self.bob_id, message_id)])
+
+        # deleting the message removes its rows
+        self.client.post(f"/messages/{message_id}/delete")
+        self.assertEqual(MessageTag.query.count(), 0)
+        self.assertEqual(MessageMention.query.count(), 0)
+
+    def test_tag_page(self):
+        """Does /tags/<tag> page through tagged messages, newest first?"""
+
+        self.login(self.alice_id)
+        ids = [self.post(f"#warbler number {i}") for i in range(5)]
+        self.post("untagged")
+
+        resp = self.client.get("/tags/Warbler?limit=3")
+        html = resp.get_data(as_text=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("number 4", html)
+        self.assertIn("number 2", html)
+        self.assertNotIn("number 1", html)
+        self.assertIn(f"?limit=3&amp;before={ids[2]}", html)
+        self.assertIn('<a href="/tags/warbler">#warbler</a>', html)
+
+        html = self.client.get(f"/tags/warbler?limit=3&before={ids[2]}").get_data(as_text=True)
+        self.assertIn("number 1", html)
+        self.assertIn("number 0", html)
+        self.assertNotIn("number 2", html)
+        self.assertNotIn("before=", html)
+
+    def test_mentions_visibility(self):
+        """Does the mentions timeline hide private authors' messages?"""
+
+        User.query.get(self.alice_id).private = True
+        db.session.commit()
+
+        self.login(self.alice_id)
+        self.post("hello @bob")
+
+        self.login(self.bob_id)
+        self.assertNotIn("hello", self.client.get(f"/users/{self.bob_id}/mentions").get_data(as_text=True))
+
+        db.session.add(Follows(user_following_id=self.bob_id, user_being_followed_id=self.alice_id,
+                               following_confirmed_status=True))
+        db.session.commit()
+        self.assertIn("hello", self.client.get(f"/users/{self.bob_id}/mentions").get_data(as_text=True))
+
+    def test_backfill(self):
+        """Does the backfill index old messages, and is it safe to re-run?"""
+
+        db.session.add_all([Message(text=f"#old @bob {i}", user_id=self.alice_id) for i in range(5)])
+        db.session.commit()
+
+        batches = []
+        self.assertEqual(tags.backfill(batch_size=2, progress=lambda last_id, done: batches.append(done)), 5)
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(tags.backfill(), 5)
+
+        self.assertEqual(MessageTag.query.filter_by(tag="old").count(), 5)
+        self.assertEqual(MessageMention.query.filter_by(user_id=self.bob_id).count(), 5)
+
+    def test_link_tags(self):
+        """Are tags linked, and the rest of the text escaped?"""
+
+        self.assertEqual(str(tags.link_tags("<b>#Hi</b> it's")),
+                         '&lt;b&gt;<a href="/tags/hi">#Hi</a>&lt;/b&gt; it&#39;s')
@@ -0,0 +1,154 @@
+"""Trending tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_trending.py
+
+
+from unittest import mock
+
+from models import db, User, Message, TrendingCheckpoint
+
+from db_harness import DatabaseTestCase
+
+from app import app, CURR_USER_KEY
+from trending import DecayedTopK, SeenPairs, Trending, trending
+
+HOUR = 3600
+
+
+class DecayedTopKTestCase(DatabaseTestCase):
+    """Test the decayed count-min sketch and its top keys."""
+
+    def test_heavy_hitters(self):
+        """Are the most counted keys on top, in order?"""
+
+        counter = DecayedTopK(half_life=HOUR, capacity=5, epoch=0)
+        for key in range(1, 50):
+            counter.add(key, weight=key % 7, now=10)
+
+        top = sorted(counter.top, key=lambda key: counter.score(key, 10), reverse=True)
+        self.assertEqual(len(counter.top), 5)
+        self.assertEqual(counter.score(top[0], 10), 6)
+        self.assertTrue(all(key % 7 == 6 for key in top))
+
+    def test_decay(self):
+        """Do counts halve every half-life, across rebases?"""
+
+        counter = DecayedTopK(half_life=HOUR, epoch=0)
+        counter.add(1, weight=8, now=0)
+
+        self.assertAlmostEqual(counter.score(1, now=2 * HOUR), 2)
+
+        counter.add(2, weight=1, now=100 * HOUR)
+        self.assertGreater(counter.epoch, 0)
+        self.assertAlmostEqual(counter.score(2, now=101 * HOUR), 0.5)
+
+    def test_state_and_merge(self):
+        """Does a counter survive a checkpoint and add up with another?"""
+
+        one = DecayedTopK(half_life=HOUR, epoch=0)
+        one.add(1, weight=3, now=0)
+        two = DecayedTopK.from_state(one.to_state())
+        two.add(1, weight=1, now=HOUR)
+
+        merged = DecayedTopK(half_life=HOUR, epoch=HOUR)
+        merged.merge(one)
+        merged.merge(two)
+
+        self.assertAlmostEqual(two.score(1, now=HOUR), 2.5)
+        self.assertAlmostEqual(merged.score(1, now=HOUR), 4)
+        self.assertIn(1, merged.top)
+
+    def test_seen_pairs(self):
+        """Is a pair seen again within a period, and forgotten after two?"""
+
+        seen = SeenPairs(period=HOUR, bits=1 << 12, now=0)
+
+        self.assertTrue(seen.add(1, 2 ** 62, now=0))
+        self.assertFalse(seen.add(1, 2 ** 62, now=HOUR))
+        self.assertTrue(seen.add(2, 2 ** 62, now=HOUR))
+        self.assertTrue(seen.add(1, 2 ** 62, now=3 * HOUR))
+
+
+class TrendingViewsTestCase(DatabaseTestCase):
+    """Test recording events from the app and serving /trending."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.users = [User.signup(username=f"testuser{i}", email=f"test{i}@test.com",
+                                  password="password", image_url=None) for i in range(3)]
+        self.users[2].private = True
+        db.session.commit()
+        self.ids = [user.id for user in self.users]
+
+        self.messages = [Message(text=f"message {i}", user_id=user_id)
+                         for i, user_id in enumerate(self.ids)]
+        db.session.add_all(self.messages)
+        db.session.commit()
+        self.message_ids = [msg.id for msg in self.messages]
+
+        self.client = app.test_client()
+
+    def post_as(self, user_id, url):
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+            return c.post(url)
+
+    def test_likes_and_follows(self):
+        """Do likes and follows of public users show up on /trending?"""
+
+        self.post_as(self.ids[1], f"/users/add_like/{self.message_ids[0]}")
+        self.post_as(self.ids[0], f"/users/add_like/{self.message_ids[2]}")
+        self.post_as(self.ids[0], f"/users/follow/{self.ids[1]}")
+
+        data = self.client.get("/api/trending").json
+        self.assertEqual([msg['id'] for msg in data['messages']], [str(self.message_ids[0])])
+        self.assertEqual([user['id'] for user in data['users']], [self.ids[1], self.ids[0]])
+
+        html = self.client.get("/trending").get_data(as_text=True)
+        self.assertIn("message 0", html)
+        self.assertNotIn("message 2", html)
+
+    def test_checkpoint_restart(self):
+        """Does a restarted worker pick up the counts of the checkpoints?"""
+
+        self.post_as(self.ids[1], f"/users/add_like/{self.message_ids[0]}")
+        trending.checkpoint()
+        self.assertEqual(TrendingCheckpoint.query.count(), 1)
+
+        with mock.patch.object(Trending, 'worker', "restarted:1"):
+            restarted = Trending()
+            top = restarted.top('messages', 10)
+
+        self.assertEqual([message_id for message_id, score in top], [self.message_ids[0]])
+        self.assertAlmostEqual(top[0][1], 1, places=2)
+
+    def test_like_toggles_count_once(self):
+        """Does liking, unliking and liking again count one like?"""
+
+        for i in range(3):
+            self.post_as(self.ids[1], f"/users/add_like/{self.message_ids[0]}")
+
+        top = trending.top('messages', 10)
+        self.assertEqual([message_id for message_id, score in top], [self.message_ids[0]])
+        self.assertAlmostEqual(top[0][1], 1, places=2)
+
+    def test_recycled_worker_takes_over_its_checkpoint(self):
+        """Does a worker restarted in the same slot take over the slot's
+        checkpoint, rather than adding a row?"""
+
+        self.post_as(self.ids[1], f"/users/add_like/{self.message_ids[0]}")
+        trending.checkpoint()
+
+        restarted = Trending()
+        restarted.checkpoints = False
+        self.assertAlmostEqual(restarted.counters['messages'].score(self.message_ids[0]), 0)
+        top = restarted.top('messages', 10)
+        restarted.checkpoint()
+
+        self.assertAlmostEqual(restarted.counters['messages'].score(self.message_ids[0]), 1, places=2)
+        self.assertEqual([message_id for message_id, score in top], [self.message_ids[0]])
+        self.assertEqual(TrendingCheckpoint.query.count(), 1)
@@ -5,39 +5,27 @@
 #    python -m unittest test_user_model.py
 
 
-import os
-from unittest import TestCase
+from models import db, User, Message, Follows, message_visible_to
 
-from models import db, User, Message, Follows
+# BEFORE we import our app, import the test harness: it points the app
+# at the test database and creates our tables (once for all tests ---
+# each test runs in a transaction that is rolled back afterwards)
 
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+from db_harness import DatabaseTestCase
 
 
 # Now we can import app
 
 from app import app
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
 
-
-class UserModelTestCase(TestCase):
+class UserModelTestCase(DatabaseTestCase):
     """Test views for messages."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
-        Follows.query.delete()
+        super().setUp()
 
         self.client = app.test_client()
 
@@ -230,4 +218,35 @@ class UserModelTestCase(TestCase):
 
         # Authentication fails
         self.assertFalse(auth1)
-        self.assertFalse(auth2)
\ No newline at end of file
+        self.assertFalse(auth2)
+
+
+    def test_private_user_visibility(self):
+        """Are a private user's messages visible only to confirmed followers?"""
+
+        u1 = User(email="test1@test.com", username="testuser1", password="HASHED_PASSWORD", private=True)
+        u2 = User(email="test2@test.com", username="testuser2", password="HASHED_PASSWORD")
+        u3 = User(email="test3@test.com", username="testuser3", password="HASHED_PASSWORD")
+
+        db.session.add_all([u1, u2, u3])
+        db.session.commit()
+
+        db.session.add(Message(text="private message", user_id=u1.id))
+        db.session.add(Follows(user_being_followed_id=u1.id, user_following_id=u2.id,
+                               following_confirmed_status=True))
+        db.session.add(Follows(user_being_followed_id=u1.id, user_following_id=u3.id))
+        db.session.commit()
+
+        def visible_count(viewer_id):
+            return Message.query.filter(message_visible_to(viewer_id)).count()
+
+        # Author and confirmed follower see it; pending follower and anonymous don't
+        self.assertEqual(visible_count(u1.id), 1)
+        self.assertEqual(visible_count(u2.id), 1)
+        self.assertEqual(visible_count(u3.id), 0)
+        self.assertEqual(visible_count(None), 0)
+
+        self.assertTrue(u1.is_visible_to(u2))
+        self.assertFalse(u1.is_visible_to(u3))
+        self.assertTrue(u2.is_visible_to(None))
+        self.assertEqual(u1.pending_followers(), [u3])
@@ -5,43 +5,34 @@
 #    FLASK_ENV=production python -m unittest test_message_views.py
 
 
-import os
-from unittest import TestCase
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 
-from models import db, connect_db, Message, User
+from models import db, connect_db, Message, User, Follows
 
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
+# BEFORE we import our app, import the test harness: it points the app
+# at the test database and creates our tables (once for all tests ---
+# each test runs in a transaction that is rolled back afterwards)
 
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+from db_harness import DatabaseTestCase
 
 
 # Now we can import app
 
 from app import app, CURR_USER_KEY
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
-
 # Don't have WTForms use CSRF at all, since it's a pain to test
 
 app.config['WTF_CSRF_ENABLED'] = False
 
 
-class UserViewTestCase(TestCase):
+class UserViewTestCase(DatabaseTestCase):
     """Test views for users."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
+        super().setUp()
 
         self.client = app.test_client()
 
@@ -221,3 +212,103 @@ class UserViewTestCase(TestCase):
 
             self.assertIn('<div class="home-hero">', html)
             self.assertIn("<h1>What\'s Happening?</h1>", html)
+
+
+    def test_following_api_pagination(self):
+        """Is the following list paged with a cursor, newest first?"""
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            others = [User.signup(username=f"other{i}", email=f"other{i}@test.com",
+                                  password="password", image_url=None)
+                      for i in range(3)]
+            db.session.commit()
+
+            for other in others:
+                db.session.add(Follows(user_being_followed_id=other.id,
+                                       user_following_id=self.testuser.id))
+            db.session.commit()
+
+            resp = c.get(f"/api/users/{self.testuser.id}/following?limit=2")
+            first = resp.get_json()
+
+            self.assertEqual(len(first['users']), 2)
+            self.assertIsNotNone(first['next'])
+
+            self.assertIn("limit=2", first['next_url'])
+            self.assertIn(f"before={first['next']}", first['next_url'])
+
+            resp = c.get(first['next_url'])
+            second = resp.get_json()
+
+            self.assertEqual(len(second['users']), 1)
+            self.assertIsNone(second['next'])
+            self.assertIsNone(second['next_url'])
+
+            ids = {user['id'] for user in first['users'] + second['users']}
+            self.assertEqual(ids, {other.id for other in others})
+
+            # the page's "More" link keeps the limit too
+            html = c.get(f"/users/{self.testuser.id}/following?limit=2").get_data(as_text=True)
+            self.assertIn(f"/users/{self.testuser.id}/following?limit=2&amp;before={first['next']}", html)
+
+    def test_follow_touches_one_edge(self):
+        """Do follow and unfollow leave the viewer's following list unloaded?"""
+
+        others = [User.signup(username=f"other{i}", email=f"other{i}@test.com",
+                              password="password", image_url=None)
+                  for i in range(3)]
+        db.session.commit()
+        user_id, (first_id, *other_ids) = self.testuser.id, [other.id for other in others]
+
+        for other_id in other_ids:
+            db.session.add(Follows(user_being_followed_id=other_id, user_following_id=user_id))
+        db.session.commit()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+
+            # twice each, as from a stale button
+            for url in [f"/users/follow/{first_id}"] * 2 + [f"/users/stop-following/{first_id}"] * 2:
+                self.assertEqual(c.post(url).status_code, 302)
+
+        # the relationship load joins users to follows
+        self.assertFalse([statement for statement in statements if "FROM users, follows" in statement])
+        self.assertEqual(Follows.query.filter_by(user_following_id=user_id).count(), 2)
+
+    def test_pending_followers_paged(self):
+        """Are follow requests shown a page at a time, and marked among the followers?"""
+
+        others = [User.signup(username=f"other{i}", email=f"other{i}@test.com",
+                              password="password", image_url=None)
+                  for i in range(3)]
+        db.session.commit()
+        user_id, other_ids = self.testuser.id, [other.id for other in others]
+
+        for other_id in other_ids:
+            db.session.add(Follows(user_being_followed_id=user_id, user_following_id=other_id))
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = user_id
+
+            html = c.get(f"/users/{user_id}?limit=2").get_data(as_text=True)
+            self.assertEqual(html.count("/users/accept-follower/"), 2)
+            self.assertIn("All follow requests", html)
+
+            c.post(f"/users/accept-follower/{other_ids[0]}")
+            html = c.get(f"/users/{user_id}/followers").get_data(as_text=True)
+            self.assertEqual(html.count("/users/accept-follower/"), 2)
+            self.assertNotIn(f"/users/accept-follower/{other_ids[0]}\"", html)
@@ -0,0 +1,415 @@
+"""Trending messages and users from a stream of like, post and follow events.
+
+Each event adds a weight to a count-min sketch of exponentially decayed
+counts (half-life TRENDING_HALF_LIFE); the best-scoring keys are kept in a
+small min-heap. Recording an event and listing the top keys both take
+constant time, however many messages and users there are.
+
+Decay uses "forward decay": an event at time t adds weight * e^(r(t - t0))
+for a fixed epoch t0, so stored counts never need decaying; scores are
+scaled back by e^(-r(now - t0)) when read, and the epoch is moved forward
+before the exponent gets large.
+
+A like counts once per (user, message): toggling a like off and on again
+adds nothing. Pairs already counted are kept in two rotating Bloom filters
+(`SeenPairs`), so a like is counted again only after one to two
+half-lives, once the first has mostly decayed. The filters are per
+process, so a user reaching several workers can count at most once on
+each.
+
+Each worker process counts its own events. A background thread
+checkpoints its counters to the `trending_checkpoints` table every
+TRENDING_CHECKPOINT_INTERVAL seconds, then reloads the other workers'
+latest checkpoints, which are added to its own counts. So every worker
+sees (nearly) site-wide trends. Checkpoints are keyed by host and
+Snowflake worker id, which gunicorn assigns per worker slot (see
+gunicorn.conf.py). A worker recycled into a slot takes over the slot's
+checkpoint as its own counts, rather than adding another row.
+"""
+
+import base64
+import heapq
+import json
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timedelta
+
+from models import db, TrendingCheckpoint
+import snowflake
+
+# event weights
+LIKE_WEIGHT = 1.0
+POST_WEIGHT = 0.5
+FOLLOW_WEIGHT = 2.0
+
+DEFAULT_HALF_LIFE = 6 * 3600
+
+DEFAULT_CHECKPOINT_INTERVAL = 300
+
+# checkpoints this many half-lives old count for less than 0.1% and are deleted
+CHECKPOINT_LIFETIME = 10
+
+# sketch size: overestimates are at most ~e/width of the total count, with
+# probability 1 - e^-depth
+DEFAULT_WIDTH = 2048
+DEFAULT_DEPTH = 4
+
+# keys tracked in the heap; more than are ever shown, so that keys near
+# the bottom of the list aren't lost to eviction
+DEFAULT_CAPACITY = 200
+
+# move the epoch forward once e^(r(now - t0)) exceeds e^MAX_EXPONENT
+MAX_EXPONENT = 30
+
+# rebuild the heap when it holds this many times `capacity` stale entries
+HEAP_SLACK = 4
+
+# (a, b) of the hash ((a * key + b) mod p) mod width of each row
+MERSENNE_PRIME = 2 ** 61 - 1
+ROW_HASHES = [(0x5bd1e995 + 2 * row * 0x9e3779b9 | 1, 0x27d4eb2f * (row + 1)) for row in range(16)]
+
+# bits and hashes of each SeenPairs filter: 1 MiB each, ~0.2% false
+# positives at 500,000 likes per half-life
+SEEN_BITS = 1 << 23
+SEEN_HASHES = 4
+
+
+class SeenPairs:
+    """Approximate set of (int, int) pairs added in the last one to two
+    `period`s: two Bloom filters, the older dropped every `period`.
+
+    False positives (a pair taken as seen) are possible; false negatives
+    are not, within a period.
+    """
+
+    def __init__(self, period, bits=SEEN_BITS, hashes=SEEN_HASHES, now=None):
+        self.period = period
+        self.bits = bits
+        self.hashes = hashes
+        self.current = bytearray(bits // 8)
+        self.previous = bytearray(bits // 8)
+        self.rotated_at = time.time() if now is None else now
+
+    def _bits(self, first, second):
+        key = (first << 64) | second
+        return [((a * key + b) % MERSENNE_PRIME) % self.bits
+                for a, b in ROW_HASHES[:self.hashes]]
+
+    def add(self, first, second, now=None):
+        """Add the pair; False if it was (probably) there already."""
+
+        now = time.time() if now is None else now
+        if now - self.rotated_at >= self.period:
+            self.previous, self.current = self.current, bytearray(self.bits // 8)
+            self.rotated_at = now
+
+        bits = self._bits(first, second)
+        if any(all(table[bit >> 3] & (1 << (bit & 7)) for bit in bits)
+               for table in (self.current, self.previous)):
+            return False
+
+        for bit in bits:
+            self.current[bit >> 3] |= 1 << (bit & 7)
+        return True
+
+
+class DecayedTopK:
+    """Exponentially decayed counts of int keys, and the top `capacity` keys."""
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE, width=DEFAULT_WIDTH,
+                 depth=DEFAULT_DEPTH, capacity=DEFAULT_CAPACITY, epoch=None):
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.epoch = time.time() if epoch is None else epoch
+        self.table = [array('d', bytes(8 * width)) for row in range(depth)]
+        # key: estimated count, forward-decayed
+        self.top = {}
+        self._heap = []
+
+    def _cells(self, key):
+        return [((a * key + b) % MERSENNE_PRIME) % self.width
+                for a, b in ROW_HASHES[:self.depth]]
+
+    def _estimate(self, key):
+        return min(row[cell] for row, cell in zip(self.table, self._cells(key)))
+
+    def add(self, key, weight=1.0, now=None):
+        """Count `weight` for `key` at time `now`."""
+
+        now = time.time() if now is None else now
+        if self.rate * (now - self.epoch) > MAX_EXPONENT:
+            self.rebase(now)
+
+        increment = weight * math.exp(self.rate * (now - self.epoch))
+        for row, cell in zip(self.table, self._cells(key)):
+            row[cell] += increment
+
+        self._offer(key, self._estimate(key))
+
+    def _offer(self, key, estimate):
+        if key not in self.top and len(self.top) >= self.capacity:
+            lowest, lowest_key = self._lowest()
+            if estimate <= lowest:
+                return
+            del self.top[lowest_key]
+
+        self.top[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+
+        if len(self._heap) > HEAP_SLACK * self.capacity:
+            self._heap = [(score, key) for key, score in self.top.items()]
+            heapq.heapify(self._heap)
+
+    def _lowest(self):
+        # skip entries superseded by a later push for the same key
+        while self.top.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def decay(self, now=None):
+        """Factor from stored counts to counts decayed to `now`."""
+
+        now = time.time() if now is None else now
+        return math.exp(-self.rate * (now - self.epoch))
+
+    def score(self, key, now=None):
+        return self._estimate(key) * self.decay(now)
+
+    def rebase(self, epoch):
+        """Move the epoch to `epoch`, rescaling the stored counts."""
+
+        factor = math.exp(-self.rate * (epoch - self.epoch))
+        for row in self.table:
+            for cell in range(self.width):
+                row[cell] *= factor
+
+        self.top = {key: score * factor for key, score in self.top.items()}
+        self._heap = [(score, key) for key, score in self.top.items()]
+        heapq.heapify(self._heap)
+        self.epoch = epoch
+
+    def merge(self, other):
+        """Add the counts of `other`, a DecayedTopK of the same shape."""
+
+        factor = math.exp(self.rate * (other.epoch - self.epoch))
+        for row, other_row in zip(self.table, other.table):
+            for cell, count in enumerate(other_row):
+                if count:
+                    row[cell] += count * factor
+
+        for key in set(self.top) | set(other.top):
+            self._offer(key, self._estimate(key))
+
+    def to_state(self):
+        """JSON-able state; see `from_state`."""
+
+        table = b''.join(row.tobytes() for row in self.table)
+        return {
+            'half_life': self.half_life,
+            'width': self.width,
+            'depth': self.depth,
+            'capacity': self.capacity,
+            'epoch': self.epoch,
+            'table': base64.b64encode(zlib.compress(table)).decode(),
+            'top': list(self.top.items()),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        counter = cls(state['half_life'], state['width'], state['depth'],
+                      state['capacity'], state['epoch'])
+
+        table = zlib.decompress(base64.b64decode(state['table']))
+        row_size = 8 * counter.width
+        counter.table = [array('d', table[row * row_size:(row + 1) * row_size])
+                         for row in range(counter.depth)]
+        for key, score in state['top']:
+            counter._offer(key, score)
+
+        return counter
+
+
+class Trending:
+    """Trending messages and users: this worker's counts plus its peers'.
+
+    The checkpointing thread is started lazily on the first event or
+    read, so it is never created in a process that forks afterwards.
+    """
+
+    def __init__(self, app=None, half_life=DEFAULT_HALF_LIFE,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        self.app = app
+        self.enabled = True
+        self.checkpoints = True
+        self.half_life = half_life
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.RLock()
+        self.reset()
+
+        if app is not None:
+            self.init_app(app)
+
+        # a forked worker must not checkpoint its parent's counts as its own
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('TRENDING_ENABLED', True)
+        self.checkpoints = app.config.setdefault('TRENDING_CHECKPOINTS', True)
+        self.half_life = app.config.setdefault('TRENDING_HALF_LIFE', self.half_life)
+        self.checkpoint_interval = app.config.setdefault(
+            'TRENDING_CHECKPOINT_INTERVAL', self.checkpoint_interval)
+        app.extensions['trending'] = self
+        self.reset()
+
+    def reset(self):
+        """Forget all counts (this worker's and its peers')."""
+
+        with self._lock:
+            self.counters = {'messages': DecayedTopK(self.half_life),
+                             'users': DecayedTopK(self.half_life)}
+            self.peers = None
+            self._likes = SeenPairs(self.half_life)
+            self._thread = None
+
+    @property
+    def worker(self):
+        return f"{socket.gethostname()}:{snowflake.worker_id()}"
+
+    def record_like(self, message, user_id):
+        """Count `user_id`'s like of `message`, unless already counted."""
+
+        if message.user.private:
+            return
+
+        with self._lock:
+            first = self._likes.add(user_id, message.id)
+
+        if first:
+            self._record(('messages', message.id, LIKE_WEIGHT),
+                         ('users', message.user_id, LIKE_WEIGHT))
+
+    def record_post(self, message):
+        if not message.user.private:
+            self._record(('users', message.user_id, POST_WEIGHT))
+
+    def record_follow(self, followed_user):
+        if not followed_user.private:
+            self._record(('users', followed_user.id, FOLLOW_WEIGHT))
+
+    def _record(self, *events):
+        """Count `events`."""
+
+        if not self.enabled:
+            return
+
+        self._ensure_peers()
+
+        with self._lock:
+            for name, key, weight in events:
+                self.counters[name].add(key, weight)
+
+    def top(self, name, k):
+        """[(key, score)] of the `k` best `name` ('messages' or 'users')."""
+
+        self._ensure_peers()
+
+        with self._lock:
+            own, peers = self.counters[name], self.peers[name]
+            now = time.time()
+
+            scores = {key: own.score(key, now) + peers.score(key, now)
+                      for key in set(own.top) | set(peers.top)}
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _ensure_peers(self):
+        """Load the checkpoints once per process, on its first event or
+        read, taking over this worker slot's own checkpoint."""
+
+        if self.peers is None:
+            peers, own = self._read_checkpoints()
+
+            with self._lock:
+                if self.peers is None:
+                    for name, state in own.items():
+                        self.counters[name].merge(DecayedTopK.from_state(state))
+                    self.peers = peers
+
+        self._start()
+
+    def _read_checkpoints(self):
+        """(Merged counters of the other workers, state of this worker's own
+        checkpoint); reads and merges without holding the lock."""
+
+        now = time.time()
+        peers = {name: DecayedTopK(self.half_life, epoch=now) for name in self.counters}
+        own = {}
+
+        for checkpoint in TrendingCheckpoint.query:
+            states = json.loads(checkpoint.state)
+            if checkpoint.worker == self.worker:
+                own = states
+                continue
+            for name, state in states.items():
+                peers[name].merge(DecayedTopK.from_state(state))
+
+        return peers, own
+
+    def checkpoint(self):
+        """Save this worker's counts, drop expired checkpoints and reload
+        the other workers' counts."""
+
+        with self._lock:
+            state = json.dumps({name: counter.to_state()
+                                for name, counter in self.counters.items()})
+
+        db.session.merge(TrendingCheckpoint(worker=self.worker, state=state,
+                                            saved_at=datetime.utcnow()))
+
+        expired = datetime.utcnow() - timedelta(seconds=CHECKPOINT_LIFETIME * self.half_life)
+        (TrendingCheckpoint
+         .query
+         .filter(TrendingCheckpoint.saved_at < expired)
+         .delete(synchronize_session=False))
+
+        db.session.commit()
+
+        peers = self._read_checkpoints()[0]
+
+        with self._lock:
+            self.peers = peers
+
+    def _start(self):
+        if not self.checkpoints:
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="warbler-trending", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.checkpoint_interval)
+            with self.app.app_context():
+                try:
+                    self.checkpoint()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Trending checkpoint failed")
+                finally:
+                    db.session.remove()
+
+
+trending = Trending()
@@ -0,0 +1,9 @@
+"""Warbler's views, one blueprint per area of the site.
+
+Blueprints have no URL prefix, so URLs are the same as before the split;
+endpoints are named "<blueprint>.<view>", e.g. url_for('users.users_show').
+"""
+
+from views import admin, api, auth, home, messages, tags, users
+
+BLUEPRINTS = (auth.bp, users.bp, messages.bp, tags.bp, api.bp, admin.bp, home.bp)
@@ -0,0 +1,83 @@
+"""Logged-in user, access checks and helpers shared by the views."""
+
+import functools
+
+from flask import session, g, flash, redirect
+
+from models import User
+import dal
+from prewarm import timeline_prewarmer
+
+CURR_USER_KEY = "curr_user"
+
+# set by do_login until the next homepage, which is timed (see prewarm.py)
+FIRST_LOAD_KEY = "first_load"
+
+
+def add_user_to_g():
+    """If we're logged in, add curr user to Flask global."""
+
+    if CURR_USER_KEY in session:
+        g.user = User.query.get(session[CURR_USER_KEY])
+
+        if g.user and g.user.is_deleted:
+            g.user = None
+
+    else:
+        g.user = None
+
+
+def viewer_id():
+    """Id of the logged-in user, or None; for `message_visible_to`."""
+
+    return g.user.id if g.user else None
+
+
+def follow_statuses(*user_lists):
+    """How the logged-in user follows each listed user, for the user cards.
+
+    {user id: True (following), False (request pending)}; one query for
+    the whole page rather than one per card.
+    """
+
+    if not g.user:
+        return {}
+
+    return dal.follow_statuses(g.user.id, {user.id for users in user_lists for user in users})
+
+
+def do_login(user):
+    """Log in user, and start pre-warming their homepage."""
+
+    session[CURR_USER_KEY] = user.id
+    session[FIRST_LOAD_KEY] = True
+    timeline_prewarmer.submit(user.id)
+
+
+def do_logout():
+    """Logout user."""
+
+    if CURR_USER_KEY in session:
+        del session[CURR_USER_KEY]
+
+
+def check_loggedin(func):
+    @functools.wraps(func)
+    def wrapper_check_loggedin(*args, **kwargs):
+        if not g.user:
+            flash("Access unauthorized. Log in to account to access content.", "danger")
+            return redirect("/")
+        value = func(*args, **kwargs)
+        return value
+    return wrapper_check_loggedin
+
+
+def is_admin(func):
+    @functools.wraps(func)
+    def wrapper_is_admin(*args, **kwargs):
+        if not g.user or not g.user.admin:
+            flash("Access unauthorized. Admin access only.", "danger")
+            return redirect("/")
+        value = func(*args, **kwargs)
+        return value
+    return wrapper_is_admin
@@ -0,0 +1,141 @@
+"""Admin-only views: deleting users, bulk moderation, purge progress,
+login pre-warming, request profiles and slow queries."""
+
+import os
+
+from flask import Blueprint, request, flash, redirect, jsonify, url_for, abort, current_app, send_file
+
+from models import User
+from purge import purge_worker, delete_account
+import moderation
+from moderation import moderation_worker
+from profiler import profiler
+from prewarm import timeline_prewarmer
+from slowlog import slow_query_log
+from views.access import check_loggedin, is_admin
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/users/<int:user_id>/delete', methods=["POST"])
+@check_loggedin
+@is_admin
+def delete_user(user_id):
+    """Delete user by admin only."""
+
+    user = User.query.get_or_404(user_id)
+
+    if delete_account(user):
+        flash(f"{user.username} deleted. Messages are being purged.", "success")
+
+    return redirect(url_for('home.homepage'))
+
+
+@bp.route('/admin/purges')
+@check_loggedin
+@is_admin
+def purge_progress():
+    """Report progress of background account purges (admin only)."""
+
+    return jsonify(purges=purge_worker.progress())
+
+
+@bp.route('/admin/moderation/preview', methods=["POST"])
+@check_loggedin
+@is_admin
+def moderation_preview():
+    """Count the messages and accounts that moderation filters select
+    (admin only); see moderation.py."""
+
+    try:
+        filters = moderation.parse_filters(request.get_json(silent=True))
+    except moderation.BadRequest as exc:
+        return jsonify(error=str(exc)), 400
+
+    return jsonify(moderation.preview(filters))
+
+
+@bp.route('/admin/moderation', methods=["POST"])
+@check_loggedin
+@is_admin
+def moderation_submit():
+    """Start hiding, unhiding or deleting what moderation filters select,
+    e.g. {"action": "hide", "pattern": "spam"} (admin only).
+
+    Responds with the job; follow it at /admin/moderation.
+    """
+
+    data = request.get_json(silent=True)
+
+    try:
+        filters = moderation.parse_filters(data)
+        job = moderation_worker.submit(data.get('action'), filters)
+    except moderation.BadRequest as exc:
+        return jsonify(error=str(exc)), 400
+
+    return jsonify(job=job.to_dict()), 202
+
+
+@bp.route('/admin/moderation')
+@check_loggedin
+@is_admin
+def moderation_progress():
+    """Report progress of bulk moderation jobs (admin only)."""
+
+    return jsonify(jobs=moderation_worker.progress())
+
+
+@bp.route('/admin/prewarm')
+@check_loggedin
+@is_admin
+def prewarm_stats():
+    """Report login pre-warming: cache outcomes and cold versus warm
+    first homepage latencies (admin only)."""
+
+    return jsonify(timeline_prewarmer.stats())
+
+
+@bp.route('/admin/profiles')
+@check_loggedin
+@is_admin
+def list_profiles():
+    """List the slowest profiled requests per endpoint (admin only)."""
+
+    return jsonify(profiles=profiler.slowest())
+
+
+@bp.route('/admin/profiles/<name>')
+@check_loggedin
+@is_admin
+def show_profile(name):
+    """Download a pstats file, or with ?format=text its top functions
+    by cumulative time (admin only)."""
+
+    try:
+        path = profiler.path(name)
+    except ValueError:
+        abort(404)
+
+    if not os.path.exists(path):
+        abort(404)
+
+    if request.args.get('format') == 'text':
+        return current_app.response_class(profiler.summary(name), mimetype='text/plain')
+
+    return send_file(path, mimetype='application/octet-stream',
+                     as_attachment=True, attachment_filename=name)
+
+
+@bp.route('/admin/slow-queries')
+@check_loggedin
+@is_admin
+def slow_queries():
+    """Report this worker's slow statements with their plans, or with
+    ?format=download the same JSON as a file (admin only)."""
+
+    response = jsonify(slow_query_log.report())
+
+    if request.args.get('format') == 'download':
+        response.headers['Content-Disposition'] = 'attachment; filename=slow-queries.json'
+
+    return response
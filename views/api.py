@@ -0,0 +1,76 @@
+"""JSON API: keyset-paginated follow and like lists, trending."""
+
+from flask import Blueprint, jsonify, abort
+
+from models import User
+import blobstore
+from pagination import page_url
+from trending import trending
+from views.access import check_loggedin
+from views.home import TRENDING_SHOWN
+from views.users import following_page, followers_page, likes_page
+
+bp = Blueprint('api', __name__)
+
+
+def user_json(user, **extra):
+    return dict({'id': user.id, 'username': user.username,
+                 'image_url': blobstore.thumbnail_url(user.image_url)}, **extra)
+
+
+def message_json(msg):
+    return {'id': str(msg.id), 'text': msg.text,
+            'timestamp': msg.timestamp.isoformat(), 'user_id': msg.user_id}
+
+
+def next_page(page):
+    """The cursor of the page after `page`, and its URL with the same limit."""
+
+    return {'next': page.next_cursor,
+            'next_url': page_url(page.next_cursor) if page.next_cursor else None}
+
+
+@bp.route('/api/users/<int:user_id>/following')
+@check_loggedin
+def api_following(user_id):
+    """Page of users this user is following, as JSON."""
+
+    if User.query.get_or_404(user_id).is_deleted:
+        abort(404)
+    page = following_page(user_id)
+
+    return jsonify(users=[user_json(user) for user in page.items], **next_page(page))
+
+
+@bp.route('/api/users/<int:user_id>/followers')
+@check_loggedin
+def api_followers(user_id):
+    """Page of followers of this user, as JSON."""
+
+    if User.query.get_or_404(user_id).is_deleted:
+        abort(404)
+    page = followers_page(user_id)
+
+    return jsonify(users=[user_json(user) for user in page.items], **next_page(page))
+
+
+@bp.route('/api/users/<int:user_id>/likes')
+def api_likes(user_id):
+    """Page of messages liked by this user, as JSON."""
+
+    if User.query.get_or_404(user_id).is_deleted:
+        abort(404)
+    page = likes_page(user_id)
+
+    return jsonify(messages=[message_json(msg) for msg in page.items], **next_page(page))
+
+
+@bp.route('/api/trending')
+def api_trending():
+    """Trending message and user ids with their decayed scores, as JSON."""
+
+    return jsonify(
+        messages=[{'id': str(message_id), 'score': round(score, 3)}
+                  for message_id, score in trending.top('messages', TRENDING_SHOWN)],
+        users=[{'id': user_id, 'score': round(score, 3)}
+               for user_id, score in trending.top('users', TRENDING_SHOWN)])
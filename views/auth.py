@@ -0,0 +1,81 @@
+"""Signup, login and logout."""
+
+from flask import Blueprint, render_template, flash, redirect, url_for
+from sqlalchemy.exc import IntegrityError
+
+from forms import UserAddForm, LoginForm
+from models import db, User
+import blobstore
+from views.access import do_login, do_logout
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/signup', methods=["GET", "POST"])
+def signup():
+    """Handle user signup.
+
+    Create new user and add to DB. Redirect to home page.
+
+    If form not valid, present form.
+
+    If the there already is a user with that username: flash message
+    and re-present form.
+    """
+
+    form = UserAddForm()
+
+    if form.validate_on_submit():
+        try:
+            user = User.signup(
+                username=form.username.data,
+                password=form.password.data,
+                email=form.email.data,
+                image_url=blobstore.store_data_uri(form.image_url.data) or User.image_url.default.arg,
+            )
+            db.session.commit()
+
+        except IntegrityError:
+            flash("Username already taken", 'danger')
+            return render_template('users/signup.html', form=form)
+
+        except ValueError as exc:
+            form.image_url.errors.append(str(exc))
+            return render_template('users/signup.html', form=form)
+
+        do_login(user)
+
+        return redirect("/")
+
+    else:
+        return render_template('users/signup.html', form=form)
+
+
+@bp.route('/login', methods=["GET", "POST"])
+def login():
+    """Handle user login."""
+
+    form = LoginForm()
+
+    if form.validate_on_submit():
+        user = User.authenticate(form.username.data,
+                                 form.password.data)
+
+        if user:
+            do_login(user)
+            flash(f"Hello, {user.username}!", "success")
+            return redirect(url_for('home.homepage'))
+
+        flash("Invalid credentials.", 'danger')
+
+    return render_template('users/login.html', form=form)
+
+
+@bp.route('/logout')
+def logout():
+    """Handle logout of user."""
+
+    do_logout()
+    flash("User logged out.", 'success')
+
+    return redirect(url_for('auth.login'))
@@ -0,0 +1,141 @@
+"""Homepage, trending page, blobs, error pages and response headers."""
+
+import time
+
+from flask import Blueprint, render_template, request, session, g, abort, current_app, send_file
+
+import blobstore
+from prewarm import timeline_prewarmer, load_timeline
+from trending import trending
+from pagination import FEED_PAGE_SIZE, message_cursor, message_page
+import dal
+from views.access import check_loggedin, viewer_id, FIRST_LOAD_KEY
+
+bp = Blueprint('home', __name__)
+
+# Blobs never change, so these responses keep their long-lived cache headers
+CACHEABLE_ENDPOINTS = {'home.show_blob'}
+
+# messages and users listed on /trending
+TRENDING_SHOWN = 10
+
+
+@bp.route('/')
+def homepage():
+    """Show homepage:
+
+    - anon users: no messages
+    - logged in: most recent messages of followed_users, more loaded on
+      scroll from home_fragment; right after login, pre-warmed by prewarm.py
+    """
+
+    if g.user:
+        started = time.perf_counter()
+        first_load = session.pop(FIRST_LOAD_KEY, False)
+
+        timeline = timeline_prewarmer.take(g.user.id) if first_load else None
+        warm = timeline is not None
+        if not warm:
+            timeline = load_timeline(g.user.id)
+
+        response = render_template('home.html', message_list=timeline.messages,
+                                   next_cursor=timeline.next_cursor, liked_ids=timeline.liked_ids,
+                                   suggestions=timeline.suggestions, counts=timeline.counts)
+
+        if first_load:
+            timeline_prewarmer.record_first_load(warm, time.perf_counter() - started)
+
+        return response
+
+    else:
+        return render_template('home-anon.html')
+
+
+@bp.route('/fragments/home')
+@check_loggedin
+def home_fragment():
+    """The homepage feed's page after ?before=<message id>, as message
+    list items for infinite scroll."""
+
+    before = message_cursor()
+    if before is None:
+        abort(400)
+
+    rows = dal.home_feed(dal.feed_author_ids(g.user.id), g.user.id, FEED_PAGE_SIZE + 1, before=before)
+    page = message_page(rows, FEED_PAGE_SIZE)
+
+    return render_template('messages/fragment.html', message_list=page.items,
+                           next_cursor=page.next_cursor, more_url=request.path, show_like_buttons=True,
+                           liked_ids=dal.liked_ids(g.user.id, [msg.id for msg in page.items]))
+
+
+@bp.route('/trending')
+def show_trending():
+    """Show the messages and users trending right now."""
+
+    top_messages = trending.top('messages', TRENDING_SHOWN)
+    top_users = trending.top('users', TRENDING_SHOWN)
+
+    messages = dal.feed_rows_by_ids([message_id for message_id, score in top_messages], viewer_id())
+    users = dal.authors_by_ids([user_id for user_id, score in top_users])
+    liked = dal.liked_ids(g.user.id, [msg.id for msg in messages]) if g.user else set()
+
+    return render_template('trending.html', message_list=messages, user_list=users,
+                           liked_ids=liked)
+
+
+@bp.route('/blobs/<name>')
+@bp.route('/blobs/thumb/<name>', defaults={'variant': blobstore.THUMBNAIL_VARIANT})
+def show_blob(name, variant=None):
+    """Serve a stored image, or its thumbnail, with long-lived caching.
+
+    The blob name is its content digest, so it doubles as a strong ETag.
+    """
+
+    store = blobstore.get_store()
+
+    try:
+        if not store.exists(name):
+            abort(404)
+    except ValueError:
+        abort(404)
+
+    if name in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        try:
+            path = store.thumbnail(name) if variant else store.path(name)
+        except ValueError:
+            abort(404)
+        response = send_file(path, mimetype=blobstore.mimetype_for(name),
+                             add_etags=False, conditional=False)
+
+    response.set_etag(name)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@bp.app_errorhandler(404)
+def page_not_found(e):
+    return render_template('404.html'), 404
+
+
+##############################################################################
+# Turn off all caching in Flask
+#   (useful for dev; in production, this kind of stuff is typically
+#   handled elsewhere)
+#
+# https://stackoverflow.com/questions/34066804/disabling-caching-in-flask
+
+@bp.after_app_request
+def add_header(req):
+    """Add non-caching headers on every request."""
+
+    if request.endpoint in CACHEABLE_ENDPOINTS:
+        return req
+
+    req.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    req.headers["Pragma"] = "no-cache"
+    req.headers["Expires"] = "0"
+    req.headers['Cache-Control'] = 'public, max-age=0'
+    return req
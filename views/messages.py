@@ -0,0 +1,92 @@
+"""Posting, showing, deleting and liking messages."""
+
+from flask import Blueprint, render_template, request, flash, redirect, g, jsonify, url_for
+
+from models import db, Message, message_visible_to
+import blobstore
+import tags
+from feed import feed_engine
+from likebuffer import like_buffer
+from trending import trending
+from views.access import check_loggedin, viewer_id
+
+bp = Blueprint('messages', __name__)
+
+
+@bp.route('/messages/new', methods=["POST"])
+@check_loggedin
+def messages_add():
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+        
+    print(request.json)
+    msg = Message(text=request.json["text"])
+    g.user.messages.append(msg)
+    db.session.flush()
+    tags.index_message(msg)
+    db.session.commit()
+    feed_engine.add(msg)
+    trending.record_post(msg)
+    response_json = jsonify(message={'id': str(msg.id), 
+                                     'text': msg.text, 'timestamp': msg.timestamp.strftime('%d %B %Y'), 
+                                     'user_id': msg.user_id, 'username': msg.user.username, 
+                                     'image_url': blobstore.thumbnail_url(msg.user.image_url)})
+    return (response_json, 201)
+
+
+@bp.route('/messages/<int:message_id>', methods=["GET"])
+def messages_show(message_id):
+    """Show a message."""
+
+    msg = (Message
+           .query
+           .filter(Message.id == message_id, message_visible_to(viewer_id()))
+           .first_or_404())
+    return render_template('messages/show.html', message=msg)
+
+
+@bp.route('/messages/<int:message_id>/delete', methods=["POST"])
+@check_loggedin
+def messages_destroy(message_id):
+    """Delete a message."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    msg = Message.query.get(message_id)
+
+    if msg.user_id != g.user.id and g.user.admin == False:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    feed_engine.remove(msg)
+    db.session.delete(msg)
+    db.session.commit()
+
+    # return redirect(f"/users/{g.user.id}")
+    return redirect(url_for('users.users_show', user_id=g.user.id))
+
+
+@bp.route('/users/add_like/<int:message_id>', methods=["POST"])
+@check_loggedin
+def likes_add(message_id):
+    """Add a like to a message"""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+
+    msg = (Message
+           .query
+           .filter(Message.id == message_id, message_visible_to(g.user.id))
+           .first_or_404())
+
+    # coalesced with other toggles and written in a batch (see likebuffer)
+    liked = like_buffer.toggle(g.user.id, msg.id)
+    if liked:
+        trending.record_like(msg, g.user.id)
+
+    return jsonify({"liked": liked})
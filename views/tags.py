@@ -0,0 +1,43 @@
+"""Tag pages and mention timelines."""
+
+from flask import Blueprint, render_template, request, g, abort
+
+from models import User
+import dal
+import tags
+from views.access import viewer_id
+
+bp = Blueprint('tags', __name__)
+
+
+@bp.route('/tags/<tag>')
+def show_tag(tag):
+    """Show messages tagged #tag, newest first."""
+
+    page = tags.tag_page(tag, viewer_id(), request.args.get('before'))
+
+    liked = set()
+    if g.user:
+        liked = dal.liked_ids(g.user.id, [msg.id for msg in page.items])
+
+    return render_template('tags/show.html', tag=tags.normalize_tag(tag), message_list=page.items,
+                           next_cursor=page.next_cursor, liked_ids=liked)
+
+
+@bp.route('/users/<int:user_id>/mentions')
+def show_mentions(user_id):
+    """Show messages mentioning this user, newest first."""
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    page = tags.mentions_page(user_id, viewer_id(), request.args.get('before'))
+
+    liked = set()
+    if g.user:
+        liked = dal.liked_ids(g.user.id, [msg.id for msg in page.items])
+
+    return render_template('users/mentions.html', user=user, message_list=page.items,
+                           next_cursor=page.next_cursor, liked_ids=liked)
@@ -0,0 +1,434 @@
+"""Profiles, follow lists, follows, account settings and likes pages."""
+
+from flask import (Blueprint, render_template, request, flash, redirect, g, jsonify,
+                   url_for, abort, current_app, stream_with_context)
+
+from forms import UserEditForm, ChangePasswordForm
+from models import db, User, Message, Likes, Follows, message_visible_to
+from purge import delete_account
+import blobstore
+import export
+import importer
+from feed import feed_engine
+from followgraph import follow_graph
+from trending import trending
+from pagination import Page, keyset_page, message_cursor, message_page, FEED_PAGE_SIZE
+import dal
+from views.access import check_loggedin, do_logout, viewer_id, follow_statuses
+
+bp = Blueprint('users', __name__)
+
+
+@bp.route('/users')
+def list_users():
+    """Page with listing of users.
+
+    Can take a 'q' param in querystring to search by that username.
+    """
+
+    search = request.args.get('q')
+
+    users = User.query.filter(User.deleted_at.is_(None))
+
+    if not search:
+        users = users.all()
+    else:
+        users = users.filter(User.username.like(f"%{search}%")).all()
+
+    return render_template('users/index.html', user_list=users, follow_status=follow_statuses(users))
+
+
+@bp.route('/users/<int:user_id>')
+def users_show(user_id):
+    """Show user profile."""
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    # snagging messages in order from the database;
+    # user.messages won't be in order by default
+    page = message_page(dal.profile_feed(user_id, viewer_id(), FEED_PAGE_SIZE + 1), FEED_PAGE_SIZE)
+
+    pending = Page([], None)
+    if g.user and g.user.id == user_id:
+        pending = pending_page(user_id)
+
+    return render_template('users/show.html', user=user, message_list=page.items,
+                           next_cursor=page.next_cursor, pending=pending.items,
+                           more_pending=pending.next_cursor is not None,
+                           follow_status=follow_statuses(pending.items))
+
+
+@bp.route('/fragments/users/<int:user_id>')
+def profile_fragment(user_id):
+    """A user's messages after ?before=<message id>, as message list
+    items for infinite scroll."""
+
+    user = User.query.get_or_404(user_id)
+    before = message_cursor()
+
+    if user.is_deleted:
+        abort(404)
+
+    if before is None:
+        abort(400)
+
+    rows = dal.profile_feed(user_id, viewer_id(), FEED_PAGE_SIZE + 1, before=before)
+    page = message_page(rows, FEED_PAGE_SIZE)
+
+    return render_template('messages/fragment.html', message_list=page.items,
+                           next_cursor=page.next_cursor, more_url=request.path, show_like_buttons=False,
+                           liked_ids=set())
+
+
+def following_page(user_id):
+    """Page of users `user_id` follows, most recently followed first."""
+
+    query = (db.session
+             .query(User, Follows.created_at, Follows.user_being_followed_id)
+             .join(Follows, Follows.user_being_followed_id == User.id)
+             .filter(Follows.user_following_id == user_id))
+
+    return keyset_page(query, Follows.created_at, Follows.user_being_followed_id,
+                       request.args.get('before'))
+
+
+def followers_page(user_id):
+    """Page of followers of `user_id`, most recent first."""
+
+    query = (db.session
+             .query(User, Follows.created_at, Follows.user_following_id)
+             .join(Follows, Follows.user_following_id == User.id)
+             .filter(Follows.user_being_followed_id == user_id))
+
+    return keyset_page(query, Follows.created_at, Follows.user_following_id,
+                       request.args.get('before'))
+
+
+def pending_page(user_id):
+    """First page of follow requests to `user_id` not yet accepted, most
+    recent first; the followers pages show them all."""
+
+    query = (db.session
+             .query(User, Follows.created_at, Follows.user_following_id)
+             .join(Follows, Follows.user_following_id == User.id)
+             .filter(Follows.user_being_followed_id == user_id,
+                     Follows.following_confirmed_status != True))
+
+    return keyset_page(query, Follows.created_at, Follows.user_following_id)
+
+
+def pending_ids(user_id, follower_ids):
+    """Which of `follower_ids` has only asked to follow `user_id`?"""
+
+    if not follower_ids:
+        return set()
+
+    return {follower_id for (follower_id,) in db.session
+            .query(Follows.user_following_id)
+            .filter(Follows.user_being_followed_id == user_id,
+                    Follows.user_following_id.in_(follower_ids),
+                    Follows.following_confirmed_status != True)}
+
+
+def likes_page(user_id):
+    """Page of visible messages liked by `user_id`, most recently liked first."""
+
+    query = (db.session
+             .query(Message, Likes.created_at, Likes.id)
+             .join(Likes, Likes.message_id == Message.id)
+             .options(db.joinedload(Message.user))
+             .filter(Likes.user_id == user_id, message_visible_to(viewer_id())))
+
+    return keyset_page(query, Likes.created_at, Likes.id, request.args.get('before'))
+
+
+@bp.route('/users/<int:user_id>/following')
+@check_loggedin
+def show_following(user_id):
+    """Show list of people this user is following."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    page = following_page(user_id)
+
+    return render_template('users/following.html', user=user, user_list=page.items, next_cursor=page.next_cursor,
+                           follow_status=follow_statuses(page.items))
+
+
+@bp.route('/users/<int:user_id>/followers')
+@check_loggedin
+def users_followers(user_id):
+    """Show list of followers of this user."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    page = followers_page(user_id)
+
+    pending = set()
+    if g.user.id == user_id:
+        pending = pending_ids(user_id, [follower.id for follower in page.items])
+
+    return render_template('users/followers.html', user=user, user_list=page.items,
+                           pending=pending, next_cursor=page.next_cursor,
+                           follow_status=follow_statuses(page.items))
+
+
+@bp.route('/users/follow/<int:follow_id>', methods=['POST'])
+@check_loggedin
+def add_follow(follow_id):
+    """Add a follow for the currently-logged-in user."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    followed_user = User.query.get_or_404(follow_id)
+    # the button may be stale: the follow can exist already
+    if Follows.query.get((followed_user.id, g.user.id)) is None:
+        db.session.add(Follows(user_being_followed_id=followed_user.id, user_following_id=g.user.id))
+        db.session.commit()
+        follow_graph.record(g.user.id, followed_user.id, False)
+        trending.record_follow(followed_user)
+
+    # return redirect(f"/users/{g.user.id}/following")
+    return redirect(url_for('users.show_following', user_id=g.user.id))
+
+
+@bp.route('/users/stop-following/<int:follow_id>', methods=['POST'])
+@check_loggedin
+def stop_following(follow_id):
+    """Have currently-logged-in-user stop following this user."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    followed_user = User.query.get_or_404(follow_id)
+    # the button may be stale: the follow can be gone already
+    follow = Follows.query.get((followed_user.id, g.user.id))
+    if follow is not None:
+        db.session.delete(follow)
+        db.session.commit()
+    follow_graph.record(g.user.id, followed_user.id, None)
+
+    # return redirect(f"/users/{g.user.id}/following")
+    return redirect(url_for('users.show_following', user_id=g.user.id))
+
+
+@bp.route('/users/accept-follower/<int:follower_id>', methods=['POST'])
+@check_loggedin
+def accept_follower(follower_id):
+    """Accept follower."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    follower_user = User.query.get(follower_id)
+    follow = Follows.query.filter(Follows.user_being_followed_id==g.user.id, Follows.user_following_id==follower_user.id).first()
+    follow.following_confirmed_status = True
+    db.session.commit()
+    follow_graph.record(follower_user.id, g.user.id, True)
+
+    # return redirect(f"/users/{g.user.id}/following")
+    return redirect(url_for('users.users_followers', user_id=g.user.id))
+
+
+@bp.route('/users/profile', methods=["GET", "POST"])
+@check_loggedin
+def edit_profile():
+    """Update profile for current user."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    form = UserEditForm(obj=g.user)
+
+    if form.validate_on_submit():
+        user = User.authenticate(g.user.username,
+                                 form.password.data)
+        if user:
+            flash("User updated.", "success")
+
+            g.user.username=form.username.data or g.user.username
+            g.user.email=form.email.data or g.user.email
+            try:
+                if form.image_file.data:
+                    g.user.image_url = blobstore.store_upload(form.image_file.data)
+                else:
+                    g.user.image_url = blobstore.store_data_uri(form.image_url.data) or User.image_url.default.arg
+
+                if form.header_image_file.data:
+                    g.user.header_image_url = blobstore.store_upload(form.header_image_file.data)
+                else:
+                    g.user.header_image_url = blobstore.store_data_uri(form.header_image_url.data) or User.header_image_url.default.arg
+            except ValueError as exc:
+                flash(str(exc), 'danger')
+                return render_template('users/edit.html', form=form)
+
+            g.user.bio=form.bio.data 
+            g.user.private=form.private.data
+
+            db.session.commit()
+
+            # return redirect(f"/users/{user.id}")
+            return redirect(url_for('users.users_show', user_id=user.id))
+            
+        flash("Incorrect password.", 'danger')
+    
+    return render_template('users/edit.html', form=form)
+
+
+@bp.route('/users/password', methods=["GET", "POST"])
+@check_loggedin
+def change_password():
+    """Change password for current user."""
+
+    form = ChangePasswordForm()
+
+    if form.validate_on_submit():
+        user = User.change_password(form.username.data, form.password.data, 
+                                    form.newpassword1.data, form.newpassword2.data)
+        if user:
+            flash("Password updated.", "success")
+
+            db.session.commit()
+
+            return redirect(url_for('users.users_show', user_id=user.id))
+            
+        flash("Incorrect password.", 'danger')
+    
+    return render_template('users/password.html', form=form)
+
+
+@bp.route('/users/delete', methods=["POST"])
+@check_loggedin
+def delete_self():
+    """Delete user."""
+
+    # if not g.user:
+    #     flash("Access unauthorized.", "danger")
+    #     return redirect("/")
+
+    do_logout()
+
+    if delete_account(g.user):
+        flash("Account deleted. Your messages will be removed shortly.", "success")
+
+    return redirect(url_for('auth.signup'))
+
+
+@bp.route('/users/<int:user_id>/export')
+@check_loggedin
+def export_user(user_id):
+    """Download a user's messages, likes and follow lists as NDJSON, or
+    CSV with ?format=csv (the user themselves or admins only).
+
+    Resume an interrupted download with ?after=<cursor of the last record>.
+    """
+
+    if g.user.id != user_id and not g.user.admin:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    export_format = request.args.get('format', 'ndjson')
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+
+    if export_format not in export.FORMATS:
+        abort(400)
+
+    if after:
+        try:
+            export.parse_cursor(after)
+        except export.BadCursor:
+            abort(400)
+
+    chunks = export.stream(user_id, export_format, after, limit)
+    filename = f"warbler-{user_id}.{export_format}"
+
+    return current_app.response_class(stream_with_context(chunks),
+                              mimetype=export.FORMATS[export_format],
+                              headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@bp.route('/users/<int:user_id>/import', methods=["POST"])
+@check_loggedin
+def import_user(user_id):
+    """Import messages and follows into a user's account from an NDJSON
+    request body (the user themselves or admins only); see importer.py.
+
+    Responds with the import report: counts, errors and throughput per batch.
+    """
+
+    if g.user.id != user_id and not g.user.admin:
+        flash("Access unauthorized.", "danger")
+        return redirect("/")
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    report = importer.import_lines(user_id, request.stream)
+    feed_engine.forget(user_id)
+
+    return jsonify(report)
+
+
+@bp.route('/users/<int:user_id>/messages')
+@check_loggedin
+def show_own_messages(user_id):
+    """Show list of user's messages."""
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    page = message_page(dal.profile_feed(user_id, viewer_id(), FEED_PAGE_SIZE + 1), FEED_PAGE_SIZE)
+
+    return render_template('users/messages.html', user=user, message_list=page.items,
+                           next_cursor=page.next_cursor)
+
+
+@bp.route('/users/<int:user_id>/likes')
+def users_likes(user_id):
+    """Show list of likes of this user."""
+
+    user = User.query.get_or_404(user_id)
+
+    if user.is_deleted:
+        abort(404)
+
+    page = likes_page(user_id)
+
+    liked = set()
+    if g.user:
+        liked = dal.liked_ids(g.user.id, [msg.id for msg in page.items])
+
+    return render_template('users/likes.html', user=user, message_list=page.items,
+                           next_cursor=page.next_cursor, liked_ids=liked)